@@ -1,13 +1,19 @@
 """Application settings and configuration."""
 
 import os
+from functools import lru_cache
 from typing import Dict, Any
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from dotenv import load_dotenv
 
-# Load environment variables from .env file silently
-load_dotenv(verbose=False)
+# Load environment variables from .env file silently. Containers and
+# production set ENVIRONMENT and pass real env vars, so skip the file IO there.
+if os.getenv("ENVIRONMENT", "local") == "local" and os.path.exists(".env"):
+    load_dotenv(verbose=False)
+
+# Explicit Celery broker override, read once at import
+CELERY_BROKER_OVERRIDE = os.getenv("CELERY_BROKER_URL")
 
 
 class Settings(BaseSettings):
@@ -23,6 +29,10 @@ class Settings(BaseSettings):
     langfuse_host: str = Field(default="https://cloud.langfuse.com", description="Langfuse host")
     langfuse_public_key: str = Field(default="", description="Langfuse public key")
     langfuse_secret_key: str = Field(default="", description="Langfuse secret key")
+    langfuse_flush_at: int = Field(default=50, description="Events batched per Langfuse export")
+    langfuse_flush_interval: float = Field(default=5.0, description="Seconds between Langfuse background exports")
+    langfuse_enforce_flush: bool = Field(default=False, description="Block each request until its Langfuse events are sent")
+    langfuse_sample_rate: float = Field(default=1.0, ge=0.0, le=1.0, description="Fraction of requests traced in Langfuse")
     
     # LLM Configuration
     llm_model: str = Field(default="gpt-4o-mini", description="LLM model to use")
@@ -39,13 +49,13 @@ class Settings(BaseSettings):
     # Celery Configuration
     celery_broker_url: str = Field(default="redis://localhost:6379/0", description="Celery broker URL")
     celery_result_backend: str = Field(default="redis://localhost:6379/0", description="Celery result backend")
+    async_queue_backend: str = Field(default="celery", description="Transport for /message/async: celery or redis (plain list queue)")
     
     def get_redis_url_for_celery(self) -> str:
         """Get Redis URL optimized for Celery connections."""
         # Check if we have workers running in Docker (common dev setup)
-        celery_broker = os.getenv("CELERY_BROKER_URL")
-        if celery_broker:
-            return celery_broker
+        if CELERY_BROKER_OVERRIDE:
+            return CELERY_BROKER_OVERRIDE
             
         # If running in Docker, use internal Docker networking
         if self.environment == "docker":
@@ -84,8 +94,10 @@ class TenantConfig:
     ):
         self.tenant_id = tenant_id
         self.tone = tone
-        self.disclaimers = disclaimers or []
-        self.enabled_tools = enabled_tools or []
+        # Immutable so cached configs can be shared safely; frozenset gives
+        # O(1) "tool in enabled_tools" checks
+        self.disclaimers: tuple[str, ...] = tuple(disclaimers or ())
+        self.enabled_tools: frozenset[str] = frozenset(enabled_tools or ())
         self.custom_instructions = custom_instructions
         self.language = language
     
@@ -94,8 +106,8 @@ class TenantConfig:
         return {
             "tenant_id": self.tenant_id,
             "tone": self.tone,
-            "disclaimers": self.disclaimers,
-            "enabled_tools": self.enabled_tools,
+            "disclaimers": list(self.disclaimers),
+            "enabled_tools": sorted(self.enabled_tools),
             "custom_instructions": self.custom_instructions,
             "language": self.language
         }
@@ -105,8 +117,9 @@ class TenantConfig:
 settings = Settings()
 
 
+@lru_cache(maxsize=1024)
 def get_tenant_config(tenant_id: str) -> TenantConfig:
-    """Get tenant configuration by ID."""
+    """Get tenant configuration by ID (cached per tenant)."""
     # In a real implementation, this would fetch from a database or config store
     # For now, return default configuration
     return TenantConfig(
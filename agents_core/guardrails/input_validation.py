@@ -1,9 +1,41 @@
 """Input validation and filtering guardrails."""
 
 import re
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Tuple, Optional
 from agents_core.config.settings import settings
 
+# Single-character probe used to skip the digit-based PII patterns
+_DIGIT_RE = re.compile(r"\d")
+
+
+def _mask_email(match: "re.Match[str]") -> str:
+    """Keep the first and last username characters and the domain of an email."""
+    username, domain = match.group(1), match.group(2)
+    if len(username) > 2:
+        username = username[0] + '*' * (len(username) - 2) + username[-1]
+    return f"{username}@{domain}"
+
+
+class _PatternSet:
+    """Case-insensitive patterns behind a single combined regex.
+    
+    The combined alternation only rejects clean text quickly. Matches in
+    an alternation consume text, so overlapping patterns would hide each
+    other; on a hit every pattern is therefore checked on its own.
+    """
+    
+    def __init__(self, patterns: List[str]):
+        self.patterns = patterns
+        self._combined = re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+        self._compiled = [re.compile(p, re.IGNORECASE) for p in patterns]
+    
+    def matched(self, text: str) -> List[str]:
+        """Return the patterns found in text, in declaration order."""
+        if self._combined.search(text) is None:
+            return []
+        return [p for p, compiled in zip(self.patterns, self._compiled) if compiled.search(text)]
+
 
 class InputGuardrails:
     """Input validation and safety checks."""
@@ -21,6 +53,7 @@ class InputGuardrails:
             r"roleplay\s+as",
             r"simulate\s+being"
         ]
+        self._injection_set = _PatternSet(self.injection_patterns)
         
         # Inappropriate content patterns
         self.inappropriate_patterns = [
@@ -28,13 +61,17 @@ class InputGuardrails:
             r"\b(password|credential|token|api[_\s]?key)\b",
             r"\b(illegal|criminal|fraud|scam)\b"
         ]
+        self._inappropriate_set = _PatternSet(self.inappropriate_patterns)
         
         # PII patterns
-        self.pii_patterns = [
+        self.pii_patterns = [re.compile(p) for p in [
             r"\b\d{3}-\d{2}-\d{4}\b",  # SSN
             r"\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b",  # Credit card
-            r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"  # Email (basic)
-        ]
+            r"\b([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b"  # Email (basic): username, domain
+        ]]
+        
+        # Validation only depends on the text, so repeated messages reuse the verdict
+        self._validate_cached = lru_cache(maxsize=4096)(self._validate)
     
     def validate_input(self, text: str, session_id: str) -> Tuple[bool, str, Dict[str, any]]:
         """
@@ -43,6 +80,17 @@ class InputGuardrails:
         Returns:
             Tuple of (is_valid, filtered_text, metadata)
         """
+        is_valid, filtered_text, cached_metadata = self._validate_cached(text)
+        
+        # Callers may extend the metadata, so never hand out the cached lists
+        metadata = {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in cached_metadata.items()
+        }
+        return is_valid, filtered_text, metadata
+    
+    def _validate(self, text: str) -> Tuple[bool, str, Dict[str, any]]:
+        """Run all input checks on text (memoized by validate_input)."""
         metadata = {
             "original_length": len(text),
             "checks_performed": [],
@@ -54,14 +102,14 @@ class InputGuardrails:
             metadata["flags"].append("too_long")
             return False, "", metadata
         
-        if len(text.strip()) < 1:
+        if not text or text.isspace():
             metadata["flags"].append("empty")
             return False, "", metadata
         
         metadata["checks_performed"].append("length")
         
         # Prompt injection detection
-        injection_detected = self._check_prompt_injection(text.lower())
+        injection_detected = self._check_prompt_injection(text)
         if injection_detected:
             metadata["flags"].append("prompt_injection")
             metadata["injection_patterns"] = injection_detected
@@ -70,7 +118,7 @@ class InputGuardrails:
         metadata["checks_performed"].append("prompt_injection")
         
         # Inappropriate content detection
-        inappropriate_detected = self._check_inappropriate_content(text.lower())
+        inappropriate_detected = self._check_inappropriate_content(text)
         if inappropriate_detected:
             metadata["flags"].append("inappropriate_content")
             metadata["inappropriate_patterns"] = inappropriate_detected
@@ -91,45 +139,34 @@ class InputGuardrails:
     
     def _check_prompt_injection(self, text: str) -> List[str]:
         """Check for prompt injection patterns."""
-        found_patterns = []
-        for pattern in self.injection_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                found_patterns.append(pattern)
-        return found_patterns
+        return self._injection_set.matched(text)
     
     def _check_inappropriate_content(self, text: str) -> List[str]:
         """Check for inappropriate content patterns."""
-        found_patterns = []
-        for pattern in self.inappropriate_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                found_patterns.append(pattern)
-        return found_patterns
+        return self._inappropriate_set.matched(text)
     
     def _mask_pii(self, text: str) -> Tuple[str, bool]:
         """Mask PII in text."""
         filtered_text = text
         pii_found = False
         
+        # SSNs and card numbers both need digits; SSNs also need a dash
+        has_digit = _DIGIT_RE.search(text) is not None
+        
         # Mask SSN
-        if re.search(self.pii_patterns[0], text):
-            filtered_text = re.sub(self.pii_patterns[0], "***-**-****", filtered_text)
-            pii_found = True
+        if has_digit and "-" in text:
+            filtered_text, count = self.pii_patterns[0].subn("***-**-****", filtered_text)
+            pii_found = pii_found or count > 0
         
         # Mask credit card numbers
-        if re.search(self.pii_patterns[1], text):
-            filtered_text = re.sub(self.pii_patterns[1], "**** **** **** ****", filtered_text)
-            pii_found = True
+        if has_digit:
+            filtered_text, count = self.pii_patterns[1].subn("**** **** **** ****", filtered_text)
+            pii_found = pii_found or count > 0
         
         # Mask emails (partial)
-        def mask_email(match):
-            email = match.group(0)
-            username, domain = email.split('@', 1)
-            masked_username = username[0] + '*' * (len(username) - 2) + username[-1] if len(username) > 2 else username
-            return f"{masked_username}@{domain}"
-        
-        if re.search(self.pii_patterns[2], text):
-            filtered_text = re.sub(self.pii_patterns[2], mask_email, filtered_text)
-            pii_found = True
+        if "@" in text:
+            filtered_text, count = self.pii_patterns[2].subn(_mask_email, filtered_text)
+            pii_found = pii_found or count > 0
         
         return filtered_text, pii_found
 
@@ -138,19 +175,39 @@ class OutputGuardrails:
     """Output validation and filtering."""
     
     def __init__(self):
-        # Patterns that should not appear in responses
+        # Patterns that should not appear in responses, each paired with a
+        # literal anchor that any match must contain. The anchors are checked
+        # with plain substring search so clean responses never hit the regex engine.
         self.forbidden_patterns = [
-            r"i\s+am\s+an?\s+ai\s+language\s+model",
-            r"as\s+an?\s+ai\s+assistant",
-            r"i\s+don't\s+have\s+access\s+to\s+real[_\s]?time",
-            r"i\s+can't\s+browse\s+the\s+internet",
-            r"my\s+knowledge\s+cutoff",
-            r"i\s+am\s+chatgpt"
+            (anchor, re.compile(p, re.IGNORECASE), self._replacement_for(p))
+            for anchor, p in [
+                ("language", r"i\s+am\s+an?\s+ai\s+language\s+model"),
+                ("assistant", r"as\s+an?\s+ai\s+assistant"),
+                ("access", r"i\s+don't\s+have\s+access\s+to\s+real[_\s]?time"),
+                ("browse", r"i\s+can't\s+browse\s+the\s+internet"),
+                ("cutoff", r"my\s+knowledge\s+cutoff"),
+                ("chatgpt", r"i\s+am\s+chatgpt")
+            ]
         ]
         
         # Confidence thresholds
         self.min_confidence = 0.3
         self.low_confidence_threshold = 0.7
+        
+        # Longest text a forbidden pattern is expected to span; streamed
+        # output holds back this much so a match split across chunks is
+        # still caught before it is sent
+        self.stream_holdback_chars = 80
+    
+    @staticmethod
+    def _replacement_for(pattern: str) -> str:
+        """Pick the replacement text for a forbidden pattern."""
+        # Replace with more professional alternatives
+        if "ai language model" in pattern or "ai assistant" in pattern:
+            return "a professional assistant"
+        if "don't have access to real" in pattern:
+            return "don't have current"
+        return ""
     
     def validate_output(self, 
                        text: str, 
@@ -179,17 +236,8 @@ class OutputGuardrails:
         validation_metadata["checks_performed"].append("confidence")
         
         # Remove forbidden patterns
-        modified_text = text
-        for pattern in self.forbidden_patterns:
-            if re.search(pattern, modified_text, re.IGNORECASE):
-                # Replace with more professional alternatives
-                if "ai language model" in pattern or "ai assistant" in pattern:
-                    modified_text = re.sub(pattern, "a professional assistant", modified_text, flags=re.IGNORECASE)
-                elif "don't have access to real" in pattern:
-                    modified_text = re.sub(pattern, "don't have current", modified_text, flags=re.IGNORECASE)
-                else:
-                    modified_text = re.sub(pattern, "", modified_text, flags=re.IGNORECASE)
-                validation_metadata["modifications"].append(f"removed_pattern: {pattern}")
+        modified_text, modifications = self.filter_text(text)
+        validation_metadata["modifications"].extend(modifications)
         
         validation_metadata["checks_performed"].append("forbidden_patterns")
         
@@ -208,8 +256,58 @@ class OutputGuardrails:
             validation_metadata["modifications"].append("added_uncertainty_disclaimer")
         
         return True, modified_text.strip(), validation_metadata
+    
+    def filter_text(self, text: str) -> Tuple[str, List[str]]:
+        """Replace forbidden patterns; returns (text, modifications made)."""
+        modifications = []
+        lowered_text = text.lower()
+        for anchor, pattern, replacement in self.forbidden_patterns:
+            if anchor not in lowered_text:
+                continue
+            text, count = pattern.subn(replacement, text)
+            if count:
+                modifications.append(f"removed_pattern: {pattern.pattern}")
+                lowered_text = text.lower()
+        return text, modifications
+    
+    async def filter_stream(self,
+                            chunks: AsyncIterator[str],
+                            modifications: List[str]) -> AsyncIterator[str]:
+        """Apply filter_text to streamed text, appending changes to `modifications`.
+        
+        The last stream_holdback_chars characters are kept back until more
+        text arrives (or the stream ends), so patterns split across chunk
+        boundaries are replaced too.
+        """
+        pending = ""
+        async for chunk in chunks:
+            pending, changes = self.filter_text(pending + chunk)
+            modifications.extend(changes)
+            cut = len(pending) - self.stream_holdback_chars
+            if cut > 0:
+                yield pending[:cut]
+                pending = pending[cut:]
+        
+        if pending:
+            yield pending
+
+
+# Global instances (created on first use)
+_input_guardrails = None
+_output_guardrails = None
+
+
+def get_input_guardrails() -> InputGuardrails:
+    """Get or create the shared input guardrails."""
+    global _input_guardrails
+    if _input_guardrails is None:
+        _input_guardrails = InputGuardrails()
+    return _input_guardrails
 
 
-# Global instances
-input_guardrails = InputGuardrails()
-output_guardrails = OutputGuardrails()
+def get_output_guardrails() -> OutputGuardrails:
+    """Get or create the shared output guardrails."""
+    global _output_guardrails
+    if _output_guardrails is None:
+        _output_guardrails = OutputGuardrails()
+    return _output_guardrails
@@ -0,0 +1,82 @@
+"""Shared Redis connection pool for memory, rate limiting and caching."""
+
+import logging
+import time
+import redis
+from agents_core.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# How long a successful or failed PING result is trusted (seconds)
+AVAILABILITY_CHECK_TTL = 1.0
+
+# Connections reserved for long blocking commands (BLPOP waits), kept
+# apart so waiters never exhaust the shared pool
+BLOCKING_POOL_SIZE = 8
+
+_pool = None
+_client = None
+_blocking_client = None
+_ping_ok = False
+_last_ping_ts = 0.0
+
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """Get or create the process-wide Redis connection pool."""
+    global _pool
+    if _pool is None:
+        # Raw bytes: callers decode (or hand bytes to orjson) themselves
+        _pool = redis.ConnectionPool.from_url(
+            settings.get_redis_url_for_memory(),
+            decode_responses=False,
+            max_connections=64,
+            socket_connect_timeout=5,
+            socket_timeout=5
+        )
+    return _pool
+
+
+def get_redis_client() -> redis.Redis:
+    """Get a Redis client backed by the shared pool."""
+    global _client
+    if _client is None:
+        _client = redis.Redis(connection_pool=get_redis_pool())
+    return _client
+
+
+def get_blocking_redis_client() -> redis.Redis:
+    """Get a Redis client for blocking commands, on its own small pool.
+    
+    When every connection is busy, callers wait for one to free up
+    instead of failing with "Too many connections".
+    """
+    global _blocking_client
+    if _blocking_client is None:
+        _blocking_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+            settings.get_redis_url_for_memory(),
+            decode_responses=False,
+            max_connections=BLOCKING_POOL_SIZE,
+            timeout=5,
+            socket_connect_timeout=5,
+            socket_timeout=5
+        ))
+    return _blocking_client
+
+
+def is_redis_available() -> bool:
+    """Check Redis reachability, sending at most one PING per TTL."""
+    global _ping_ok, _last_ping_ts
+    
+    now = time.monotonic()
+    if _last_ping_ts and now - _last_ping_ts < AVAILABILITY_CHECK_TTL:
+        return _ping_ok
+    
+    try:
+        get_redis_client().ping()
+        _ping_ok = True
+    except Exception as e:
+        if _ping_ok or not _last_ping_ts:
+            logger.warning("Redis connection failed: %s", e)
+        _ping_ok = False
+    _last_ping_ts = now
+    return _ping_ok
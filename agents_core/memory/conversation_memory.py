@@ -1,10 +1,48 @@
 """Conversation memory management using Redis."""
 
-import json
-import redis
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-from agents_core.config.settings import settings
+import logging
+import math
+import re
+import time
+import orjson
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+from agents_core.infra.redis_pool import get_redis_client, is_redis_available
+
+logger = logging.getLogger(__name__)
+
+# Session keys expire this long after the last write (sliding window)
+SESSION_TTL_SECONDS = 60 * 60 * 24 * 7
+
+# Full async task results are kept this long for clients to fetch
+TASK_RESULT_TTL_SECONDS = 60 * 60
+
+# Walks a session list (newest first) inside Redis and returns the
+# content of up to ARGV[1] user messages, newest first
+_RECENT_USER_MESSAGES_LUA = """
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+local limit = tonumber(ARGV[1])
+local out = {}
+for i = 1, #items do
+    local ok, msg = pcall(cjson.decode, items[i])
+    if ok and msg.role == 'user' and type(msg.content) == 'string' then
+        out[#out + 1] = msg.content
+        if #out >= limit then break end
+    end
+end
+return out
+"""
+
+# Greetings, thanks and goodbyes carry nothing later turns can use
+_LOW_SIGNAL_MESSAGE = re.compile(
+    r"^\s*(hi|hello|hey|hola|buenas|good (morning|afternoon|evening)|"
+    r"thanks|thank you|thx|gracias|bye|goodbye|adios|adiós)[\s!.,?]*$",
+    re.IGNORECASE
+)
+# Messages below this character entropy (bits) are repeated-key noise
+MIN_MESSAGE_ENTROPY = 2.0
+# Short texts are too small for a meaningful entropy estimate
+ENTROPY_MIN_LENGTH = 8
 
 
 class ConversationMemory:
@@ -12,34 +50,21 @@ class ConversationMemory:
     
     def __init__(self):
         self.redis_client = None
+        self._recent_user_messages_script = None
         self._initialize_redis()
     
     def _initialize_redis(self):
         """Initialize Redis connection."""
-        try:
-            redis_url = settings.get_redis_url_for_memory()
-            self.redis_client = redis.from_url(
-                redis_url,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5
-            )
-            # Test connection
-            self.redis_client.ping()
-            print("✅ Redis connected successfully")
-        except Exception as e:
-            print(f"⚠️ Redis connection failed: {e}")
-            self.redis_client = None
+        # Shared pool returns raw bytes: orjson encodes to and decodes from bytes directly
+        self.redis_client = get_redis_client()
+        if is_redis_available():
+            logger.info("Redis connected successfully")
     
     def is_available(self) -> bool:
         """Check if Redis is available."""
-        if not self.redis_client:
-            return False
-        try:
-            self.redis_client.ping()
-            return True
-        except:
-            return False
+        # Cached PING result; command failures are still caught by each
+        # caller's own error handling.
+        return is_redis_available()
     
     def _get_session_key(self, session_id: str, tenant_id: str) -> str:
         """Generate Redis key for session."""
@@ -49,6 +74,34 @@ class ConversationMemory:
         """Generate Redis key for session summary."""
         return f"summary:{tenant_id}:{session_id}"
     
+    def _get_version_key(self, session_id: str, tenant_id: str) -> str:
+        """Generate Redis key for the session version counter."""
+        return f"version:{tenant_id}:{session_id}"
+    
+    def _get_summary_version_key(self, session_id: str, tenant_id: str) -> str:
+        """Generate Redis key for the session version the stored summary reflects."""
+        return f"summary_version:{tenant_id}:{session_id}"
+    
+    def _get_task_result_key(self, task_id: str) -> str:
+        """Generate Redis key for a full async task result."""
+        return f"task_result:{task_id}"
+    
+    @staticmethod
+    def should_persist(text: str) -> bool:
+        """Whether a user turn carries enough signal to keep in history.
+        
+        Short answers ("yes", "3pm") are kept: they usually answer the
+        assistant's previous question.
+        """
+        if _LOW_SIGNAL_MESSAGE.match(text):
+            return False
+        if len(text) >= ENTROPY_MIN_LENGTH:
+            counts = Counter(text.lower())
+            entropy = -sum(n / len(text) * math.log2(n / len(text)) for n in counts.values())
+            if entropy < MIN_MESSAGE_ENTROPY:
+                return False
+        return True
+    
     def add_message(self, 
                    session_id: str, 
                    tenant_id: str,
@@ -56,30 +109,57 @@ class ConversationMemory:
                    content: str,
                    metadata: Optional[Dict[str, Any]] = None) -> bool:
         """Add a message to conversation history."""
+        return self.add_messages(session_id, tenant_id, [
+            {"role": role, "content": content, "metadata": metadata}
+        ])
+    
+    def add_messages(self,
+                     session_id: str,
+                     tenant_id: str,
+                     messages: List[Dict[str, Any]]) -> bool:
+        """Add several messages (oldest first) to conversation history in one round trip.
+        
+        Each message is a dict with "role", "content" and optional "metadata".
+        """
         if not self.is_available():
             return False
         
         try:
             key = self._get_session_key(session_id, tenant_id)
-            message = {
-                "role": role,
-                "content": content,
-                "timestamp": datetime.utcnow().isoformat(),
-                "metadata": metadata or {}
-            }
+            timestamp = time.time()  # Unix epoch seconds (UTC)
+            encoded = [
+                orjson.dumps({
+                    "role": message["role"],
+                    "content": message["content"],
+                    "timestamp": timestamp,
+                    "metadata": message.get("metadata") or {}
+                })
+                for message in messages
+            ]
+            
+            # Send the push/trim/expire burst in a single round trip
+            pipe = self.redis_client.pipeline(transaction=False)
             
-            # Add to list (FIFO)
-            self.redis_client.lpush(key, json.dumps(message))
+            # Add to list (FIFO); LPUSH of several values leaves the last
+            # one at the head, so newest-first order is kept
+            pipe.lpush(key, *encoded)
             
             # Keep only last 20 messages
-            self.redis_client.ltrim(key, 0, 19)
+            pipe.ltrim(key, 0, 19)
             
             # Set expiry (7 days)
-            self.redis_client.expire(key, 60 * 60 * 24 * 7)
+            pipe.expire(key, SESSION_TTL_SECONDS)
+            
+            # Bump the session version so the stored summary is known to be stale
+            version_key = self._get_version_key(session_id, tenant_id)
+            pipe.incr(version_key)
+            pipe.expire(version_key, SESSION_TTL_SECONDS)
+            
+            pipe.execute()
             
             return True
         except Exception as e:
-            print(f"❌ Failed to add message to memory: {e}")
+            logger.warning("Failed to add message to memory: %s", e)
             return False
     
     def get_conversation_history(self, 
@@ -93,19 +173,61 @@ class ConversationMemory:
         try:
             key = self._get_session_key(session_id, tenant_id)
             messages = self.redis_client.lrange(key, 0, limit - 1)
-            
-            history = []
-            for msg_str in reversed(messages):  # Reverse to get chronological order
-                try:
-                    msg = json.loads(msg_str)
-                    history.append(msg)
-                except json.JSONDecodeError:
-                    continue
-            
-            return history
+            return self._decode_history(messages)
+        except Exception as e:
+            logger.warning("Failed to get conversation history: %s", e)
+            return []
+    
+    def get_recent_user_messages(self,
+                                 session_id: str,
+                                 tenant_id: str,
+                                 count: int = 5) -> List[str]:
+        """Get the content of the last `count` user messages, oldest first."""
+        if not self.is_available():
+            return []
+        
+        try:
+            # Filter server-side: only the wanted contents cross the wire
+            if self._recent_user_messages_script is None:
+                self._recent_user_messages_script = self.redis_client.register_script(
+                    _RECENT_USER_MESSAGES_LUA
+                )
+            key = self._get_session_key(session_id, tenant_id)
+            contents = self._recent_user_messages_script(keys=[key], args=[count])
         except Exception as e:
-            print(f"❌ Failed to get conversation history: {e}")
+            logger.warning("Failed to get recent user messages: %s", e)
             return []
+        
+        return [content.decode("utf-8") for content in reversed(contents)]
+    
+    def _decode_history(self, messages: List[bytes]) -> List[Dict[str, Any]]:
+        """Decode raw LRANGE results into chronological message dicts."""
+        history = []
+        for msg_bytes in reversed(messages):  # Reverse to get chronological order
+            try:
+                msg = orjson.loads(msg_bytes)
+                history.append(msg)
+            except orjson.JSONDecodeError:
+                continue
+        return history
+    
+    def get_history_and_summary(self,
+                                session_id: str,
+                                tenant_id: str,
+                                limit: int = 10) -> Tuple[List[Dict[str, Any]], str]:
+        """Get recent history and the stored summary in a single round trip."""
+        if not self.is_available():
+            return [], ""
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.lrange(self._get_session_key(session_id, tenant_id), 0, limit - 1)
+            pipe.get(self._get_summary_key(session_id, tenant_id))
+            messages, summary = pipe.execute()
+            return self._decode_history(messages), summary.decode("utf-8") if summary else ""
+        except Exception as e:
+            logger.warning("Failed to get conversation history and summary: %s", e)
+            return [], ""
     
     def get_conversation_summary(self, 
                                session_id: str, 
@@ -117,39 +239,93 @@ class ConversationMemory:
         try:
             key = self._get_summary_key(session_id, tenant_id)
             summary = self.redis_client.get(key)
-            return summary or ""
+            return summary.decode("utf-8") if summary else ""
         except Exception as e:
-            print(f"❌ Failed to get conversation summary: {e}")
+            logger.warning("Failed to get conversation summary: %s", e)
             return ""
     
+    def get_current_summary(self,
+                            session_id: str,
+                            tenant_id: str) -> Tuple[Optional[str], Optional[int]]:
+        """Get the stored summary if no message arrived since it was written.
+        
+        Returns (summary or None when stale/missing, current session version).
+        """
+        if not self.is_available():
+            return None, None
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(self._get_version_key(session_id, tenant_id))
+            pipe.get(self._get_summary_version_key(session_id, tenant_id))
+            pipe.get(self._get_summary_key(session_id, tenant_id))
+            version, summary_version, summary = pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to get conversation summary: %s", e)
+            return None, None
+        
+        if version is None:
+            return None, None
+        if summary is not None and summary_version == version:
+            return summary.decode("utf-8"), int(version)
+        return None, int(version)
+    
     def update_conversation_summary(self, 
                                   session_id: str, 
                                   tenant_id: str,
-                                  summary: str) -> bool:
-        """Update conversation summary."""
+                                  summary: str,
+                                  source_version: Optional[int] = None) -> bool:
+        """Update conversation summary.
+        
+        `source_version` is the session version the summary was built from;
+        when given, get_current_summary treats the summary as current until
+        the next message is added.
+        """
         if not self.is_available():
             return False
         
         try:
             key = self._get_summary_key(session_id, tenant_id)
-            self.redis_client.set(key, summary, ex=60 * 60 * 24 * 7)  # 7 days
+            version_key = self._get_version_key(session_id, tenant_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(key, summary, ex=SESSION_TTL_SECONDS)
+            pipe.incr(version_key)
+            pipe.expire(version_key, SESSION_TTL_SECONDS)
+            if source_version is not None:
+                # The INCR above moves the version one past the source; if a
+                # message slipped in meanwhile the tags differ and the next
+                # run rebuilds the summary
+                pipe.set(
+                    self._get_summary_version_key(session_id, tenant_id),
+                    source_version + 1,
+                    ex=SESSION_TTL_SECONDS
+                )
+            pipe.execute()
             return True
         except Exception as e:
-            print(f"❌ Failed to update conversation summary: {e}")
+            logger.warning("Failed to update conversation summary: %s", e)
             return False
     
     def generate_context_summary(self, 
                                 session_id: str, 
                                 tenant_id: str) -> str:
-        """Generate a context summary from recent messages."""
-        history = self.get_conversation_history(session_id, tenant_id, limit=6)
+        """Generate a context summary from recent messages and the stored summary."""
+        if not self.is_available():
+            return ""
         
+        # Recent messages and the stored summary come back in one round trip
+        history, summary = self.get_history_and_summary(session_id, tenant_id, limit=6)
+        return self._build_context_summary(history, summary)
+    
+    def _build_context_summary(self,
+                               history: List[Dict[str, Any]],
+                               stored_summary: str) -> str:
+        """Build the context summary string from decoded history."""
         if not history:
             return ""
         
         # Simple summarization logic
         user_messages = [msg["content"] for msg in history if msg["role"] == "user"]
-        assistant_messages = [msg["content"] for msg in history if msg["role"] == "assistant"]
         
         if not user_messages:
             return ""
@@ -157,6 +333,10 @@ class ConversationMemory:
         # Create a simple context summary with recent conversation flow
         context_parts = []
         
+        # Longer-term summary written by the generate_session_summary task
+        if stored_summary:
+            context_parts.append(stored_summary)
+        
         # Include recent conversation turns for better context
         if len(history) >= 2:
             recent_turns = []
@@ -177,6 +357,34 @@ class ConversationMemory:
         
         return " | ".join(context_parts)
     
+    def store_full_result(self, task_id: str, payload: Dict[str, Any]) -> bool:
+        """Store the full agent payload of an async task."""
+        if not self.is_available():
+            return False
+        
+        try:
+            self.redis_client.set(
+                self._get_task_result_key(task_id),
+                orjson.dumps(payload),
+                ex=TASK_RESULT_TTL_SECONDS
+            )
+            return True
+        except Exception as e:
+            logger.warning("Failed to store task result: %s", e)
+            return False
+    
+    def get_full_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get the full agent payload of an async task, if still stored."""
+        if not self.is_available():
+            return None
+        
+        try:
+            raw = self.redis_client.get(self._get_task_result_key(task_id))
+            return orjson.loads(raw) if raw is not None else None
+        except Exception as e:
+            logger.warning("Failed to get task result: %s", e)
+            return None
+    
     def clear_session(self, session_id: str, tenant_id: str) -> bool:
         """Clear all memory for a session."""
         if not self.is_available():
@@ -185,15 +393,65 @@ class ConversationMemory:
         try:
             session_key = self._get_session_key(session_id, tenant_id)
             summary_key = self._get_summary_key(session_id, tenant_id)
+            version_key = self._get_version_key(session_id, tenant_id)
+            summary_version_key = self._get_summary_version_key(session_id, tenant_id)
             
-            self.redis_client.delete(session_key)
-            self.redis_client.delete(summary_key)
+            self.redis_client.delete(session_key, summary_key, version_key, summary_version_key)
             
             return True
         except Exception as e:
-            print(f"❌ Failed to clear session: {e}")
+            logger.warning("Failed to clear session: %s", e)
             return False
 
+    def cleanup_stale_sessions(self, max_idle_seconds: int, batch_size: int = 500) -> int:
+        """Delete sessions with no writes for `max_idle_seconds`; returns how many.
+        
+        Every write resets the session TTL, so the remaining TTL tells how
+        long ago the last one happened. Keys are walked with SCAN and freed
+        with UNLINK in pipelined batches, so Redis never blocks on the
+        whole keyspace. Keys without a TTL never expire and are removed too.
+        """
+        if not self.is_available():
+            return 0
+        
+        prefix = "conversation:"
+        cleaned = 0
+        cursor = 0
+        while True:
+            cursor, keys = self.redis_client.scan(cursor=cursor, match=f"{prefix}*", count=batch_size)
+            if keys:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.ttl(key)
+                ttls = pipe.execute()
+                
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, ttl in zip(keys, ttls):
+                    # -2: already gone; -1: no expiry set
+                    if ttl == -2 or (ttl != -1 and SESSION_TTL_SECONDS - ttl < max_idle_seconds):
+                        continue
+                    tenant_id, _, session_id = key.decode("utf-8")[len(prefix):].partition(":")
+                    pipe.unlink(
+                        key,
+                        self._get_summary_key(session_id, tenant_id),
+                        self._get_version_key(session_id, tenant_id),
+                        self._get_summary_version_key(session_id, tenant_id)
+                    )
+                    cleaned += 1
+                pipe.execute()
+            if cursor == 0:
+                break
+        
+        return cleaned
+
+
+# Global memory instance (connects to Redis on first use)
+_conversation_memory = None
+
 
-# Global memory instance
-conversation_memory = ConversationMemory()
+def get_conversation_memory() -> ConversationMemory:
+    """Get or create the shared conversation memory."""
+    global _conversation_memory
+    if _conversation_memory is None:
+        _conversation_memory = ConversationMemory()
+    return _conversation_memory
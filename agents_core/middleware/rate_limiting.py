@@ -1,10 +1,54 @@
 """Rate limiting middleware for API protection."""
 
+import logging
 import time
-import redis
-from typing import Dict, Optional, Tuple
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 from fastapi import HTTPException
-from agents_core.config.settings import settings
+from agents_core.infra.redis_pool import get_redis_client, is_redis_available
+
+logger = logging.getLogger(__name__)
+
+# Counts a request into the current fixed window and returns it together
+# with the previous window's total, in one round trip:
+# KEYS = (current window, previous window), ARGV = (ttl seconds)
+_SLIDING_WINDOW_LUA = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+return {current, previous}
+"""
+
+
+def _window_keys(key: str, window_index: int) -> List[str]:
+    """Counter keys for the current and the previous fixed window."""
+    return [f"rate_limit:{key}:{window_index}", f"rate_limit:{key}:{window_index - 1}"]
+
+
+def _weighted_count(current: int, previous: int, now: float, window: int) -> int:
+    """Approximate sliding-window count, as enforced by check_rate_limit.
+    
+    The previous window counts in proportion to how much of it still
+    overlaps the last `window` seconds.
+    """
+    window_start = int(now) // window * window
+    overlap = (window - (now - window_start)) / window
+    return int(current + previous * overlap)
+
+
+def _next_allowed_at(current: int, previous: int, now: float, window: int, limit: int) -> int:
+    """Earliest second at which the weighted count admits another request."""
+    window_start = int(now) // window * window
+    if current < limit:
+        if previous == 0:
+            return int(now)
+        # Wait until the previous window's share has decayed enough
+        return max(window_start + window * (previous - limit + current) // previous + 1, int(now))
+    # Nothing more fits in this window; in the next one the current
+    # window becomes the weighted previous
+    return window_start + window + max(window * (current - limit) // current + 1, 0)
 
 
 class RateLimiter:
@@ -12,22 +56,18 @@ class RateLimiter:
     
     def __init__(self):
         self.redis_client = None
+        self._window_script = None
         self._initialize_redis()
     
     def _initialize_redis(self):
         """Initialize Redis connection for rate limiting."""
-        try:
-            redis_url = settings.get_redis_url_for_memory()
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.redis_client.ping()
-            print("✅ Rate limiter Redis connected")
-        except Exception as e:
-            print(f"⚠️ Rate limiter Redis connection failed: {e}")
-            self.redis_client = None
+        self.redis_client = get_redis_client()
+        if is_redis_available():
+            logger.info("Rate limiter Redis connected")
     
     def is_available(self) -> bool:
         """Check if rate limiter is available."""
-        return self.redis_client is not None
+        return is_redis_available()
     
     def check_rate_limit(self, 
                         key: str, 
@@ -49,61 +89,75 @@ class RateLimiter:
             return True, {"rate_limiter": "unavailable", "remaining": "unknown"}
         
         try:
-            current_time = int(time.time())
-            redis_key = f"rate_limit:{key}:{current_time // window}"
+            now = time.time()
+            current_time = int(now)
+            window_index = current_time // window
+            
+            if self._window_script is None:
+                self._window_script = self.redis_client.register_script(_SLIDING_WINDOW_LUA)
+            
+            # Counters outlive their window by one more so the next window
+            # can still weight them
+            current, previous = self._window_script(
+                keys=_window_keys(key, window_index),
+                args=[window * 2]
+            )
             
-            # Get current count
-            current_count = self.redis_client.get(redis_key)
-            current_count = int(current_count) if current_count else 0
+            current_count = _weighted_count(current, previous, now, window)
             
-            if current_count >= limit:
+            if current_count > limit:
                 # Rate limit exceeded
                 return False, {
                     "rate_limited": True,
                     "limit": limit,
                     "window": window,
                     "current_count": current_count,
-                    "reset_time": (current_time // window + 1) * window
+                    "reset_time": _next_allowed_at(current, previous, now, window, limit)
                 }
             
-            # Increment counter
-            pipe = self.redis_client.pipeline()
-            pipe.incr(redis_key)
-            pipe.expire(redis_key, window)
-            pipe.execute()
-            
-            remaining = limit - (current_count + 1)
+            remaining = max(limit - current_count, 0)
             
             return True, {
                 "rate_limited": False,
                 "limit": limit,
                 "remaining": remaining,
-                "current_count": current_count + 1,
-                "reset_time": (current_time // window + 1) * window
+                "current_count": current_count,
+                "reset_time": _next_allowed_at(current, previous, now, window, limit)
             }
             
         except Exception as e:
-            print(f"Rate limiter error: {e}")
+            logger.warning("Rate limiter error: %s", e)
             # On error, allow request
             return True, {"rate_limiter": "error", "error": str(e)}
     
-    def get_rate_limit_info(self, key: str, window: int = 60) -> Dict[str, any]:
-        """Get current rate limit status for a key."""
+    def get_rate_limit_info(self, key: str, limit: int = 60, window: int = 60) -> Dict[str, any]:
+        """Get current rate limit status for a key.
+        
+        Reports the same weighted count check_rate_limit enforces, without
+        counting a request.
+        """
         if not self.is_available():
             return {"status": "unavailable"}
         
         try:
-            current_time = int(time.time())
-            redis_key = f"rate_limit:{key}:{current_time // window}"
+            now = time.time()
+            current_time = int(now)
+            window_index = current_time // window
+            
+            current, previous = self.redis_client.mget(_window_keys(key, window_index))
+            current = int(current) if current else 0
+            previous = int(previous) if previous else 0
             
-            current_count = self.redis_client.get(redis_key)
-            current_count = int(current_count) if current_count else 0
+            current_count = _weighted_count(current, previous, now, window)
+            reset_time = _next_allowed_at(current, previous, now, window, limit)
             
             return {
                 "current_count": current_count,
-                "window_start": (current_time // window) * window,
-                "window_end": (current_time // window + 1) * window,
-                "time_until_reset": (current_time // window + 1) * window - current_time
+                "remaining": max(limit - current_count, 0),
+                "window_start": window_index * window,
+                "window_end": (window_index + 1) * window,
+                "reset_time": reset_time,
+                "time_until_reset": max(reset_time - current_time, 0)
             }
             
         except Exception as e:
@@ -119,31 +173,39 @@ class CacheManager:
     
     def _initialize_redis(self):
         """Initialize Redis connection for caching."""
-        try:
-            redis_url = settings.get_redis_url_for_memory()
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            self.redis_client.ping()
-            print("✅ Cache manager Redis connected")
-        except Exception as e:
-            print(f"⚠️ Cache manager Redis connection failed: {e}")
-            self.redis_client = None
+        self.redis_client = get_redis_client()
+        if is_redis_available():
+            logger.info("Cache manager Redis connected")
     
     def is_available(self) -> bool:
         """Check if cache is available."""
-        return self.redis_client is not None
+        return is_redis_available()
     
     def get(self, key: str) -> Optional[str]:
         """Get value from cache."""
         if not self.is_available():
             return None
         
+        try:
+            # The shared pool returns bytes; cache values are text
+            value = self.redis_client.get(f"cache:{key}")
+            return value.decode("utf-8") if value is not None else None
+        except Exception as e:
+            logger.warning("Cache get error: %s", e)
+            return None
+    
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Get raw value from cache, skipping the text decode."""
+        if not self.is_available():
+            return None
+        
         try:
             return self.redis_client.get(f"cache:{key}")
         except Exception as e:
-            print(f"Cache get error: {e}")
+            logger.warning("Cache get error: %s", e)
             return None
     
-    def set(self, key: str, value: str, ttl: int = 300):
+    def set(self, key: str, value: Union[str, bytes], ttl: int = 300):
         """Set value in cache with TTL (seconds)."""
         if not self.is_available():
             return False
@@ -152,7 +214,7 @@ class CacheManager:
             self.redis_client.setex(f"cache:{key}", ttl, value)
             return True
         except Exception as e:
-            print(f"Cache set error: {e}")
+            logger.warning("Cache set error: %s", e)
             return False
     
     def delete(self, key: str):
@@ -164,7 +226,98 @@ class CacheManager:
             self.redis_client.delete(f"cache:{key}")
             return True
         except Exception as e:
-            print(f"Cache delete error: {e}")
+            logger.warning("Cache delete error: %s", e)
+            return False
+    
+    @contextmanager
+    def pipeline(self) -> Iterator["CachePipeline"]:
+        """Queue cache writes and send them in one round trip on exit.
+        
+        Nothing is sent if the block raises. Errors from the send itself
+        propagate to the caller.
+        """
+        pipe = CachePipeline(self.redis_client.pipeline(transaction=False))
+        yield pipe
+        pipe.execute()
+    
+    def push_capped(self, key: str, value: Union[str, bytes], max_len: int, ttl: int = 300):
+        """Append to a cached list, keeping only the newest max_len entries."""
+        if not self.is_available():
+            return False
+        
+        try:
+            with self.pipeline() as pipe:
+                pipe.push_capped(key, value, max_len=max_len, ttl=ttl)
+            return True
+        except Exception as e:
+            logger.warning("Cache push error: %s", e)
+            return False
+    
+    def get_list(self, key: str, start: int = 0, end: int = -1) -> List[bytes]:
+        """Get a range of raw entries from a cached list."""
+        if not self.is_available():
+            return []
+        
+        try:
+            return self.redis_client.lrange(f"cache:{key}", start, end)
+        except Exception as e:
+            logger.warning("Cache list get error: %s", e)
+            return []
+    
+    def hash_get(self, key: str, field: str) -> Optional[bytes]:
+        """Get one raw field of a cached hash."""
+        if not self.is_available():
+            return None
+        
+        try:
+            return self.redis_client.hget(f"cache:{key}", field)
+        except Exception as e:
+            logger.warning("Cache hash get error: %s", e)
+            return None
+    
+    def hash_get_many(self, key: str, fields: List[Union[str, bytes]]) -> List[Optional[bytes]]:
+        """Get several raw fields of a cached hash in one round trip."""
+        if not fields or not self.is_available():
+            return [None] * len(fields)
+        
+        try:
+            return self.redis_client.hmget(f"cache:{key}", fields)
+        except Exception as e:
+            logger.warning("Cache hash get error: %s", e)
+            return [None] * len(fields)
+    
+    def hash_get_all(self, key: str) -> Dict[bytes, bytes]:
+        """Get every field of a cached hash as raw bytes."""
+        if not self.is_available():
+            return {}
+        
+        try:
+            return self.redis_client.hgetall(f"cache:{key}")
+        except Exception as e:
+            logger.warning("Cache hash get error: %s", e)
+            return {}
+    
+    def set_union(self, *keys: str) -> Set[bytes]:
+        """Get the union of several cached sets."""
+        if not self.is_available():
+            return set()
+        
+        try:
+            return self.redis_client.sunion([f"cache:{key}" for key in keys])
+        except Exception as e:
+            logger.warning("Cache set union error: %s", e)
+            return set()
+    
+    def trim_list(self, key: str, start: int, end: int = -1):
+        """Keep only the given index range of a cached list."""
+        if not self.is_available():
+            return False
+        
+        try:
+            self.redis_client.ltrim(f"cache:{key}", start, end)
+            return True
+        except Exception as e:
+            logger.warning("Cache list trim error: %s", e)
             return False
     
     def clear_pattern(self, pattern: str):
@@ -178,13 +331,71 @@ class CacheManager:
                 self.redis_client.delete(*keys)
             return True
         except Exception as e:
-            print(f"Cache clear pattern error: {e}")
+            logger.warning("Cache clear pattern error: %s", e)
             return False
 
 
-# Global instances
-rate_limiter = RateLimiter()
-cache_manager = CacheManager()
+class CachePipeline:
+    """Batch of cache writes, applied with the cache key prefix."""
+    
+    def __init__(self, pipe):
+        self._pipe = pipe
+    
+    def set(self, key: str, value: Union[str, bytes], ttl: int = 300):
+        """Queue a value write with TTL (seconds)."""
+        self._pipe.setex(f"cache:{key}", ttl, value)
+    
+    def push_capped(self, key: str, *values: Union[str, bytes], max_len: int, ttl: int = 300):
+        """Queue appends to a list, keeping only the newest max_len entries."""
+        cache_key = f"cache:{key}"
+        self._pipe.rpush(cache_key, *values)
+        self._pipe.ltrim(cache_key, -max_len, -1)
+        self._pipe.expire(cache_key, ttl)
+    
+    def hash_set(self, key: str, field: str, value: Union[str, bytes], ttl: int = 300):
+        """Queue a hash field write, refreshing the hash TTL."""
+        cache_key = f"cache:{key}"
+        self._pipe.hset(cache_key, field, value)
+        self._pipe.expire(cache_key, ttl)
+    
+    def hash_delete(self, key: str, field: str):
+        """Queue a hash field delete."""
+        self._pipe.hdel(f"cache:{key}", field)
+    
+    def set_add(self, key: str, member: str, ttl: int = 300):
+        """Queue a set member add, refreshing the set TTL."""
+        cache_key = f"cache:{key}"
+        self._pipe.sadd(cache_key, member)
+        self._pipe.expire(cache_key, ttl)
+    
+    def set_remove(self, key: str, member: str):
+        """Queue a set member removal."""
+        self._pipe.srem(f"cache:{key}", member)
+    
+    def execute(self):
+        """Send all queued writes."""
+        return self._pipe.execute()
+
+
+# Global instances (connect to Redis on first use)
+_rate_limiter = None
+_cache_manager = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get or create the shared rate limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def get_cache_manager() -> CacheManager:
+    """Get or create the shared cache manager."""
+    global _cache_manager
+    if _cache_manager is None:
+        _cache_manager = CacheManager()
+    return _cache_manager
 
 
 def apply_rate_limit(
@@ -205,7 +416,7 @@ def apply_rate_limit(
     Returns:
         Rate limit metadata
     """
-    is_allowed, metadata = rate_limiter.check_rate_limit(identifier, limit, window)
+    is_allowed, metadata = get_rate_limiter().check_rate_limit(identifier, limit, window)
     
     if not is_allowed:
         raise HTTPException(
@@ -1,17 +1,59 @@
 """Advanced error tracking and monitoring."""
 
-import json
+import logging
+import queue
+import threading
 import traceback
+import uuid
+import zlib
+import orjson
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from agents_core.middleware.rate_limiting import cache_manager
+from typing import Dict, Any, List, Optional, Tuple
+from agents_core.middleware.rate_limiting import CacheManager, get_cache_manager
+
+logger = logging.getLogger(__name__)
+
+# Number of entries kept in the recent errors list
+RECENT_ERRORS_LIMIT = 100
+
+# Error records waiting to be written; new errors are dropped beyond this
+ERROR_QUEUE_MAX_SIZE = 10000
+
+# Maximum number of queued error records written per Redis round trip
+ERROR_WRITE_BATCH_SIZE = 100
+
+
+def _error_epoch(error: Dict[str, Any]) -> Optional[int]:
+    """Epoch seconds of an error entry, or None if it cannot be determined."""
+    epoch = error.get("ts")
+    if epoch is not None:
+        return epoch
+    
+    # Entries written before "ts" was added only carry the ISO timestamp
+    try:
+        return int(datetime.fromisoformat(error["timestamp"]).timestamp())
+    except (KeyError, TypeError, ValueError):
+        return None
 
 
 class ErrorTracker:
     """Track and analyze errors across the system."""
     
     def __init__(self):
-        self.cache = cache_manager
+        # Errors are written to Redis by a background thread so the
+        # request path only pays for a queue put
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], BaseException]]" = queue.Queue(
+            maxsize=ERROR_QUEUE_MAX_SIZE
+        )
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self.dropped_errors = 0
+    
+    @property
+    def cache(self) -> CacheManager:
+        """Shared cache manager, resolved lazily."""
+        return get_cache_manager()
     
     def log_error(self, 
                  error: Exception,
@@ -20,6 +62,9 @@ class ErrorTracker:
         """
         Log an error with context information.
         
+        The record is stored asynchronously; the returned ID becomes
+        retrievable once the background writer has flushed it.
+        
         Args:
             error: Exception that occurred
             context: Additional context (user_id, endpoint, etc.)
@@ -28,60 +73,94 @@ class ErrorTracker:
         Returns:
             Error ID for tracking
         """
-        error_id = f"error_{datetime.now().timestamp()}"
-        
-        error_data = {
-            "error_id": error_id,
-            "timestamp": datetime.now().isoformat(),
-            "severity": severity,
-            "error_type": type(error).__name__,
-            "error_message": str(error),
-            "traceback": traceback.format_exc(),
-            "context": context
-        }
+        # Random IDs cannot collide between concurrent calls in the same tick
+        error_id = f"error_{uuid.uuid4().hex}"
         
         # Store in cache for 24 hours
         if self.cache.is_available():
+            now = datetime.now()
+            error_data = {
+                "error_id": error_id,
+                "timestamp": now.isoformat(),
+                "ts": int(now.timestamp()),
+                "severity": severity,
+                "error_type": type(error).__name__,
+                "error_message": str(error),
+                "context": dict(context or {})
+            }
+            
+            # The exception travels with the record so its traceback is
+            # formatted by the writer thread rather than on the caller's
+            self._ensure_writer()
             try:
-                self.cache.set(
-                    f"error:{error_id}",
-                    json.dumps(error_data),
-                    ttl=86400  # 24 hours
-                )
-                
-                # Add to recent errors list
-                self._add_to_recent_errors(error_id, severity)
-                
-            except Exception as e:
-                print(f"Failed to log error: {e}")
+                self._queue.put_nowait((error_data, error))
+            except queue.Full:
+                self.dropped_errors += 1
         
         return error_id
     
-    def _add_to_recent_errors(self, error_id: str, severity: str):
-        """Add error to recent errors list."""
+    def _ensure_writer(self):
+        """Start the background writer thread on first use."""
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_errors,
+                    name="error-tracker-writer",
+                    daemon=True
+                )
+                self._writer.start()
+    
+    def _write_errors(self):
+        """Drain queued error records into the cache."""
+        while True:
+            # Block for the first record, then take whatever else is queued
+            # so a burst of errors is written in a single round trip
+            batch = [self._queue.get()]
+            while len(batch) < ERROR_WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._store_errors(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _store_errors(self, batch: List[Tuple[Dict[str, Any], BaseException]]):
+        """Persist error records and index them in the recent errors list."""
         try:
-            # Get current recent errors
-            recent_errors = self.cache.get("recent_errors")
-            if recent_errors:
-                recent_list = json.loads(recent_errors)
-            else:
-                recent_list = []
-            
-            # Add new error
-            recent_list.append({
-                "error_id": error_id,
-                "timestamp": datetime.now().isoformat(),
-                "severity": severity
-            })
-            
-            # Keep only last 100 errors
-            recent_list = recent_list[-100:]
-            
-            # Store back
-            self.cache.set("recent_errors", json.dumps(recent_list), ttl=86400)
+            with self.cache.pipeline() as pipe:
+                recent_entries = []
+                for error_data, error in batch:
+                    error_data["traceback"] = "".join(
+                        traceback.format_exception(type(error), error, error.__traceback__)
+                    )
+                    # Tracebacks repeat module paths heavily and compress well
+                    pipe.set(
+                        f"zerror:{error_data['error_id']}",
+                        zlib.compress(orjson.dumps(error_data)),
+                        ttl=86400  # 24 hours
+                    )
+                    recent_entries.append(orjson.dumps({
+                        "error_id": error_data["error_id"],
+                        "timestamp": error_data["timestamp"],
+                        "ts": error_data["ts"],
+                        "severity": error_data["severity"]
+                    }))
+                
+                # Only the new entries are serialized; Redis trims to the last 100
+                pipe.push_capped(
+                    "recent_errors",
+                    *recent_entries,
+                    max_len=RECENT_ERRORS_LIMIT,
+                    ttl=86400
+                )
             
         except Exception as e:
-            print(f"Failed to update recent errors: {e}")
+            logger.warning("Failed to log errors: %s", e)
     
     def get_error(self, error_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed error information."""
@@ -89,11 +168,16 @@ class ErrorTracker:
             return None
         
         try:
-            error_data = self.cache.get(f"error:{error_id}")
+            error_data = self.cache.get_bytes(f"zerror:{error_id}")
+            if error_data:
+                return orjson.loads(zlib.decompress(error_data))
+            
+            # Records written before compression was introduced
+            error_data = self.cache.get_bytes(f"error:{error_id}")
             if error_data:
-                return json.loads(error_data)
+                return orjson.loads(error_data)
         except Exception as e:
-            print(f"Failed to get error {error_id}: {e}")
+            logger.warning("Failed to get error %s: %s", error_id, e)
         
         return None
     
@@ -103,12 +187,11 @@ class ErrorTracker:
             return []
         
         try:
-            recent_errors = self.cache.get("recent_errors")
-            if recent_errors:
-                recent_list = json.loads(recent_errors)
-                return recent_list[-limit:]
+            # The list is kept oldest-first, so the tail holds the newest
+            entries = self.cache.get_list("recent_errors", -limit, -1)
+            return [orjson.loads(entry) for entry in entries]
         except Exception as e:
-            print(f"Failed to get recent errors: {e}")
+            logger.warning("Failed to get recent errors: %s", e)
         
         return []
     
@@ -125,29 +208,21 @@ class ErrorTracker:
             }
         
         # Count by severity
-        severity_counts = {}
-        last_24h_count = 0
+        severity_counts = Counter(error.get("severity", "unknown") for error in recent_errors)
         
-        cutoff_time = datetime.now() - timedelta(hours=24)
-        
-        for error in recent_errors:
-            severity = error.get("severity", "unknown")
-            severity_counts[severity] = severity_counts.get(severity, 0) + 1
-            
-            # Count last 24h
-            try:
-                error_time = datetime.fromisoformat(error["timestamp"])
-                if error_time > cutoff_time:
-                    last_24h_count += 1
-            except:
-                pass
+        # Count last 24h
+        cutoff = int((datetime.now() - timedelta(hours=24)).timestamp())
+        last_24h_count = sum(
+            1 for error in recent_errors
+            if (_error_epoch(error) or 0) > cutoff
+        )
         
         # Calculate error rate (errors per hour in last 24h)
         error_rate = last_24h_count / 24.0
         
         return {
             "total_errors": len(recent_errors),
-            "by_severity": severity_counts,
+            "by_severity": dict(severity_counts),
             "last_24h": last_24h_count,
             "error_rate": round(error_rate, 2),
             "last_error": recent_errors[-1] if recent_errors else None
@@ -159,34 +234,77 @@ class ErrorTracker:
             return False
         
         try:
-            recent_errors = self.get_recent_errors(1000)
-            cutoff_time = datetime.now() - timedelta(hours=hours)
+            recent_errors = self.get_recent_errors(RECENT_ERRORS_LIMIT)
+            cutoff = int((datetime.now() - timedelta(hours=hours)).timestamp())
             
-            # Filter out old errors
-            filtered_errors = []
+            # The list is oldest-first, so old errors form a prefix that can
+            # be trimmed in place instead of rewriting the survivors
+            expired = 0
             for error in recent_errors:
-                try:
-                    error_time = datetime.fromisoformat(error["timestamp"])
-                    if error_time > cutoff_time:
-                        filtered_errors.append(error)
-                except:
-                    # Keep errors with parsing issues
-                    filtered_errors.append(error)
+                error_epoch = _error_epoch(error)
+                # Keep errors with parsing issues
+                if error_epoch is None or error_epoch > cutoff:
+                    break
+                expired += 1
             
-            # Store filtered list
-            self.cache.set("recent_errors", json.dumps(filtered_errors), ttl=86400)
+            if expired:
+                self.cache.trim_list("recent_errors", expired)
             return True
             
         except Exception as e:
-            print(f"Failed to clear old errors: {e}")
+            logger.warning("Failed to clear old errors: %s", e)
             return False
 
 
+# Updates the running totals and the capped recent-times list in one
+# server-side step: KEYS = (stats hash, recent list),
+# ARGV = (duration_ms, max recent entries, ttl seconds)
+_RECORD_RESPONSE_TIME_LUA = """
+local duration = tonumber(ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], 'total_ms', ARGV[1])
+local min_ms = redis.call('HGET', KEYS[1], 'min_ms')
+if not min_ms or duration < tonumber(min_ms) then
+    redis.call('HSET', KEYS[1], 'min_ms', ARGV[1])
+end
+local max_ms = redis.call('HGET', KEYS[1], 'max_ms')
+if not max_ms or duration > tonumber(max_ms) then
+    redis.call('HSET', KEYS[1], 'max_ms', ARGV[1])
+end
+redis.call('RPUSH', KEYS[2], ARGV[1])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Number of samples kept per endpoint for percentile calculation
+RECENT_TIMES_LIMIT = 100
+
+
+def _p50_p95(samples: List[float]):
+    """Median and 95th percentile of a non-empty list, sorted in place."""
+    samples.sort()
+    n = len(samples)
+    return samples[n // 2], samples[min(int(n * 0.95), n - 1)]
+
+
 class PerformanceMonitor:
     """Monitor system performance metrics."""
     
     def __init__(self):
-        self.cache = cache_manager
+        self._record_script = None
+    
+    @property
+    def cache(self) -> CacheManager:
+        """Shared cache manager, resolved lazily."""
+        return get_cache_manager()
+    
+    @staticmethod
+    def _keys(endpoint: str):
+        """Redis keys for an endpoint's totals hash and recent-times list."""
+        prefix = f"cache:perf:{endpoint}"
+        return f"{prefix}:stats", f"{prefix}:recent_times"
     
     def record_response_time(self, endpoint: str, duration_ms: float):
         """Record response time for an endpoint."""
@@ -194,36 +312,18 @@ class PerformanceMonitor:
             return
         
         try:
-            # Get current metrics
-            key = f"perf:{endpoint}:response_times"
-            current_data = self.cache.get(key)
-            
-            if current_data:
-                metrics = json.loads(current_data)
-            else:
-                metrics = {
-                    "count": 0,
-                    "total_ms": 0,
-                    "min_ms": float('inf'),
-                    "max_ms": 0,
-                    "recent_times": []
-                }
-            
-            # Update metrics
-            metrics["count"] += 1
-            metrics["total_ms"] += duration_ms
-            metrics["min_ms"] = min(metrics["min_ms"], duration_ms)
-            metrics["max_ms"] = max(metrics["max_ms"], duration_ms)
-            
-            # Keep last 100 response times
-            metrics["recent_times"].append(duration_ms)
-            metrics["recent_times"] = metrics["recent_times"][-100:]
+            if self._record_script is None:
+                self._record_script = self.cache.redis_client.register_script(
+                    _RECORD_RESPONSE_TIME_LUA
+                )
             
-            # Store updated metrics
-            self.cache.set(key, json.dumps(metrics), ttl=3600)  # 1 hour
+            self._record_script(
+                keys=self._keys(endpoint),
+                args=[float(duration_ms), RECENT_TIMES_LIMIT, 3600]  # 1 hour
+            )
             
         except Exception as e:
-            print(f"Failed to record response time: {e}")
+            logger.warning("Failed to record response time: %s", e)
     
     def get_performance_stats(self, endpoint: str) -> Dict[str, Any]:
         """Get performance statistics for an endpoint."""
@@ -231,38 +331,35 @@ class PerformanceMonitor:
             return {"status": "unavailable"}
         
         try:
-            key = f"perf:{endpoint}:response_times"
-            data = self.cache.get(key)
-            
-            if not data:
-                return {"status": "no_data"}
-            
-            metrics = json.loads(data)
+            stats_key, times_key = self._keys(endpoint)
+            pipe = self.cache.redis_client.pipeline(transaction=False)
+            pipe.hgetall(stats_key)
+            pipe.lrange(times_key, 0, -1)
+            metrics, recent = pipe.execute()
             
-            if metrics["count"] == 0:
+            count = int(metrics.get(b"count", 0))
+            if count == 0:
                 return {"status": "no_data"}
             
             # Calculate statistics
-            avg_ms = metrics["total_ms"] / metrics["count"]
+            avg_ms = float(metrics[b"total_ms"]) / count
             
             # Calculate percentiles from recent times
-            recent_times = sorted(metrics["recent_times"])
+            recent_times = [float(value) for value in recent]
             if recent_times:
-                p50 = recent_times[len(recent_times) // 2]
-                p95_idx = int(len(recent_times) * 0.95)
-                p95 = recent_times[min(p95_idx, len(recent_times) - 1)]
+                p50, p95 = _p50_p95(recent_times)
             else:
                 p50 = p95 = avg_ms
             
             return {
                 "status": "available",
-                "total_requests": metrics["count"],
+                "total_requests": count,
                 "avg_response_time_ms": round(avg_ms, 2),
-                "min_response_time_ms": round(metrics["min_ms"], 2),
-                "max_response_time_ms": round(metrics["max_ms"], 2),
+                "min_response_time_ms": round(float(metrics[b"min_ms"]), 2),
+                "max_response_time_ms": round(float(metrics[b"max_ms"]), 2),
                 "p50_response_time_ms": round(p50, 2),
                 "p95_response_time_ms": round(p95, 2),
-                "recent_requests": len(metrics["recent_times"])
+                "recent_requests": len(recent_times)
             }
             
         except Exception as e:
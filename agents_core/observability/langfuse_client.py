@@ -1,10 +1,15 @@
 """Langfuse integration for observability."""
 
+import atexit
+import logging
 import os
+import random
 from typing import Dict, Any, Optional
 from langfuse import Langfuse
 from agents_core.config.settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 class LangfuseClient:
     """Centralized Langfuse client for observability."""
@@ -20,54 +25,83 @@ class LangfuseClient:
                 settings.langfuse_secret_key and 
                 settings.langfuse_host):
                 
+                # The SDK exports batches from its own background thread
                 self.client = Langfuse(
                     public_key=settings.langfuse_public_key,
                     secret_key=settings.langfuse_secret_key,
-                    host=settings.langfuse_host
+                    host=settings.langfuse_host,
+                    flush_at=settings.langfuse_flush_at,
+                    flush_interval=settings.langfuse_flush_interval
                 )
                 # Verificar autenticación
                 auth_ok = self.client.auth_check()
                 if auth_ok:
-                    print("✅ Langfuse client initialized and authenticated successfully")
+                    logger.info("Langfuse client initialized and authenticated successfully")
+                    atexit.register(self.flush)
                 else:
-                    print("❌ Langfuse authentication failed")
+                    logger.error("Langfuse authentication failed")
                     self.client = None
             else:
-                print("⚠️ Langfuse credentials not configured")
+                logger.warning("Langfuse credentials not configured")
         except Exception as e:
-            print(f"❌ Failed to initialize Langfuse: {e}")
+            logger.error("Failed to initialize Langfuse: %s", e)
             self.client = None
     
     def is_available(self) -> bool:
         """Check if Langfuse is available."""
         return self.client is not None
     
+    def should_sample(self) -> bool:
+        """Head-sampling decision for a new trace (LANGFUSE_SAMPLE_RATE)."""
+        return self.is_available() and random.random() < settings.langfuse_sample_rate
+    
+    def create_event(self, **event: Any):
+        """Record a Langfuse event.
+        
+        The SDK timestamps it now and queues it for its background
+        exporter, so this does not wait on the network.
+        """
+        if not self.is_available():
+            return
+        
+        try:
+            self.client.create_event(**event)
+        except Exception as e:
+            logger.warning("Failed to send Langfuse event: %s", e)
+    
     def create_trace(self, 
                     name: str, 
                     user_id: Optional[str] = None,
                     session_id: Optional[str] = None,
-                    metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
-        """Create a new trace in Langfuse."""
+                    metadata: Optional[Dict[str, Any]] = None,
+                    start_event: bool = True) -> Optional[str]:
+        """Create a new trace in Langfuse.
+        
+        With start_event=False only the trace ID is created; callers that
+        report the whole operation in a single event skip the start marker.
+        """
         if not self.is_available():
             return None
         
         try:
             # Generate a unique trace ID
             trace_id = self.client.create_trace_id()
+            if not start_event:
+                return trace_id
             
-            # Create a simple event to mark trace start
-            self.client.create_event(
+            # Create a simple event to mark trace start, on a copy of the
+            # caller's metadata
+            event_metadata = dict(metadata) if metadata else {}
+            event_metadata["event_type"] = "trace_start"
+            event_metadata["trace_name"] = name
+            self.create_event(
                 name=f"{name}_started",
                 input={"user_id": user_id, "session_id": session_id},
-                metadata={
-                    **(metadata or {}),
-                    "event_type": "trace_start",
-                    "trace_name": name
-                }
+                metadata=event_metadata
             )
             return trace_id
         except Exception as e:
-            print(f"❌ Failed to create Langfuse trace: {e}")
+            logger.warning("Failed to create Langfuse trace: %s", e)
             return None
     
     def create_span(self, 
@@ -81,18 +115,17 @@ class LangfuseClient:
         
         try:
             # Create a simple event for the span
-            self.client.create_event(
+            event_metadata = dict(metadata) if metadata else {}
+            event_metadata["event_type"] = "span"
+            event_metadata["trace_id"] = trace_id
+            self.create_event(
                 name=f"{name}_span",
                 input=input_data or {},
-                metadata={
-                    **(metadata or {}),
-                    "event_type": "span",
-                    "trace_id": trace_id
-                }
+                metadata=event_metadata
             )
             return trace_id
         except Exception as e:
-            print(f"❌ Failed to create Langfuse span: {e}")
+            logger.warning("Failed to create Langfuse span: %s", e)
             return None
     
     def log_generation(self,
@@ -109,30 +142,29 @@ class LangfuseClient:
         
         try:
             # Create a simple event for the generation
-            self.client.create_event(
+            event_metadata = dict(metadata) if metadata else {}
+            event_metadata["event_type"] = "llm_generation"
+            event_metadata["model"] = model or "unknown"
+            event_metadata["usage"] = usage or {}
+            event_metadata["trace_id"] = trace_id
+            self.create_event(
                 name=f"{name}_generation",
                 input=input_data or {},
                 output=output_data or {},
-                metadata={
-                    **(metadata or {}),
-                    "event_type": "llm_generation",
-                    "model": model or "unknown",
-                    "usage": usage or {},
-                    "trace_id": trace_id
-                }
+                metadata=event_metadata
             )
             return trace_id
         except Exception as e:
-            print(f"❌ Failed to log Langfuse generation: {e}")
+            logger.warning("Failed to log Langfuse generation: %s", e)
             return None
     
     def flush(self):
-        """Flush pending events to Langfuse."""
+        """Flush pending events to Langfuse, blocking until they are sent."""
         if self.is_available():
             try:
                 self.client.flush()
             except Exception as e:
-                print(f"❌ Failed to flush Langfuse events: {e}")
+                logger.warning("Failed to flush Langfuse events: %s", e)
 
 
 # Global Langfuse client instance
@@ -160,7 +192,7 @@ def trace_conversation(session_id: str, tenant_id: str):
                 
                 # Log successful completion event
                 if trace_id and langfuse_client.is_available():
-                    langfuse_client.client.create_event(
+                    langfuse_client.create_event(
                         name="conversation_completed",
                         output={"success": True},
                         metadata={
@@ -173,7 +205,7 @@ def trace_conversation(session_id: str, tenant_id: str):
             except Exception as e:
                 # Log error event
                 if trace_id and langfuse_client.is_available():
-                    langfuse_client.client.create_event(
+                    langfuse_client.create_event(
                         name="conversation_error",
                         output={"error": str(e)},
                         metadata={
@@ -207,7 +239,7 @@ def trace_agent_run(trace_id: str, message: str, model: str):
                 
                 # Log completion event
                 if span_id and langfuse_client.is_available():
-                    langfuse_client.client.create_event(
+                    langfuse_client.create_event(
                         name="agent_run_completed",
                         output={
                             "reply": result.get("reply", ""),
@@ -221,7 +253,7 @@ def trace_agent_run(trace_id: str, message: str, model: str):
             except Exception as e:
                 # Log error event
                 if span_id and langfuse_client.is_available():
-                    langfuse_client.client.create_event(
+                    langfuse_client.create_event(
                         name="agent_run_error",
                         output={"error": str(e)},
                         metadata={"trace_id": trace_id}
@@ -1,22 +1,51 @@
 """Main PydanticAI Agent orchestrator."""
 
+import logging
 import os
-from typing import Dict, Any, List
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, List, Optional
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.settings import ModelSettings
-from pydantic import BaseModel
 
 from agents_core.config.settings import settings, TenantConfig
+from agents_core.observability.langfuse_client import langfuse_client
 
+logger = logging.getLogger(__name__)
 
-class Deps(BaseModel):
-    """Dependencies passed to the agent."""
+
+@dataclass(slots=True)
+class Deps:
+    """Dependencies passed to the agent.
+    
+    A plain slotted dataclass: it is built internally from already-validated
+    values once per request, so pydantic validation buys nothing here.
+    """
     tenant: Dict[str, Any]
     session_summary: str = ""
     language: str = "en"
     session_id: str = ""
 
 
+@lru_cache(maxsize=256)
+def _tenant_dict(tenant_config: TenantConfig) -> Dict[str, Any]:
+    """Serialized tenant config, built once per (cached) config instance."""
+    return tenant_config.to_dict()
+
+
+@lru_cache(maxsize=1024)
+def _metadata_template(tenant_id: str, language: str, model: str) -> Dict[str, Any]:
+    """Response metadata shared by every reply for a tenant and locale.
+    
+    Callers must copy the result before adding per-request keys.
+    """
+    return {
+        "model_used": model,
+        "tenant_id": tenant_id,
+        "locale": language
+    }
+
+
 # Create the main agent (only if OpenAI key is available)
 agent = None
 agent_configured = False
@@ -79,11 +108,33 @@ def get_agent():
                 agent_configured = True
                 
         except Exception as e:
-            print(f"Warning: Could not initialize OpenAI agent: {e}")
+            logger.warning("Could not initialize OpenAI agent: %s", e)
             agent = None
     return agent
 
 
+@lru_cache(maxsize=1024)
+def _tenant_prompt(language: str,
+                   tone: str | None,
+                   custom_instructions: str,
+                   disclaimers: tuple[str, ...]) -> str:
+    """System prompt lines that follow the session context.
+    
+    A tone of None means no tenant configuration was provided.
+    """
+    prompt_parts = [f"Respond in {language} language."]
+    
+    # Add tenant-specific instructions
+    if tone is not None:
+        prompt_parts.extend([
+            f"Use a {tone} tone.",
+            custom_instructions,
+            "Important disclaimers: " + "; ".join(disclaimers) if disclaimers else "",
+        ])
+    
+    return "\n".join(filter(None, prompt_parts))
+
+
 def setup_agent_prompts(agent_instance):
     """Setup system prompts for the agent."""
     @agent_instance.system_prompt
@@ -91,25 +142,23 @@ def setup_agent_prompts(agent_instance):
         """Dynamic system prompt based on tenant configuration."""
         deps = ctx.deps
         
-        prompt_parts = [
-            "You are a helpful AI assistant.",
-            f"Session context: {deps.session_summary}" if deps.session_summary else "",
-            f"Respond in {deps.language} language.",
-        ]
-        
-        # Add tenant-specific instructions
         if deps.tenant:
-            tone = deps.tenant.get('tone', 'professional')
-            custom_instructions = deps.tenant.get('custom_instructions', '')
-            disclaimers = deps.tenant.get('disclaimers', [])
-            
-            prompt_parts.extend([
-                f"Use a {tone} tone.",
-                custom_instructions,
-                "Important disclaimers: " + "; ".join(disclaimers) if disclaimers else "",
-            ])
+            tenant_prompt = _tenant_prompt(
+                deps.language,
+                deps.tenant.get('tone', 'professional'),
+                deps.tenant.get('custom_instructions', ''),
+                tuple(deps.tenant.get('disclaimers', ())),
+            )
+        else:
+            tenant_prompt = _tenant_prompt(deps.language, None, "", ())
+        
+        # Only the session context changes between requests of a tenant
+        prompt_parts = ["You are a helpful AI assistant."]
+        if deps.session_summary:
+            prompt_parts.append(f"Session context: {deps.session_summary}")
+        prompt_parts.append(tenant_prompt)
         
-        return "\n".join(filter(None, prompt_parts))
+        return "\n".join(prompt_parts)
 
 
 async def run_agent(
@@ -142,16 +191,14 @@ async def run_agent(
                 "confidence": 0.0,
                 "tools_used": [],
                 "metadata": {
-                    "error": "OpenAI API key not configured",
-                    "model_used": settings.llm_model,
-                    "tenant_id": tenant_config.tenant_id,
-                    "locale": language
+                    **_metadata_template(tenant_config.tenant_id, language, settings.llm_model),
+                    "error": "OpenAI API key not configured"
                 }
             }
         
         # Prepare dependencies
         deps = Deps(
-            tenant=tenant_config.to_dict(),
+            tenant=_tenant_dict(tenant_config),
             session_summary=session_summary,
             language=language,
             session_id=session_id
@@ -166,20 +213,17 @@ async def run_agent(
                 "confidence": 0.0,
                 "tools_used": [],
                 "metadata": {
-                    "error": "Agent not initialized - OpenAI API key required",
-                    "model_used": settings.llm_model,
-                    "tenant_id": tenant_config.tenant_id,
-                    "locale": language
+                    **_metadata_template(tenant_config.tenant_id, language, settings.llm_model),
+                    "error": "Agent not initialized - OpenAI API key required"
                 }
             }
         
         # Log to Langfuse if trace_id provided
         if trace_id:
-            from agents_core.observability.langfuse_client import langfuse_client
             langfuse_client.log_generation(
                 trace_id=trace_id,
                 name="agent_generation",
-                input_data={"message": message, "deps": deps.model_dump()},
+                input_data={"message": message, "deps": asdict(deps)},
                 model=settings.llm_model,
                 metadata={"session_id": session_id, "tenant_id": tenant_config.tenant_id}
             )
@@ -187,12 +231,15 @@ async def run_agent(
         # Run the agent (already configured in get_agent)
         result = await agent_instance.run(message, deps=deps)
         
-        # Extract tools used (if any)
-        tools_used = []
-        if hasattr(result, 'all_messages'):
-            for msg in result.all_messages():
-                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    tools_used.extend([call.function.name for call in msg.tool_calls])
+        # Extract tools used (if any); one getattr per attribute, each with
+        # a default, instead of a hasattr probe followed by the real lookup
+        all_messages = getattr(result, 'all_messages', None)
+        tools_used = [
+            call.function.name
+            for msg in (all_messages() if all_messages else ())
+            for call in (getattr(msg, 'tool_calls', None) or ())
+        ]
+        usage = getattr(result, 'usage', None)
         
         return {
             "reply": result.output,
@@ -200,10 +247,8 @@ async def run_agent(
             "confidence": 0.95,  # We'll implement proper confidence scoring later
             "tools_used": tools_used,
             "metadata": {
-                "model_used": settings.llm_model,
-                "tenant_id": tenant_config.tenant_id,
-                "locale": language,
-                "tokens_used": getattr(result.usage, 'total_tokens', 0) if hasattr(result, 'usage') and result.usage else 0,
+                **_metadata_template(tenant_config.tenant_id, language, settings.llm_model),
+                "tokens_used": getattr(usage(), 'total_tokens', 0) if callable(usage) else 0,
                 "mock_response": False
             }
         }
@@ -216,13 +261,73 @@ async def run_agent(
             "confidence": 0.0,
             "tools_used": [],
             "metadata": {
+                **_metadata_template(tenant_config.tenant_id, language, settings.llm_model),
                 "error": str(e),
-                "model_used": settings.llm_model,
-                "tenant_id": tenant_config.tenant_id,
-                "locale": language,
                 "mock_response": False
             }
         }
 
 
+async def stream_agent(
+    message: str,
+    session_id: str,
+    tenant_config: TenantConfig,
+    session_summary: str = "",
+    language: str = "en",
+    outcome: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[str]:
+    """
+    Run the agent and yield its reply text as it is generated.
+    
+    Tool calls still run before the reply; only the final text streams.
+    Yields a single fallback message when the agent is unavailable or fails.
+    
+    Args:
+        message: User message
+        session_id: Session identifier
+        tenant_config: Tenant configuration
+        session_summary: Summary of previous conversation
+        language: User's preferred language
+        outcome: Filled in once the stream ends with "confidence",
+            "tools_used", "tokens_used" and, on failure, "error"
+    """
+    if outcome is None:
+        outcome = {}
+    outcome.update(confidence=0.0, tools_used=[], tokens_used=0)
+    
+    agent_instance = get_agent() if settings.openai_api_key else None
+    if not agent_instance:
+        outcome["error"] = "Agent not initialized - OpenAI API key required"
+        yield "I'm sorry, but I'm not properly configured with AI capabilities. Please contact support."
+        return
+    
+    deps = Deps(
+        tenant=_tenant_dict(tenant_config),
+        session_summary=session_summary,
+        language=language,
+        session_id=session_id
+    )
+    
+    try:
+        async with agent_instance.run_stream(message, deps=deps) as result:
+            async for delta in result.stream_text(delta=True):
+                yield delta
+            
+            all_messages = getattr(result, 'all_messages', None)
+            usage = getattr(result, 'usage', None)
+            outcome.update(
+                confidence=0.95,  # Same fixed score as run_agent
+                tools_used=[
+                    call.function.name
+                    for msg in (all_messages() if all_messages else ())
+                    for call in (getattr(msg, 'tool_calls', None) or ())
+                ],
+                tokens_used=getattr(usage(), 'total_tokens', 0) if callable(usage) else 0
+            )
+    except Exception as e:
+        logger.warning("Streaming agent run failed: %s", e)
+        outcome["error"] = str(e)
+        yield "I apologize, but I encountered an issue processing your request. Please try again or contact support if the problem persists."
+
+
 # Tools are imported and registered dynamically when the agent is used
@@ -3,14 +3,19 @@
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 
+# Shared field patterns; pydantic-core compiles each once, when the model
+# class is built, and matches with its native regex engine
+TENANT_ID_PATTERN = r"^[a-zA-Z0-9_-]+$"
+LOCALE_PATTERN = r"^[a-z]{2}$"
+
 
 class MessageDTO(BaseModel):
     """Input message data transfer object."""
     
     session_id: str = Field(..., min_length=1, max_length=100, description="Session identifier")
-    tenant_id: str = Field(..., pattern=r"^[a-zA-Z0-9_-]+$", description="Tenant identifier")
+    tenant_id: str = Field(..., pattern=TENANT_ID_PATTERN, description="Tenant identifier")
     text: str = Field(..., min_length=1, max_length=2000, description="User message text")
-    locale: str = Field(default="en", pattern=r"^[a-z]{2}$", description="Language locale")
+    locale: str = Field(default="en", pattern=LOCALE_PATTERN, description="Language locale")
     
     class Config:
         json_schema_extra = {
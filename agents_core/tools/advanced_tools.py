@@ -1,14 +1,24 @@
 """Advanced business tools for the AI agent."""
 
 import asyncio
+import hashlib
+import logging
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic_ai import RunContext
 import json
 
 from agents_core.orchestrator.agent import Deps
 
+logger = logging.getLogger(__name__)
+
+# Search results are reused for identical (query, document_type, limit)
+SEARCH_CACHE_TTL_SECONDS = 300.0
+SEARCH_CACHE_MAX_ENTRIES = 4096
+
 
 class EmailInput(BaseModel):
     """Input for sending emails."""
@@ -49,6 +59,9 @@ class DocumentSearchInput(BaseModel):
 
 class DocumentSearchOutput(BaseModel):
     """Output for document search."""
+    # Cached results are returned to every caller with the same query
+    model_config = ConfigDict(frozen=True)
+    
     results: List[Dict[str, Any]] = Field(..., description="Search results")
     total_found: int = Field(..., description="Total documents found")
     search_time_ms: int = Field(..., description="Search time in milliseconds")
@@ -83,13 +96,22 @@ class PaymentOutput(BaseModel):
     amount_charged: float = Field(..., description="Amount actually charged")
 
 
+def _new_id(prefix: str) -> str:
+    """Unique ID that cannot collide between concurrent calls."""
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+
+# (query, document_type, limit) -> (expires at, search output)
+_search_cache: Dict[Tuple[str, str, int], Tuple[float, DocumentSearchOutput]] = {}
+
+
 # Advanced tool implementations
-async def send_email(input_data: EmailInput) -> EmailOutput:
-    """Send an email to a customer or prospect."""
+async def send_email(ctx: RunContext[Deps], input_data: EmailInput) -> EmailOutput:
+    """Send an email to customers, prospects, or team members. Use this when the user asks to send an email or contact someone."""
     await asyncio.sleep(0.1)  # Simulate API call
     
     # Mock email sending
-    message_id = f"email_{datetime.now().timestamp()}"
+    message_id = _new_id("email")
     
     return EmailOutput(
         success=True,
@@ -98,12 +120,12 @@ async def send_email(input_data: EmailInput) -> EmailOutput:
     )
 
 
-async def send_notification(input_data: NotificationInput) -> NotificationOutput:
-    """Send a notification to a user."""
+async def send_notification(ctx: RunContext[Deps], input_data: NotificationInput) -> NotificationOutput:
+    """Send notifications to users via app, SMS, or email. Use this to notify users about important updates."""
     await asyncio.sleep(0.1)  # Simulate API call
     
     # Mock notification sending
-    notification_id = f"notif_{datetime.now().timestamp()}"
+    notification_id = _new_id("notif")
     
     return NotificationOutput(
         success=True,
@@ -112,40 +134,57 @@ async def send_notification(input_data: NotificationInput) -> NotificationOutput
     )
 
 
-async def search_documents(input_data: DocumentSearchInput) -> DocumentSearchOutput:
-    """Search through company documents and knowledge base."""
+async def search_documents(ctx: RunContext[Deps], input_data: DocumentSearchInput) -> DocumentSearchOutput:
+    """Search through company documents, knowledge base, and FAQs. Use this when users ask for information that might be in documents."""
+    cache_key = (input_data.query, input_data.document_type, input_data.limit)
+    cached = _search_cache.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    
     await asyncio.sleep(0.2)  # Simulate search
     
+    # Stable across processes, unlike the per-process salted hash()
+    query_hash = int.from_bytes(
+        hashlib.blake2b(input_data.query.encode(), digest_size=8).digest(), "big"
+    )
+    
     # Mock document search results
     results = [
         {
             "title": f"Document about {input_data.query}",
             "summary": f"This document contains information related to {input_data.query}",
-            "url": f"/documents/doc_{hash(input_data.query) % 1000}",
+            "url": f"/documents/doc_{query_hash % 1000}",
             "relevance_score": 0.95,
             "last_updated": "2024-01-15"
         },
         {
             "title": f"FAQ: {input_data.query}",
             "summary": f"Frequently asked questions about {input_data.query}",
-            "url": f"/faq/faq_{hash(input_data.query) % 500}",
+            "url": f"/faq/faq_{query_hash % 500}",
             "relevance_score": 0.87,
             "last_updated": "2024-01-10"
         }
     ]
     
-    return DocumentSearchOutput(
+    output = DocumentSearchOutput(
         results=results[:input_data.limit],
         total_found=len(results),
         search_time_ms=156
     )
+    
+    if cache_key not in _search_cache and len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+        # Evict the oldest entry (dicts keep insertion order)
+        _search_cache.pop(next(iter(_search_cache)))
+    _search_cache[cache_key] = (time.monotonic() + SEARCH_CACHE_TTL_SECONDS, output)
+    
+    return output
 
 
-async def manage_calendar(input_data: CalendarInput) -> CalendarOutput:
-    """Manage calendar events (create, update, delete, search)."""
+async def manage_calendar(ctx: RunContext[Deps], input_data: CalendarInput) -> CalendarOutput:
+    """Manage calendar events - create, update, delete, or search for available times. Use this for scheduling and calendar operations."""
     await asyncio.sleep(0.1)  # Simulate calendar API
     
-    event_id = f"event_{datetime.now().timestamp()}"
+    event_id = _new_id("event")
     
     if input_data.action == "create":
         return CalendarOutput(
@@ -176,12 +215,12 @@ async def manage_calendar(input_data: CalendarInput) -> CalendarOutput:
         )
 
 
-async def process_payment(input_data: PaymentInput) -> PaymentOutput:
-    """Process a payment for services."""
+async def process_payment(ctx: RunContext[Deps], input_data: PaymentInput) -> PaymentOutput:
+    """Process payments for services or products. Use this when users want to make payments or purchases."""
     await asyncio.sleep(0.3)  # Simulate payment processing
     
     # Mock payment processing
-    transaction_id = f"txn_{datetime.now().timestamp()}"
+    transaction_id = _new_id("txn")
     
     # Simulate different outcomes
     if input_data.amount > 10000:
@@ -207,39 +246,17 @@ def register_advanced_tools(agent_instance):
         return
     
     try:
-        # Email tool
-        @agent_instance.tool
-        async def send_email_tool(ctx: RunContext[Deps], input_data: EmailInput) -> EmailOutput:
-            """Send an email to customers, prospects, or team members. Use this when the user asks to send an email or contact someone."""
-            return await send_email(input_data)
-        
-        # Notification tool
-        @agent_instance.tool
-        async def send_notification_tool(ctx: RunContext[Deps], input_data: NotificationInput) -> NotificationOutput:
-            """Send notifications to users via app, SMS, or email. Use this to notify users about important updates."""
-            return await send_notification(input_data)
-        
-        # Document search tool
-        @agent_instance.tool
-        async def search_documents_tool(ctx: RunContext[Deps], input_data: DocumentSearchInput) -> DocumentSearchOutput:
-            """Search through company documents, knowledge base, and FAQs. Use this when users ask for information that might be in documents."""
-            return await search_documents(input_data)
-        
-        # Calendar management tool
-        @agent_instance.tool
-        async def manage_calendar_tool(ctx: RunContext[Deps], input_data: CalendarInput) -> CalendarOutput:
-            """Manage calendar events - create, update, delete, or search for available times. Use this for scheduling and calendar operations."""
-            return await manage_calendar(input_data)
-        
-        # Payment processing tool
-        @agent_instance.tool
-        async def process_payment_tool(ctx: RunContext[Deps], input_data: PaymentInput) -> PaymentOutput:
-            """Process payments for services or products. Use this when users want to make payments or purchases."""
-            return await process_payment(input_data)
+        # Register the implementations directly; the agent instructions refer
+        # to the tools by their *_tool names
+        agent_instance.tool(send_email, name="send_email_tool")
+        agent_instance.tool(send_notification, name="send_notification_tool")
+        agent_instance.tool(search_documents, name="search_documents_tool")
+        agent_instance.tool(manage_calendar, name="manage_calendar_tool")
+        agent_instance.tool(process_payment, name="process_payment_tool")
         
-        print("✅ Advanced tools registered successfully")
+        logger.info("Advanced tools registered")
     except Exception as e:
-        print(f"⚠️ Error registering advanced tools: {e}")
+        logger.warning("Error registering advanced tools: %s", e)
         # Continue anyway, don't fail agent creation
 
 
@@ -1,13 +1,16 @@
 """Business tools for the AI agent."""
 
+import logging
 from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from pydantic_ai import RunContext
 from datetime import datetime
 import uuid
 
 from agents_core.orchestrator.agent import Deps
 
+logger = logging.getLogger(__name__)
+
 
 class ScheduleVisitInput(BaseModel):
     """Input schema for scheduling a visit."""
@@ -28,11 +31,34 @@ class ScheduleVisitOutput(BaseModel):
 
 class BusinessHoursOutput(BaseModel):
     """Output schema for business hours query."""
+    # A single instance is returned to every caller
+    model_config = ConfigDict(frozen=True)
+    
     hours: Dict[str, str] = Field(..., description="Business hours by day of week")
     timezone: str = Field(..., description="Timezone for the hours")
     special_notes: List[str] = Field(default_factory=list, description="Special notes about hours")
 
 
+# Business hours are static, so the validated output is built once
+_BUSINESS_HOURS = BusinessHoursOutput(
+    hours={
+        "Monday": "9:00 AM - 6:00 PM",
+        "Tuesday": "9:00 AM - 6:00 PM", 
+        "Wednesday": "9:00 AM - 6:00 PM",
+        "Thursday": "9:00 AM - 6:00 PM",
+        "Friday": "9:00 AM - 5:00 PM",
+        "Saturday": "10:00 AM - 3:00 PM",
+        "Sunday": "Closed"
+    },
+    timezone="UTC-5 (Eastern Time)",
+    special_notes=[
+        "Appointments available outside business hours by request",
+        "Holiday hours may vary",
+        "Emergency support available 24/7"
+    ]
+)
+
+
 async def schedule_visit(ctx: RunContext[Deps], data: ScheduleVisitInput) -> ScheduleVisitOutput:
     """
     Schedule a property visit for a potential client.
@@ -74,23 +100,7 @@ async def get_business_hours(ctx: RunContext[Deps]) -> BusinessHoursOutput:
     This tool provides information about when the business is open
     and available for appointments or visits.
     """
-    return BusinessHoursOutput(
-        hours={
-            "Monday": "9:00 AM - 6:00 PM",
-            "Tuesday": "9:00 AM - 6:00 PM", 
-            "Wednesday": "9:00 AM - 6:00 PM",
-            "Thursday": "9:00 AM - 6:00 PM",
-            "Friday": "9:00 AM - 5:00 PM",
-            "Saturday": "10:00 AM - 3:00 PM",
-            "Sunday": "Closed"
-        },
-        timezone="UTC-5 (Eastern Time)",
-        special_notes=[
-            "Appointments available outside business hours by request",
-            "Holiday hours may vary",
-            "Emergency support available 24/7"
-        ]
-    )
+    return _BUSINESS_HOURS
 
 
 async def get_property_info(ctx: RunContext[Deps], property_id: str) -> Dict[str, Any]:
@@ -129,9 +139,9 @@ def register_tools(agent_instance):
         agent_instance.tool(schedule_visit)
         agent_instance.tool(get_business_hours)
         agent_instance.tool(get_property_info)
-        print("✅ Business tools registered successfully")
+        logger.info("Business tools registered")
     except Exception as e:
-        print(f"⚠️ Error registering business tools: {e}")
+        logger.warning("Error registering business tools: %s", e)
         # Continue anyway, don't fail agent creation
 
 
@@ -1,16 +1,60 @@
 """Webhook management and delivery system."""
 
-import json
 import asyncio
+import hashlib
+import hmac
+import logging
+import time
 import aiohttp
+import orjson
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
-from agents_core.middleware.rate_limiting import cache_manager
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
+from agents_core.middleware.rate_limiting import CacheManager, get_cache_manager
+
+logger = logging.getLogger(__name__)
+
+# Parsed subscriptions per (tenant, event type) are reused in-process for
+# this long; changes made by other workers become visible within the TTL
+SUBSCRIPTION_CACHE_TTL_SECONDS = 60.0
+SUBSCRIPTION_CACHE_MAX_ENTRIES = 10000
+# Parsed subscriptions keyed by a digest of their stored JSON
+PARSED_SUBSCRIPTION_MAX_ENTRIES = 10000
+
+# In-flight webhook POSTs, overall and per destination host
+WEBHOOK_MAX_PARALLEL = 64
+WEBHOOK_MAX_PER_HOST = 10
+
+# Queued events awaiting background delivery, and the workers draining them
+WEBHOOK_QUEUE_MAX_SIZE = 10000
+WEBHOOK_DELIVERY_WORKERS = 8
+
+# A URL failing this many attempts within the window is skipped for the
+# cool-down period instead of being retried
+WEBHOOK_BREAKER_FAILURES = 5
+WEBHOOK_BREAKER_WINDOW_SECONDS = 60.0
+WEBHOOK_BREAKER_COOLDOWN_SECONDS = 300.0
+
+# Headers shared by every delivery; never mutated, signed deliveries
+# extend a copy
+_BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "AI-Agent-Webhook/1.0"
+}
+
+
+@lru_cache(maxsize=1024)
+def _signing_hmac(secret: str) -> "hmac.HMAC":
+    """HMAC-SHA256 keyed with a subscription secret; copy before use."""
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256)
 
 
 class WebhookEvent(BaseModel):
     """Webhook event data structure."""
+    model_config = ConfigDict(frozen=True)
+    
     event_type: str = Field(..., description="Type of event (message_processed, error_occurred, etc.)")
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
     data: Dict[str, Any] = Field(..., description="Event data payload")
@@ -20,33 +64,199 @@ class WebhookEvent(BaseModel):
 
 class WebhookSubscription(BaseModel):
     """Webhook subscription configuration."""
+    # Parsed instances are shared through the in-process subscription cache
+    model_config = ConfigDict(frozen=True)
+    
     webhook_id: str = Field(..., description="Unique webhook identifier")
     tenant_id: str = Field(..., description="Tenant identifier")
     url: str = Field(..., description="Webhook endpoint URL")
     events: List[str] = Field(..., description="List of event types to subscribe to")
     secret: Optional[str] = Field(None, description="Secret for webhook verification")
     enabled: bool = Field(default=True, description="Whether webhook is enabled")
-    retry_config: Dict[str, Any] = Field(default={
-        "max_retries": 3,
-        "retry_delay_seconds": 5,
-        "exponential_backoff": True
-    })
+    max_retries: int = Field(default=3, description="Retries after the first failed attempt")
+    retry_delay_seconds: float = Field(default=5, description="Delay before the first retry")
+    exponential_backoff: bool = Field(default=True, description="Double the delay after each retry")
+    
+    @model_validator(mode="before")
+    @classmethod
+    def _unpack_retry_config(cls, data: Any) -> Any:
+        """Accept retry settings in the legacy nested retry_config form."""
+        if isinstance(data, dict) and isinstance(data.get("retry_config"), dict):
+            # Top-level fields win over the nested legacy values
+            data = {**data["retry_config"], **{k: v for k, v in data.items() if k != "retry_config"}}
+        return data
+    
+    @computed_field
+    @property
+    def retry_config(self) -> Dict[str, Any]:
+        """Retry settings in the legacy nested form, kept for API responses."""
+        return {
+            "max_retries": self.max_retries,
+            "retry_delay_seconds": self.retry_delay_seconds,
+            "exponential_backoff": self.exponential_backoff
+        }
 
 
 class WebhookManager:
     """Manage webhook subscriptions and delivery."""
     
     def __init__(self):
-        self.cache = cache_manager
+        # Created on first delivery, inside the running event loop
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        # Deliveries wait here rather than piling up inside the connector
+        self._delivery_slots = asyncio.Semaphore(WEBHOOK_MAX_PARALLEL)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # Fire-and-forget events are delivered by background worker tasks
+        self._event_queue: "asyncio.Queue[WebhookEvent]" = asyncio.Queue(maxsize=WEBHOOK_QUEUE_MAX_SIZE)
+        self._workers: List[asyncio.Task] = []
+        self.dropped_events = 0
+        # (tenant_id, event_type) -> (expires at, subscriptions)
+        self._subscription_cache: Dict[Tuple[str, str], Tuple[float, List[WebhookSubscription]]] = {}
+        # Digest of stored JSON -> parsed subscription; models are frozen,
+        # so one instance can be shared by every caller
+        self._parsed_subscriptions: Dict[bytes, WebhookSubscription] = {}
+        # URL -> (failure window start, failures); URL -> skip deliveries until
+        self._url_failures: Dict[str, Tuple[float, int]] = {}
+        self._open_until: Dict[str, float] = {}
+    
+    @property
+    def cache(self) -> CacheManager:
+        """Shared cache manager, resolved lazily."""
+        return get_cache_manager()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get or create the pooled HTTP session for webhook delivery."""
+        if self.session is None or self.session.closed:
+            async with self._session_lock:
+                if self.session is None or self.session.closed:
+                    # Keep-alive pool so repeated deliveries to the same host
+                    # reuse TCP/TLS connections instead of re-handshaking
+                    self.session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(
+                            limit=100,
+                            limit_per_host=WEBHOOK_MAX_PER_HOST,
+                            ttl_dns_cache=300,
+                            keepalive_timeout=60,
+                            force_close=False,
+                            enable_cleanup_closed=True
+                        ),
+                        timeout=aiohttp.ClientTimeout(total=30, connect=5, sock_read=10)
+                    )
+        return self.session
+    
+    def _host_slots_for(self, url: str) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent deliveries to the URL's host."""
+        host = urlsplit(url).netloc
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(WEBHOOK_MAX_PER_HOST)
+        return slots
+    
+    def enqueue_webhook_event(self, event: WebhookEvent) -> bool:
+        """Queue an event for background delivery without waiting on HTTP.
+        
+        Must be called from within the running event loop. Returns False
+        if the queue is full and the event was dropped.
+        """
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._delivery_worker())
+                for _ in range(WEBHOOK_DELIVERY_WORKERS)
+            ]
+        
+        try:
+            self._event_queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped_events += 1
+            logger.warning("Webhook queue full, dropping %s event", event.event_type)
+            return False
+    
+    async def _delivery_worker(self):
+        """Deliver queued events one at a time."""
+        while True:
+            event = await self._event_queue.get()
+            try:
+                await self.send_webhook_event(event)
+            except Exception as e:
+                logger.warning("Webhook event delivery failed: %s", e)
+            finally:
+                self._event_queue.task_done()
+    
+    async def close(self):
+        """Stop the delivery workers and close the HTTP session."""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
         self.session = None
-        self._initialize_session()
     
-    async def _initialize_session(self):
-        """Initialize HTTP session for webhook delivery."""
-        if not self.session:
-            self.session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)
-            )
+    @staticmethod
+    def _subscriptions_key(tenant_id: str) -> str:
+        """Cache key of the hash mapping webhook_id -> subscription JSON."""
+        return f"webhooks:tenant:{tenant_id}:data"
+    
+    @staticmethod
+    def _event_index_key(tenant_id: str, event_type: str) -> str:
+        """Cache key of the set of webhook_ids subscribed to an event type."""
+        return f"webhooks:tenant:{tenant_id}:event:{event_type}"
+    
+    def _invalidate_subscription_cache(self, tenant_id: str):
+        """Drop this worker's cached subscriptions for a tenant."""
+        for cache_key in [key for key in self._subscription_cache if key[0] == tenant_id]:
+            del self._subscription_cache[cache_key]
+    
+    def _parse_subscription(self, subscription_json: Union[str, bytes]) -> WebhookSubscription:
+        """Parse stored subscription JSON, reusing the result for identical blobs."""
+        if isinstance(subscription_json, str):
+            subscription_json = subscription_json.encode()
+        digest = hashlib.blake2b(subscription_json, digest_size=16).digest()
+        subscription = self._parsed_subscriptions.get(digest)
+        if subscription is None:
+            subscription = WebhookSubscription.model_validate_json(subscription_json)
+            if len(self._parsed_subscriptions) >= PARSED_SUBSCRIPTION_MAX_ENTRIES:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._parsed_subscriptions.pop(next(iter(self._parsed_subscriptions)))
+            self._parsed_subscriptions[digest] = subscription
+        return subscription
+    
+    def _breaker_open(self, url: str) -> bool:
+        """Whether deliveries to a URL are paused after repeated failures."""
+        open_until = self._open_until.get(url)
+        if open_until is None:
+            return False
+        if time.monotonic() < open_until:
+            return True
+        # Cool-down over: let the next delivery probe the URL again
+        del self._open_until[url]
+        return False
+    
+    def _record_failure(self, url: str):
+        """Count a failed attempt and open the breaker past the threshold."""
+        now = time.monotonic()
+        window_start, failures = self._url_failures.get(url, (now, 0))
+        if now - window_start > WEBHOOK_BREAKER_WINDOW_SECONDS:
+            window_start, failures = now, 0
+        failures += 1
+        
+        if failures >= WEBHOOK_BREAKER_FAILURES:
+            self._url_failures.pop(url, None)
+            self._open_until[url] = now + WEBHOOK_BREAKER_COOLDOWN_SECONDS
+            logger.warning("Webhook URL %s failing, pausing deliveries for %ds",
+                           url, WEBHOOK_BREAKER_COOLDOWN_SECONDS)
+        else:
+            self._url_failures[url] = (window_start, failures)
+    
+    def _stored_events(self, tenant_id: str, webhook_id: str) -> List[str]:
+        """Event types a stored subscription is currently indexed under."""
+        stored = self.cache.hash_get(self._subscriptions_key(tenant_id), webhook_id)
+        if not stored:
+            return []
+        # Only the event list is needed, so skip full model validation
+        return orjson.loads(stored).get("events", [])
     
     def add_webhook_subscription(self, subscription: WebhookSubscription) -> bool:
         """Add a new webhook subscription."""
@@ -54,31 +264,32 @@ class WebhookManager:
             return False
         
         try:
-            # Store subscription
-            webhook_key = f"webhook:{subscription.tenant_id}:{subscription.webhook_id}"
-            self.cache.set(
-                webhook_key,
-                subscription.model_dump_json(),
-                ttl=86400 * 30  # 30 days
-            )
-            
-            # Add to tenant's webhook list
-            tenant_webhooks_key = f"webhooks:tenant:{subscription.tenant_id}"
-            current_webhooks = self.cache.get(tenant_webhooks_key)
+            tenant_id = subscription.tenant_id
+            webhook_id = subscription.webhook_id
+            ttl = 86400 * 30  # 30 days
             
-            if current_webhooks:
-                webhook_list = json.loads(current_webhooks)
-            else:
-                webhook_list = []
+            # Re-subscribing may change the event list; drop stale index entries
+            previous_events = self._stored_events(tenant_id, webhook_id)
             
-            if subscription.webhook_id not in webhook_list:
-                webhook_list.append(subscription.webhook_id)
-                self.cache.set(tenant_webhooks_key, json.dumps(webhook_list), ttl=86400 * 30)
+            # The hash stores the subscription itself; one set per event type
+            # indexes it so delivery only loads matching subscriptions
+            with self.cache.pipeline() as pipe:
+                for event_type in set(previous_events) - set(subscription.events):
+                    pipe.set_remove(self._event_index_key(tenant_id, event_type), webhook_id)
+                pipe.hash_set(
+                    self._subscriptions_key(tenant_id),
+                    webhook_id,
+                    subscription.model_dump_json(),
+                    ttl=ttl
+                )
+                for event_type in subscription.events:
+                    pipe.set_add(self._event_index_key(tenant_id, event_type), webhook_id, ttl=ttl)
             
+            self._invalidate_subscription_cache(tenant_id)
             return True
             
         except Exception as e:
-            print(f"Failed to add webhook subscription: {e}")
+            logger.warning("Failed to add webhook subscription: %s", e)
             return False
     
     def get_webhook_subscriptions(self, tenant_id: str) -> List[WebhookSubscription]:
@@ -87,30 +298,20 @@ class WebhookManager:
             return []
         
         try:
-            tenant_webhooks_key = f"webhooks:tenant:{tenant_id}"
-            webhook_ids = self.cache.get(tenant_webhooks_key)
-            
-            if not webhook_ids:
-                return []
-            
-            webhook_list = json.loads(webhook_ids)
+            webhook_data = self.cache.hash_get_all(self._subscriptions_key(tenant_id))
             subscriptions = []
             
-            for webhook_id in webhook_list:
-                webhook_key = f"webhook:{tenant_id}:{webhook_id}"
-                webhook_data = self.cache.get(webhook_key)
-                
-                if webhook_data:
-                    try:
-                        subscription = WebhookSubscription.model_validate_json(webhook_data)
-                        subscriptions.append(subscription)
-                    except Exception as e:
-                        print(f"Failed to parse webhook {webhook_id}: {e}")
+            for webhook_id, subscription_json in webhook_data.items():
+                try:
+                    subscription = self._parse_subscription(subscription_json)
+                    subscriptions.append(subscription)
+                except Exception as e:
+                    logger.warning("Failed to parse webhook %s: %s", webhook_id.decode(), e)
             
             return subscriptions
             
         except Exception as e:
-            print(f"Failed to get webhook subscriptions: {e}")
+            logger.warning("Failed to get webhook subscriptions: %s", e)
             return []
     
     def remove_webhook_subscription(self, tenant_id: str, webhook_id: str) -> bool:
@@ -119,41 +320,70 @@ class WebhookManager:
             return False
         
         try:
-            # Remove subscription
-            webhook_key = f"webhook:{tenant_id}:{webhook_id}"
-            self.cache.delete(webhook_key)
+            events = self._stored_events(tenant_id, webhook_id)
             
-            # Update tenant's webhook list
-            tenant_webhooks_key = f"webhooks:tenant:{tenant_id}"
-            current_webhooks = self.cache.get(tenant_webhooks_key)
-            
-            if current_webhooks:
-                webhook_list = json.loads(current_webhooks)
-                if webhook_id in webhook_list:
-                    webhook_list.remove(webhook_id)
-                    self.cache.set(tenant_webhooks_key, json.dumps(webhook_list), ttl=86400 * 30)
+            with self.cache.pipeline() as pipe:
+                pipe.hash_delete(self._subscriptions_key(tenant_id), webhook_id)
+                for event_type in events:
+                    pipe.set_remove(self._event_index_key(tenant_id, event_type), webhook_id)
             
+            self._invalidate_subscription_cache(tenant_id)
             return True
             
         except Exception as e:
-            print(f"Failed to remove webhook subscription: {e}")
+            logger.warning("Failed to remove webhook subscription: %s", e)
             return False
     
+    def _get_event_subscriptions(self, tenant_id: str, event_type: str) -> List[WebhookSubscription]:
+        """Get the subscriptions indexed under an event type or '*'."""
+        cache_key = (tenant_id, event_type)
+        cached = self._subscription_cache.get(cache_key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        
+        if not self.cache.is_available():
+            return []
+        
+        try:
+            webhook_ids = list(self.cache.set_union(
+                self._event_index_key(tenant_id, event_type),
+                self._event_index_key(tenant_id, "*")
+            ))
+            webhook_values = self.cache.hash_get_many(self._subscriptions_key(tenant_id), webhook_ids)
+            
+            subscriptions = []
+            for webhook_id, subscription_json in zip(webhook_ids, webhook_values):
+                # Index entries can briefly outlive a removed subscription
+                if not subscription_json:
+                    continue
+                try:
+                    subscriptions.append(self._parse_subscription(subscription_json))
+                except Exception as e:
+                    logger.warning("Failed to parse webhook %s: %s", webhook_id.decode(), e)
+            
+            if cache_key not in self._subscription_cache and len(self._subscription_cache) >= SUBSCRIPTION_CACHE_MAX_ENTRIES:
+                # Evict the oldest entry (dicts keep insertion order)
+                self._subscription_cache.pop(next(iter(self._subscription_cache)))
+            self._subscription_cache[cache_key] = (
+                time.monotonic() + SUBSCRIPTION_CACHE_TTL_SECONDS,
+                subscriptions
+            )
+            
+            return subscriptions
+            
+        except Exception as e:
+            logger.warning("Failed to get webhook subscriptions: %s", e)
+            return []
+    
     async def send_webhook_event(self, event: WebhookEvent) -> Dict[str, Any]:
         """Send webhook event to all subscribed endpoints."""
-        if not self.session:
-            await self._initialize_session()
-        
-        subscriptions = self.get_webhook_subscriptions(event.tenant_id)
+        # Only subscriptions indexed under this event type (or '*') are loaded
+        subscriptions = self._get_event_subscriptions(event.tenant_id, event.event_type)
         
         if not subscriptions:
             return {"sent": 0, "message": "No webhook subscriptions found"}
         
-        # Filter subscriptions by event type
-        relevant_subscriptions = [
-            sub for sub in subscriptions 
-            if sub.enabled and (event.event_type in sub.events or '*' in sub.events)
-        ]
+        relevant_subscriptions = [sub for sub in subscriptions if sub.enabled]
         
         if not relevant_subscriptions:
             return {"sent": 0, "message": "No subscriptions for this event type"}
@@ -179,6 +409,10 @@ class WebhookManager:
     
     async def _deliver_webhook(self, event: WebhookEvent, subscription: WebhookSubscription) -> bool:
         """Deliver webhook to a single endpoint with retry logic."""
+        # Skip URLs that have been failing instead of retrying into an outage
+        if self._breaker_open(subscription.url):
+            return False
+        
         payload = {
             "event_type": event.event_type,
             "timestamp": event.timestamp,
@@ -188,74 +422,86 @@ class WebhookManager:
             "webhook_id": subscription.webhook_id
         }
         
-        headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "AI-Agent-Webhook/1.0"
-        }
+        # Serialize once: the signature covers exactly the bytes that are
+        # sent, and retries reuse the same body
+        body = orjson.dumps(payload)
         
         # Add signature if secret is provided
+        headers = _BASE_HEADERS
         if subscription.secret:
-            import hmac
-            import hashlib
-            
-            signature = hmac.new(
-                subscription.secret.encode(),
-                json.dumps(payload).encode(),
-                hashlib.sha256
-            ).hexdigest()
-            headers["X-Webhook-Signature"] = f"sha256={signature}"
+            # Start from the pre-keyed state instead of re-deriving the key pads
+            signer = _signing_hmac(subscription.secret).copy()
+            signer.update(body)
+            headers = {**_BASE_HEADERS, "X-Webhook-Signature": f"sha256={signer.hexdigest()}"}
+        
+        # Backoff schedule for the retries, computed once up front
+        retry_delays = [
+            subscription.retry_delay_seconds * (2 ** attempt if subscription.exponential_backoff else 1)
+            for attempt in range(subscription.max_retries)
+        ]
         
-        max_retries = subscription.retry_config.get("max_retries", 3)
-        retry_delay = subscription.retry_config.get("retry_delay_seconds", 5)
-        exponential_backoff = subscription.retry_config.get("exponential_backoff", True)
+        session = await self._get_session()
+        host_slots = self._host_slots_for(subscription.url)
         
-        for attempt in range(max_retries + 1):
+        for attempt in range(subscription.max_retries + 1):
             try:
-                async with self.session.post(
-                    subscription.url,
-                    json=payload,
-                    headers=headers
-                ) as response:
-                    if response.status in [200, 201, 202, 204]:
-                        return True
-                    
-                    print(f"Webhook delivery failed with status {response.status}")
+                # Slots are held for the request only, not the retry backoff
+                async with self._delivery_slots, host_slots:
+                    async with session.post(
+                        subscription.url,
+                        data=body,
+                        headers=headers
+                    ) as response:
+                        if response.status in [200, 201, 202, 204]:
+                            self._url_failures.pop(subscription.url, None)
+                            return True
+                        
+                        logger.warning("Webhook delivery failed status=%d url=%s", response.status, subscription.url)
                     
             except Exception as e:
-                print(f"Webhook delivery error (attempt {attempt + 1}): {e}")
+                logger.warning("Webhook delivery error (attempt %d) url=%s: %s", attempt + 1, subscription.url, e)
+            
+            self._record_failure(subscription.url)
+            if self._breaker_open(subscription.url):
+                return False
             
             # Wait before retry (except on last attempt)
-            if attempt < max_retries:
-                delay = retry_delay
-                if exponential_backoff:
-                    delay *= (2 ** attempt)
-                await asyncio.sleep(delay)
+            if attempt < subscription.max_retries:
+                await asyncio.sleep(retry_delays[attempt])
         
         return False
     
-    def get_webhook_stats(self, tenant_id: str) -> Dict[str, Any]:
-        """Get webhook statistics for a tenant."""
-        subscriptions = self.get_webhook_subscriptions(tenant_id)
+    def get_webhook_stats(self,
+                          tenant_id: str,
+                          subscriptions: Optional[List[WebhookSubscription]] = None) -> Dict[str, Any]:
+        """Get webhook statistics for a tenant.
         
-        stats = {
-            "total_webhooks": len(subscriptions),
-            "enabled_webhooks": sum(1 for sub in subscriptions if sub.enabled),
-            "event_types": set(),
-            "webhook_urls": []
-        }
+        Pass subscriptions already loaded for the tenant to avoid fetching
+        and parsing them a second time.
+        """
+        if subscriptions is None:
+            subscriptions = self.get_webhook_subscriptions(tenant_id)
+        
+        enabled_webhooks = 0
+        event_types = set()
+        webhook_urls = []
         
         for subscription in subscriptions:
-            stats["event_types"].update(subscription.events)
-            stats["webhook_urls"].append({
+            enabled_webhooks += subscription.enabled
+            event_types.update(subscription.events)
+            webhook_urls.append({
                 "webhook_id": subscription.webhook_id,
                 "url": subscription.url,
                 "enabled": subscription.enabled,
                 "events": subscription.events
             })
         
-        stats["event_types"] = list(stats["event_types"])
-        
-        return stats
+        return {
+            "total_webhooks": len(subscriptions),
+            "enabled_webhooks": enabled_webhooks,
+            "event_types": list(event_types),
+            "webhook_urls": webhook_urls
+        }
 
 
 # Global webhook manager instance
@@ -284,7 +530,7 @@ async def send_message_processed_webhook(
         }
     )
     
-    return await webhook_manager.send_webhook_event(event)
+    return {"queued": webhook_manager.enqueue_webhook_event(event)}
 
 
 async def send_error_webhook(
@@ -304,4 +550,4 @@ async def send_error_webhook(
         }
     )
     
-    return await webhook_manager.send_webhook_event(event)
+    return {"queued": webhook_manager.enqueue_webhook_event(event)}
@@ -2,20 +2,73 @@
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 import uvicorn
+import orjson
+import hashlib
+import logging
+import logging.handlers
 import os
-import sys
+import queue
+import re
+import time
+import uuid
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pathlib import Path
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
-# Add project root to Python path
-project_root = Path(__file__).parent.parent.parent
-sys.path.insert(0, str(project_root))
+import redis
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from celery.result import AsyncResult
 
-from agents_core.config.settings import settings
+from agents_core.config.settings import settings, get_tenant_config as load_tenant_config
+from agents_core.guardrails.input_validation import get_input_guardrails, get_output_guardrails
+from agents_core.infra.redis_pool import get_redis_client
+from agents_core.memory.conversation_memory import get_conversation_memory
+from agents_core.middleware.rate_limiting import apply_rate_limit, get_cache_manager, get_rate_limiter
+from agents_core.monitoring.error_tracking import error_tracker, performance_monitor
+from agents_core.observability.langfuse_client import langfuse_client
+from agents_core.orchestrator.agent import get_agent, run_agent, stream_agent
 from agents_core.schemas.message import MessageDTO, AgentResponse
+from agents_core.tools.advanced_tools import ADVANCED_TOOLS
+from agents_core.tools.business_tools import AVAILABLE_TOOLS
+from agents_core.webhooks.webhook_manager import (
+    WebhookEvent,
+    WebhookSubscription,
+    send_message_processed_webhook,
+    webhook_manager,
+)
+from workers.celery_worker.app import app as celery_app, BACKGROUND_QUEUE, IO_QUEUE
+from workers.celery_worker.tasks import cleanup_old_sessions, process_message_async
+from workers import redis_queue
+
+logger = logging.getLogger(__name__)
+
+
+def _configure_logging() -> Optional[logging.handlers.QueueListener]:
+    """Route application logs through a queue drained by a background thread.
+    
+    Request handlers only enqueue records; formatting and the stderr write
+    happen on the listener thread. Left alone if logging is already set up.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.DEBUG if settings.debug else getattr(logging, settings.log_level.upper(), logging.INFO))
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+_log_listener = _configure_logging()
 
 
 # Create FastAPI app
@@ -24,7 +77,9 @@ app = FastAPI(
     description="AI Agent Boilerplate using FastAPI + PydanticAI + OpenAI - UPDATED VERSION",
     version="0.2.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # Endpoint dicts are encoded with orjson rather than the stdlib json module
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -40,8 +95,8 @@ app.add_middleware(
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler."""
-    print(f"Global exception: {exc}")
-    return JSONResponse(
+    logger.exception("Global exception: %s", exc)
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -50,6 +105,25 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+@app.on_event("shutdown")
+async def close_webhook_session():
+    """Close pooled webhook connections on shutdown."""
+    await webhook_manager.close()
+
+
+@app.on_event("shutdown")
+async def flush_langfuse():
+    """Send any Langfuse events still queued on shutdown."""
+    langfuse_client.flush()
+
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    """Drain queued log records before exit."""
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -72,15 +146,34 @@ async def health_check():
     }
 
 
+# Cached /message replies are reused this long
+RESPONSE_CACHE_TTL_SECONDS = 300
+
+# Questions about the current moment must always reach the agent
+_TIME_SENSITIVE = re.compile(
+    r"\b(now|today|tonight|tomorrow|yesterday|current|currently|latest|"
+    r"hoy|ahora|mañana|ayer|actual)\b",
+    re.IGNORECASE
+)
+
+
+def _response_cache_key(message_dto: MessageDTO, text: str, session_summary: str) -> Optional[str]:
+    """Response cache key for a message, or None when it must not be cached."""
+    if _TIME_SENSITIVE.search(text):
+        return None
+    digest = hashlib.blake2b(
+        f"{settings.llm_model}\0{session_summary}\0{text}".encode(),
+        digest_size=16
+    ).hexdigest()
+    return f"response:{message_dto.tenant_id}:{message_dto.locale}:{digest}"
+
+
 @app.post("/message", response_model=AgentResponse)
 async def process_message(message_dto: MessageDTO, request: Request):
     """
     Process a chat message and return AI response using PydanticAI agent.
     UPDATED VERSION with Langfuse observability and rate limiting.
     """
-    from agents_core.observability.langfuse_client import langfuse_client
-    from agents_core.middleware.rate_limiting import apply_rate_limit
-    
     # Apply rate limiting (60 requests per minute per session)
     rate_limit_key = f"session:{message_dto.session_id}"
     rate_metadata = apply_rate_limit(
@@ -90,63 +183,58 @@ async def process_message(message_dto: MessageDTO, request: Request):
         error_message="Too many messages. Please wait before sending another."
     )
     
-    # Create Langfuse trace for observability
-    trace = langfuse_client.create_trace(
-        name="chat_message",
-        session_id=message_dto.session_id,
-        metadata={
-            "tenant_id": message_dto.tenant_id,
-            "locale": message_dto.locale,
-            "endpoint": "/message"
-        }
-    )
+    # Create Langfuse trace for a sampled share of requests; unsampled
+    # requests emit no events (errors are traced regardless, see below)
+    trace = None
+    if langfuse_client.should_sample():
+        trace = langfuse_client.create_trace(
+            name="chat_message",
+            session_id=message_dto.session_id,
+            start_event=False
+        )
+    
+    # The whole request is reported as one Langfuse event, filled in as
+    # processing goes and sent once at the end
+    span_input: Dict[str, Any] = {
+        "message": message_dto.text,
+        "session_id": message_dto.session_id,
+        "tenant_id": message_dto.tenant_id,
+        "locale": message_dto.locale
+    }
+    span_output: Dict[str, Any] = {}
+    span_metadata: Dict[str, Any] = {
+        "tenant_id": message_dto.tenant_id,
+        "locale": message_dto.locale,
+        "endpoint": "/message"
+    }
     
     try:
-        print(f"[UPDATED ENDPOINT] Processing message: {message_dto.text}")
+        logger.debug("Processing message: %s", message_dto.text)
         
         # Apply input guardrails
-        from agents_core.guardrails.input_validation import input_guardrails, output_guardrails
-        
-        is_valid, filtered_text, input_metadata = input_guardrails.validate_input(
+        is_valid, filtered_text, input_metadata = get_input_guardrails().validate_input(
             message_dto.text,
             message_dto.session_id
         )
         
         if not is_valid:
-            print(f"[GUARDRAILS] Input rejected: {input_metadata.get('flags', [])}")
+            logger.info("Input rejected by guardrails: %s", input_metadata.get('flags', []))
             
-            # Log to Langfuse
-            if trace:
-                langfuse_client.client.create_event(
-                    name="input_validation_failed",
-                    input={"original_message": message_dto.text, "validation": input_metadata},
-                    output={"error": "Input validation failed", "flags": input_metadata.get('flags', [])},
-                    metadata={
-                        "guardrails_triggered": True,
-                        "trace_id": trace
-                    }
-                )
-                langfuse_client.flush()
+            span_input["validation"] = input_metadata
+            span_output["flags"] = input_metadata.get('flags', [])
+            span_metadata["guardrails_triggered"] = True
             
             raise HTTPException(
                 status_code=400,
                 detail="Your message contains content that cannot be processed. Please rephrase and try again."
             )
         
-        print(f"[GUARDRAILS] Input validated successfully")
-        
-        # Import the agent and tools
-        from agents_core.orchestrator.agent import run_agent
-        from agents_core.config.settings import get_tenant_config
-        
-        print("[UPDATED ENDPOINT] Imported agent functions successfully")
-        
         # Get tenant configuration
-        tenant_config = get_tenant_config(message_dto.tenant_id)
-        print(f"[UPDATED ENDPOINT] Got tenant config for {tenant_config.tenant_id}")
+        tenant_config = load_tenant_config(message_dto.tenant_id)
+        logger.debug("Got tenant config for %s", tenant_config.tenant_id)
         
         # Get conversation memory
-        from agents_core.memory.conversation_memory import conversation_memory
+        conversation_memory = get_conversation_memory()
         
         # Get session context
         session_summary = conversation_memory.generate_context_summary(
@@ -154,147 +242,366 @@ async def process_message(message_dto: MessageDTO, request: Request):
             message_dto.tenant_id
         )
         
-        print(f"[UPDATED ENDPOINT] Session summary: {session_summary[:100] if session_summary else 'No history'}")
-        
-        # Log input to Langfuse
-        if trace:
-            langfuse_client.client.create_event(
-                name="message_input",
-                input={
-                    "message": message_dto.text,
-                    "session_id": message_dto.session_id,
-                    "tenant_id": message_dto.tenant_id,
-                    "locale": message_dto.locale,
-                    "session_summary": session_summary
-                },
-                metadata={"trace_id": trace}
-            )
-        
-        # Run the AI agent with filtered input
-        agent_result = await run_agent(
-            message=filtered_text,  # Use filtered text instead of original
-            session_id=message_dto.session_id,
-            tenant_config=tenant_config,
-            session_summary=session_summary,
-            language=message_dto.locale,
-            trace_id=trace if trace else None
-        )
-        
-        print(f"[UPDATED ENDPOINT] Agent result: {agent_result['reply'][:50]}...")
+        logger.debug("Session summary: %.100s", session_summary or "No history")
         
-        # Apply output guardrails
-        output_valid, filtered_reply, output_metadata = output_guardrails.validate_output(
-            agent_result["reply"],
-            agent_result["confidence"],
-            agent_result["tools_used"],
-            agent_result["metadata"]
-        )
+        span_input["session_summary"] = session_summary
         
-        print(f"[GUARDRAILS] Output validated: {output_valid}")
+        # Identical questions with identical context get the cached answer
+        # instead of another LLM call
+        cache_manager = get_cache_manager()
+        response_cache_key = _response_cache_key(message_dto, filtered_text, session_summary)
+        cached_response = cache_manager.get_bytes(response_cache_key) if response_cache_key else None
         
-        # Convert agent result to API response
-        response = AgentResponse(
-            reply=filtered_reply,  # Use filtered reply
-            session_id=agent_result["session_id"],
-            confidence=agent_result["confidence"],
-            tools_used=agent_result["tools_used"],
-            metadata={
-                **agent_result["metadata"],
+        if cached_response:
+            response = AgentResponse.model_validate_json(cached_response)
+            response.session_id = message_dto.session_id
+            response.metadata = {
+                **response.metadata,
                 "input_guardrails": input_metadata,
-                "output_guardrails": output_metadata,
-                "rate_limit": rate_metadata
+                "rate_limit": rate_metadata,
+                "response_cache": "hit"
             }
-        )
-        
-        # Log output to Langfuse
-        if trace:
-            langfuse_client.client.create_event(
-                name="message_output",
-                output={
-                    "reply": response.reply,
-                    "confidence": response.confidence,
-                    "tools_used": response.tools_used,
-                    "success": True
-                },
+        else:
+            # Run the AI agent with filtered input
+            agent_result = await run_agent(
+                message=filtered_text,  # Use filtered text instead of original
+                session_id=message_dto.session_id,
+                tenant_config=tenant_config,
+                session_summary=session_summary,
+                language=message_dto.locale,
+                trace_id=trace if trace else None
+            )
+            
+            logger.debug("Agent result: %.50s...", agent_result['reply'])
+            
+            # Apply output guardrails
+            output_valid, filtered_reply, output_metadata = get_output_guardrails().validate_output(
+                agent_result["reply"],
+                agent_result["confidence"],
+                agent_result["tools_used"],
+                agent_result["metadata"]
+            )
+            
+            logger.debug("Output validated: %s", output_valid)
+            
+            # Convert agent result to API response
+            response = AgentResponse(
+                reply=filtered_reply,  # Use filtered reply
+                session_id=agent_result["session_id"],
+                confidence=agent_result["confidence"],
+                tools_used=agent_result["tools_used"],
                 metadata={
-                    "tokens_used": agent_result["metadata"].get("tokens_used", 0),
-                    "model_used": agent_result["metadata"].get("model_used", ""),
-                    "response_length": len(response.reply),
-                    "trace_id": trace
+                    **agent_result["metadata"],
+                    "input_guardrails": input_metadata,
+                    "output_guardrails": output_metadata,
+                    "rate_limit": rate_metadata
                 }
             )
+            
+            span_metadata["tokens_used"] = agent_result["metadata"].get("tokens_used", 0)
+            
+            # Replies that ran tools (bookings, emails, payments) have side
+            # effects and are never replayed from cache; neither are error
+            # and fallback replies, so one failed LLM call is not served to
+            # everyone asking the same question
+            if (response_cache_key
+                    and not response.tools_used
+                    and "error" not in response.metadata
+                    and response.confidence > 0
+                    and not output_metadata.get("flags")):
+                cache_manager.set(response_cache_key, response.model_dump_json(), ttl=RESPONSE_CACHE_TTL_SECONDS)
+        
+        # Save both turns of the conversation to memory in one round trip;
+        # greetings and similar low-signal exchanges are not kept
+        if conversation_memory.should_persist(message_dto.text):
+            conversation_memory.add_messages(
+                session_id=message_dto.session_id,
+                tenant_id=message_dto.tenant_id,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": message_dto.text,
+                        "metadata": {"locale": message_dto.locale}
+                    },
+                    {
+                        "role": "assistant",
+                        "content": response.reply,
+                        "metadata": {
+                            "confidence": response.confidence,
+                            "tools_used": response.tools_used,
+                            "model": response.metadata.get("model_used", "")
+                        }
+                    }
+                ]
+            )
         
-        # Save conversation to memory
-        conversation_memory.add_message(
-            session_id=message_dto.session_id,
-            tenant_id=message_dto.tenant_id,
-            role="user",
-            content=message_dto.text,
-            metadata={"locale": message_dto.locale}
-        )
-        
-        conversation_memory.add_message(
-            session_id=message_dto.session_id,
-            tenant_id=message_dto.tenant_id,
-            role="assistant",
-            content=response.reply,
-            metadata={
-                "confidence": response.confidence,
-                "tools_used": response.tools_used,
-                "model": agent_result["metadata"].get("model_used", "")
-            }
-        )
+        logger.debug("Returning response with confidence: %s", response.confidence)
         
-        print(f"[UPDATED ENDPOINT] Returning response with confidence: {response.confidence}")
+        span_output.update({
+            "reply": response.reply,
+            "confidence": response.confidence,
+            "tools_used": response.tools_used,
+            "success": True
+        })
+        span_metadata["model_used"] = response.metadata.get("model_used", "")
+        span_metadata["response_length"] = len(response.reply)
+        span_metadata["response_cache"] = "hit" if cached_response else "miss"
         
-        # Send webhook notification (async, don't wait)
+        # Send webhook notification; this only queues the event for the
+        # webhook manager's bounded delivery workers, so it returns at once
         try:
-            from agents_core.webhooks.webhook_manager import send_message_processed_webhook
-            asyncio.create_task(send_message_processed_webhook(
+            await send_message_processed_webhook(
                 tenant_id=message_dto.tenant_id,
                 session_id=message_dto.session_id,
                 message=filtered_text,
                 reply=response.reply,
                 tools_used=response.tools_used,
                 confidence=response.confidence
-            ))
+            )
         except Exception as e:
-            print(f"Webhook notification failed: {e}")
+            logger.warning("Webhook notification failed: %s", e)
         
         return response
         
     except Exception as e:
-        print(f"[UPDATED ENDPOINT] Error in process_message: {str(e)}")
+        logger.exception("Error in process_message: %s", e)
         
-        # Log error to Langfuse
-        if trace:
-            langfuse_client.client.create_event(
-                name="message_error",
-                output={"error": str(e), "success": False},
-                metadata={
-                    "error_type": type(e).__name__,
-                    "trace_id": trace
-                }
+        # Failed requests are always traced
+        if not trace:
+            trace = langfuse_client.create_trace(
+                name="chat_message",
+                session_id=message_dto.session_id,
+                start_event=False
             )
+        span_output["error"] = str(e)
+        span_output["success"] = False
+        span_metadata["error_type"] = type(e).__name__
         
-        import traceback
-        traceback.print_exc()
         raise HTTPException(
             status_code=500,
             detail=f"Error processing message: {str(e)}"
         )
     finally:
-        # Ensure Langfuse events are sent
-        langfuse_client.flush()
+        if trace:
+            span_metadata["trace_id"] = trace
+            langfuse_client.create_event(
+                name="chat_message",
+                input=span_input,
+                output=span_output,
+                metadata=span_metadata
+            )
+        
+        # The SDK exports events in the background; block only when a
+        # flush is enforced (e.g. for tests)
+        if settings.langfuse_enforce_flush:
+            langfuse_client.flush()
+
+
+@app.post("/message/stream")
+async def process_message_stream(message_dto: MessageDTO):
+    """
+    Process a chat message and stream the reply as plain text chunks.
+    
+    Same rate limiting, guardrails, memory, tracing and webhook as
+    /message, but the reply is sent as the model produces it. Forbidden
+    patterns are filtered chunk by chunk (holding back a short tail); the
+    full output validation runs on the finished reply before it is saved.
+    The response cache needs the whole reply, so it does not apply here.
+    """
+    rate_limit_key = f"session:{message_dto.session_id}"
+    apply_rate_limit(
+        identifier=rate_limit_key,
+        limit=60,
+        window=60,
+        error_message="Too many messages. Please wait before sending another."
+    )
+    
+    trace = None
+    if langfuse_client.should_sample():
+        trace = langfuse_client.create_trace(
+            name="chat_message_stream",
+            session_id=message_dto.session_id,
+            start_event=False
+        )
+    
+    span_input: Dict[str, Any] = {
+        "message": message_dto.text,
+        "session_id": message_dto.session_id,
+        "tenant_id": message_dto.tenant_id,
+        "locale": message_dto.locale
+    }
+    span_output: Dict[str, Any] = {}
+    span_metadata: Dict[str, Any] = {
+        "tenant_id": message_dto.tenant_id,
+        "locale": message_dto.locale,
+        "endpoint": "/message/stream"
+    }
+    
+    def finish_trace():
+        """Send this request's Langfuse event (always for failures)."""
+        nonlocal trace
+        if not trace and span_output.get("success") is False:
+            trace = langfuse_client.create_trace(
+                name="chat_message_stream",
+                session_id=message_dto.session_id,
+                start_event=False
+            )
+        if trace:
+            span_metadata["trace_id"] = trace
+            langfuse_client.create_event(
+                name="chat_message_stream",
+                input=span_input,
+                output=span_output,
+                metadata=span_metadata
+            )
+        if settings.langfuse_enforce_flush:
+            langfuse_client.flush()
+    
+    def record_failure(e: Exception):
+        logger.exception("Error in process_message_stream: %s", e)
+        error_tracker.log_error(e, {
+            "endpoint": "/message/stream",
+            "session_id": message_dto.session_id,
+            "tenant_id": message_dto.tenant_id
+        })
+        span_output["error"] = str(e)
+        span_output["success"] = False
+        span_metadata["error_type"] = type(e).__name__
+        finish_trace()
+    
+    try:
+        is_valid, filtered_text, input_metadata = get_input_guardrails().validate_input(
+            message_dto.text,
+            message_dto.session_id
+        )
+        if not is_valid:
+            logger.info("Input rejected by guardrails: %s", input_metadata.get('flags', []))
+            span_input["validation"] = input_metadata
+            span_output["flags"] = input_metadata.get('flags', [])
+            span_metadata["guardrails_triggered"] = True
+            finish_trace()
+            raise HTTPException(
+                status_code=400,
+                detail="Your message contains content that cannot be processed. Please rephrase and try again."
+            )
+        
+        tenant_config = load_tenant_config(message_dto.tenant_id)
+        conversation_memory = get_conversation_memory()
+        session_summary = conversation_memory.generate_context_summary(
+            message_dto.session_id,
+            message_dto.tenant_id
+        )
+        span_input["session_summary"] = session_summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        record_failure(e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing message: {str(e)}"
+        )
+    
+    output_guardrails = get_output_guardrails()
+    
+    async def reply_chunks():
+        parts = []
+        modifications: List[str] = []
+        outcome: Dict[str, Any] = {}
+        try:
+            async for delta in output_guardrails.filter_stream(
+                stream_agent(
+                    message=filtered_text,
+                    session_id=message_dto.session_id,
+                    tenant_config=tenant_config,
+                    session_summary=session_summary,
+                    language=message_dto.locale,
+                    outcome=outcome
+                ),
+                modifications
+            ):
+                parts.append(delta)
+                yield delta
+            
+            # Full validation of the finished reply; what is saved and
+            # reported is the validated text
+            _, reply, output_metadata = output_guardrails.validate_output(
+                "".join(parts),
+                outcome["confidence"],
+                outcome["tools_used"],
+                {}
+            )
+            output_metadata["stream_modifications"] = modifications
+            
+            if conversation_memory.should_persist(message_dto.text):
+                conversation_memory.add_messages(
+                    session_id=message_dto.session_id,
+                    tenant_id=message_dto.tenant_id,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": message_dto.text,
+                            "metadata": {"locale": message_dto.locale}
+                        },
+                        {
+                            "role": "assistant",
+                            "content": reply,
+                            "metadata": {
+                                "confidence": outcome["confidence"],
+                                "tools_used": outcome["tools_used"],
+                                "model": settings.llm_model,
+                                "streamed": True
+                            }
+                        }
+                    ]
+                )
+            
+            span_output.update({
+                "reply": reply,
+                "confidence": outcome["confidence"],
+                "tools_used": outcome["tools_used"],
+                "success": "error" not in outcome
+            })
+            if "error" in outcome:
+                # The agent failed and a fallback reply was streamed instead
+                span_output["error"] = outcome["error"]
+                error_tracker.log_error(RuntimeError(outcome["error"]), {
+                    "endpoint": "/message/stream",
+                    "session_id": message_dto.session_id,
+                    "tenant_id": message_dto.tenant_id
+                })
+            span_metadata.update({
+                "model_used": settings.llm_model,
+                "tokens_used": outcome["tokens_used"],
+                "response_length": len(reply),
+                "input_guardrails": input_metadata,
+                "output_guardrails": output_metadata
+            })
+            finish_trace()
+            
+            try:
+                await send_message_processed_webhook(
+                    tenant_id=message_dto.tenant_id,
+                    session_id=message_dto.session_id,
+                    message=filtered_text,
+                    reply=reply,
+                    tools_used=outcome["tools_used"],
+                    confidence=outcome["confidence"]
+                )
+            except Exception as e:
+                logger.warning("Webhook notification failed: %s", e)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated body
+            record_failure(e)
+            raise
+    
+    return StreamingResponse(reply_chunks(), media_type="text/plain; charset=utf-8")
 
 
 @app.get("/config/{tenant_id}")
 async def get_tenant_config(tenant_id: str):
     """Get tenant configuration."""
-    from agents_core.config.settings import get_tenant_config
-    
     try:
-        config = get_tenant_config(tenant_id)
+        config = load_tenant_config(tenant_id)
         return config.to_dict()
     except Exception as e:
         raise HTTPException(
@@ -306,9 +613,7 @@ async def get_tenant_config(tenant_id: str):
 @app.get("/metrics/system")
 async def get_system_metrics():
     """Get system metrics and health information."""
-    from agents_core.observability.langfuse_client import langfuse_client
-    from agents_core.memory.conversation_memory import conversation_memory
-    from agents_core.orchestrator.agent import get_agent
+    conversation_memory = get_conversation_memory()
     
     metrics = {
         "system_status": "healthy",
@@ -337,40 +642,67 @@ async def get_system_metrics():
     return metrics
 
 
+@lru_cache(maxsize=1)
+def _available_tools_json() -> bytes:
+    """Serialized tool listing; the tool metadata is static per process."""
+    # Prepare tools with safe serialization
+    def prepare_tool(tool):
+        safe_tool = {
+            "name": tool["name"],
+            "description": tool["description"],
+            "category": tool.get("category", "general")
+        }
+        # Only include parameters if they're serializable
+        if tool.get("parameters") and not hasattr(tool["parameters"], "model_json_schema"):
+            safe_tool["parameters"] = tool["parameters"]
+        return safe_tool
+    
+    safe_basic_tools = [prepare_tool(tool) for tool in AVAILABLE_TOOLS]
+    safe_advanced_tools = [prepare_tool(tool) for tool in ADVANCED_TOOLS]
+    
+    all_tools = safe_basic_tools + safe_advanced_tools
+    categories = set()
+    for tool in all_tools:
+        categories.add(tool["category"])
+    
+    return orjson.dumps({
+        "basic_tools": safe_basic_tools,
+        "advanced_tools": safe_advanced_tools,
+        "all_tools": all_tools,
+        "total_count": len(all_tools),
+        "categories": list(categories)
+    })
+
+
+@lru_cache(maxsize=1)
+def _available_tools_etag() -> str:
+    """Strong ETag for the tool listing (a digest of its bytes)."""
+    return '"' + hashlib.blake2b(_available_tools_json(), digest_size=8).hexdigest() + '"'
+
+
+@app.on_event("startup")
+async def warm_tools_payload():
+    """Build the tool listing at startup so no request pays for it."""
+    try:
+        _available_tools_etag()
+    except Exception as e:
+        logger.warning("Tool listing not prebuilt: %s", e)
+
+
 @app.get("/tools/available")
-async def get_available_tools():
+async def get_available_tools(request: Request):
     """Get list of available business tools."""
     try:
-        from agents_core.tools.business_tools import AVAILABLE_TOOLS
-        from agents_core.tools.advanced_tools import ADVANCED_TOOLS
-        
-        # Prepare tools with safe serialization
-        def prepare_tool(tool):
-            safe_tool = {
-                "name": tool["name"],
-                "description": tool["description"],
-                "category": tool.get("category", "general")
-            }
-            # Only include parameters if they're serializable
-            if tool.get("parameters") and not hasattr(tool["parameters"], "model_json_schema"):
-                safe_tool["parameters"] = tool["parameters"]
-            return safe_tool
-        
-        safe_basic_tools = [prepare_tool(tool) for tool in AVAILABLE_TOOLS]
-        safe_advanced_tools = [prepare_tool(tool) for tool in ADVANCED_TOOLS]
-        
-        all_tools = safe_basic_tools + safe_advanced_tools
-        categories = set()
-        for tool in all_tools:
-            categories.add(tool["category"])
-        
-        return {
-            "basic_tools": safe_basic_tools,
-            "advanced_tools": safe_advanced_tools,
-            "all_tools": all_tools,
-            "total_count": len(all_tools),
-            "categories": list(categories)
-        }
+        # Built and serialized on first request, then served as stored bytes;
+        # clients holding the current ETag get an empty 304 instead
+        etag = _available_tools_etag()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(
+            content=_available_tools_json(),
+            media_type="application/json",
+            headers={"ETag": etag}
+        )
         
     except Exception as e:
         # Fallback response if there are issues with tools
@@ -385,16 +717,33 @@ async def get_available_tools():
         }
 
 
+# /celery/status results are reused this long; worker inspection
+# broadcasts to every worker and waits up to its timeout for replies
+CELERY_STATUS_TTL_SECONDS = 3.0
+
+_celery_status_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
 @app.get("/celery/status")
 async def get_celery_status():
     """Get Celery worker status and statistics."""
+    global _celery_status_cache
+    
+    cached = _celery_status_cache
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # Redis and Celery inspection calls block; keep them off the event loop
+    status = await asyncio.to_thread(_celery_status)
+    _celery_status_cache = (time.monotonic() + CELERY_STATUS_TTL_SECONDS, status)
+    return status
+
+
+def _celery_status() -> Dict[str, Any]:
+    """Collect Celery worker status (blocking)."""
     try:
-        from workers.celery_worker.app import app as celery_app
-        import redis
-        
-        # Test basic Redis connectivity first
-        redis_url = settings.get_redis_url_for_memory()
-        redis_client = redis.from_url(redis_url, socket_connect_timeout=2)
+        # Test basic Redis connectivity first, over the shared pool
+        redis_client = get_redis_client()
         redis_client.ping()
         
         # Get inspect instance with timeout
@@ -454,8 +803,6 @@ async def get_celery_status():
 async def test_celery_task():
     """Test Celery by running a simple cleanup task."""
     try:
-        from workers.celery_worker.tasks import cleanup_old_sessions
-        
         # Submit task
         result = cleanup_old_sessions.delay()
         
@@ -478,8 +825,6 @@ async def test_celery_task():
 async def process_message_async_endpoint(message_dto: MessageDTO):
     """Process message asynchronously using Celery."""
     try:
-        from workers.celery_worker.tasks import process_message_async
-        
         # Prepare message data for Celery
         message_data = {
             "message": message_dto.text,
@@ -488,14 +833,25 @@ async def process_message_async_endpoint(message_dto: MessageDTO):
             "locale": message_dto.locale
         }
         
-        # Submit to Celery
-        result = process_message_async.delay(message_data)
+        if settings.async_queue_backend == "redis":
+            # Plain Redis list: one LPUSH, no Celery dispatch overhead
+            task_id = uuid.uuid4().hex
+            await asyncio.to_thread(redis_queue.enqueue_message, task_id, message_data)
+        else:
+            # Submit to Celery (routed to the IO queue); fail fast instead of
+            # retrying the publish, and let workers drop messages nobody
+            # picked up within two minutes
+            task_id = process_message_async.apply_async(
+                args=[message_data],
+                expires=120,
+                retry=False
+            ).id
         
         return {
-            "task_id": result.id,
+            "task_id": task_id,
             "status": "submitted",
             "message": "Message submitted for async processing",
-            "check_status_url": f"/celery/task/{result.id}"
+            "check_status_url": f"/celery/task/{task_id}"
         }
         
     except Exception as e:
@@ -505,42 +861,116 @@ async def process_message_async_endpoint(message_dto: MessageDTO):
         )
 
 
+# Upper bound for the ?wait= long-poll on task status
+MAX_TASK_WAIT_SECONDS = 30.0
+
+# Long-polls each hold a thread and a blocking connection for up to
+# MAX_TASK_WAIT_SECONDS, so only this many run at once, on their own
+# threads; further ?wait= requests get the current status with a 202
+# and re-poll instead of starving the default executor
+MAX_TASK_WAITERS = 8
+
+_task_waiters = asyncio.Semaphore(MAX_TASK_WAITERS)
+_task_wait_executor = ThreadPoolExecutor(max_workers=MAX_TASK_WAITERS, thread_name_prefix="task-wait")
+
+
+@app.on_event("shutdown")
+async def stop_task_wait_executor():
+    """Stop the long-poll threads on shutdown."""
+    _task_wait_executor.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/celery/task/{task_id}")
-async def get_celery_task_status(task_id: str):
-    """Get the status of a Celery task by ID."""
+async def get_celery_task_status(task_id: str, wait: float = 0):
+    """Get the status of a Celery task by ID.
+    
+    With ?wait=N the request blocks up to N seconds (capped) until the task
+    finishes, so clients get the result in one call instead of polling.
+    When too many requests are already waiting it answers at once with
+    202 and a Retry-After header while the task is still pending.
+    """
+    wait = min(max(wait, 0.0), MAX_TASK_WAIT_SECONDS)
+    throttled = bool(wait) and _task_waiters.locked()
     try:
-        from workers.celery_worker.app import app as celery_app
-        from celery.result import AsyncResult
-        
-        # Get task result
-        result = AsyncResult(task_id, app=celery_app)
-        
-        return {
-            "task_id": task_id,
-            "status": result.status,
-            "result": result.result if result.ready() else None,
-            "successful": result.successful() if result.ready() else None,
-            "failed": result.failed() if result.ready() else None,
-            "traceback": str(result.traceback) if result.failed() else None,
-            "ready": result.ready(),
-            "info": result.info
-        }
+        if wait and not throttled:
+            async with _task_waiters:
+                status = await asyncio.get_running_loop().run_in_executor(
+                    _task_wait_executor, _task_status, task_id, wait
+                )
+        else:
+            status = await asyncio.to_thread(_task_status, task_id, 0.0)
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get task status: {str(e)}"
         )
+    
+    if throttled and not status["ready"]:
+        return ORJSONResponse(status_code=202, content=status, headers={"Retry-After": "1"})
+    return status
+
+
+def _task_status(task_id: str, wait: float) -> Dict[str, Any]:
+    """Look up a task's status, waiting up to `wait` seconds for it (blocking)."""
+    if settings.async_queue_backend == "redis":
+        if wait:
+            stored = redis_queue.wait_result(task_id, wait)
+        else:
+            stored = redis_queue.get_result(task_id)
+        ready = stored is not None
+        return {
+            "task_id": task_id,
+            "status": "SUCCESS" if ready else "PENDING",
+            "result": stored,
+            "successful": True if ready else None,
+            "failed": False if ready else None,
+            "traceback": None,
+            "ready": ready,
+            "info": stored
+        }
+    
+    # Each property reads the result backend
+    result = AsyncResult(task_id, app=celery_app)
+    if wait and not result.ready():
+        try:
+            # Subscribes to the result backend; returns on completion
+            result.get(timeout=wait, propagate=False)
+        except CeleryTimeoutError:
+            pass
+    return {
+        "task_id": task_id,
+        "status": result.status,
+        "result": result.result if result.ready() else None,
+        "successful": result.successful() if result.ready() else None,
+        "failed": result.failed() if result.ready() else None,
+        "traceback": str(result.traceback) if result.failed() else None,
+        "ready": result.ready(),
+        "info": result.info
+    }
+
+
+@app.get("/celery/task/{task_id}/result")
+async def get_celery_task_full_result(task_id: str):
+    """Get the full agent payload of a finished async message task."""
+    if settings.async_queue_backend == "redis":
+        stored = await asyncio.to_thread(redis_queue.get_result, task_id)
+        payload = stored.get("result") if stored else None
+    else:
+        payload = await asyncio.to_thread(get_conversation_memory().get_full_result, task_id)
+    
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return payload
 
 
 @app.post("/celery/process-direct")
 async def process_celery_task_directly():
     """Process a Celery task directly (for testing when workers aren't accessible)."""
     try:
-        from workers.celery_worker.tasks import cleanup_old_sessions
-        
-        # Execute task directly instead of queueing
-        result = cleanup_old_sessions()
+        # Execute task directly instead of queueing; it scans Redis, so
+        # keep it off the event loop
+        result = await asyncio.to_thread(cleanup_old_sessions)
         
         return {
             "success": True,
@@ -560,22 +990,28 @@ async def process_celery_task_directly():
 @app.get("/celery/queue-status")
 async def get_queue_status():
     """Get current queue status and statistics."""
+    return await asyncio.to_thread(_queue_status)
+
+
+def _queue_status() -> Dict[str, Any]:
+    """Collect queue statistics from Redis (blocking)."""
     try:
-        import redis
-        
         redis_url = settings.get_redis_url_for_memory()
-        redis_client = redis.from_url(redis_url)
+        redis_client = get_redis_client()
         
         # Get queue information
         queue_info = {
-            "agent_tasks_queue": redis_client.llen("agent_tasks"),
+            "agent_io_queue": redis_client.llen(IO_QUEUE),
+            "agent_bg_queue": redis_client.llen(BACKGROUND_QUEUE),
             "default_queue": redis_client.llen("celery"),
-            "total_redis_keys": len(redis_client.keys("*")),
-            "celery_keys": len(redis_client.keys("celery*")),
+            # DBSIZE and an incremental SCAN instead of KEYS, which blocks
+            # Redis while it walks the whole keyspace
+            "total_redis_keys": redis_client.dbsize(),
+            "celery_keys": sum(1 for _ in redis_client.scan_iter(match="celery*", count=1000)),
         }
         
         # Try to peek at queue content (first few items)
-        queue_items = redis_client.lrange("agent_tasks", 0, 2)
+        queue_items = redis_client.lrange(IO_QUEUE, 0, 2)
         
         return {
             "queue_info": queue_info,
@@ -595,8 +1031,6 @@ async def get_queue_status():
 @app.get("/monitoring/errors")
 async def get_error_monitoring():
     """Get error monitoring statistics."""
-    from agents_core.monitoring.error_tracking import error_tracker
-    
     try:
         stats = error_tracker.get_error_stats()
         recent_errors = error_tracker.get_recent_errors(10)
@@ -618,8 +1052,6 @@ async def get_error_monitoring():
 @app.get("/monitoring/performance/{endpoint}")
 async def get_performance_stats(endpoint: str):
     """Get performance statistics for a specific endpoint."""
-    from agents_core.monitoring.error_tracking import performance_monitor
-    
     try:
         stats = performance_monitor.get_performance_stats(endpoint)
         return stats
@@ -631,41 +1063,81 @@ async def get_performance_stats(endpoint: str):
         }
 
 
+# /monitoring/health results are reused this long, so frequent probes
+# share one round of component checks
+HEALTH_CACHE_TTL_SECONDS = 2.0
+
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
+def _component_availability() -> Dict[str, bool]:
+    """Availability of each component (blocking: may ping Redis)."""
+    return {
+        "openai_agent": get_agent() is not None,
+        "langfuse": langfuse_client.is_available(),
+        "redis_memory": get_conversation_memory().is_available(),
+        "rate_limiter": get_rate_limiter().is_available(),
+        "cache_manager": get_cache_manager().is_available(),
+        "error_tracking": error_tracker.cache.is_available()
+    }
+
+
 @app.get("/monitoring/health")
-async def comprehensive_health_check():
-    """Comprehensive health check with all system components."""
-    from agents_core.observability.langfuse_client import langfuse_client
-    from agents_core.memory.conversation_memory import conversation_memory
-    from agents_core.orchestrator.agent import get_agent
-    from agents_core.middleware.rate_limiting import rate_limiter, cache_manager
-    from agents_core.monitoring.error_tracking import error_tracker
+async def comprehensive_health_check(include: str = ""):
+    """Comprehensive health check with all system components.
+    
+    `include=celery` adds the (separately cached) /celery/status payload,
+    so one probe covers both.
+    """
+    health_data = await _comprehensive_health()
+    if "celery" in include.split(","):
+        health_data = {**health_data, "celery": await get_celery_status()}
+    return health_data
+
+
+async def _comprehensive_health() -> Dict[str, Any]:
+    """Build the component health report, reusing it for a short TTL."""
+    global _health_cache
+    
+    cached = _health_cache
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # Component checks and error statistics run concurrently, off the loop
+    available, error_stats = await asyncio.gather(
+        asyncio.to_thread(_component_availability),
+        asyncio.to_thread(error_tracker.get_error_stats),
+        return_exceptions=True
+    )
+    if isinstance(available, Exception):
+        available = {}
     
     health_data = {
         "timestamp": datetime.now().isoformat(),
         "overall_status": "healthy",
         "components": {
             "openai_agent": {
-                "status": "healthy" if get_agent() is not None else "unavailable",
+                "status": "healthy" if available.get("openai_agent") else "unavailable",
                 "details": "AI agent initialized and ready"
             },
             "langfuse": {
-                "status": "healthy" if langfuse_client.is_available() else "unavailable",
+                "status": "healthy" if available.get("langfuse") else "unavailable",
                 "details": "Observability and tracing system"
             },
             "redis_memory": {
-                "status": "healthy" if conversation_memory.is_available() else "unavailable",
+                "status": "healthy" if available.get("redis_memory") else "unavailable",
                 "details": "Conversation memory and session storage"
             },
             "rate_limiter": {
-                "status": "healthy" if rate_limiter.is_available() else "unavailable",
+                "status": "healthy" if available.get("rate_limiter") else "unavailable",
                 "details": "API rate limiting protection"
             },
             "cache_manager": {
-                "status": "healthy" if cache_manager.is_available() else "unavailable",
+                "status": "healthy" if available.get("cache_manager") else "unavailable",
                 "details": "Response caching and performance optimization"
             },
             "error_tracking": {
-                "status": "healthy" if error_tracker.cache.is_available() else "limited",
+                "status": "healthy" if available.get("error_tracking") else "limited",
                 "details": "Error monitoring and tracking system"
             }
         },
@@ -686,8 +1158,9 @@ async def comprehensive_health_check():
             break
     
     # Add error statistics
-    try:
-        error_stats = error_tracker.get_error_stats()
+    if isinstance(error_stats, Exception):
+        health_data["error_summary"] = {"error": str(error_stats)}
+    else:
         health_data["error_summary"] = {
             "last_24h_errors": error_stats.get("last_24h", 0),
             "error_rate_per_hour": error_stats.get("error_rate", 0),
@@ -697,18 +1170,14 @@ async def comprehensive_health_check():
         # Mark as degraded if high error rate
         if error_stats.get("error_rate", 0) > 10:  # More than 10 errors per hour
             health_data["overall_status"] = "degraded"
-            
-    except Exception as e:
-        health_data["error_summary"] = {"error": str(e)}
     
+    _health_cache = (time.monotonic() + HEALTH_CACHE_TTL_SECONDS, health_data)
     return health_data
 
 
 @app.post("/webhooks/subscribe")
 async def subscribe_webhook(request: Request):
     """Subscribe to webhook events."""
-    from agents_core.webhooks.webhook_manager import webhook_manager, WebhookSubscription
-    
     try:
         webhook_data = await request.json()
         subscription = WebhookSubscription(**webhook_data)
@@ -737,11 +1206,9 @@ async def subscribe_webhook(request: Request):
 @app.get("/webhooks/{tenant_id}")
 async def get_webhook_subscriptions(tenant_id: str):
     """Get all webhook subscriptions for a tenant."""
-    from agents_core.webhooks.webhook_manager import webhook_manager
-    
     try:
         subscriptions = webhook_manager.get_webhook_subscriptions(tenant_id)
-        stats = webhook_manager.get_webhook_stats(tenant_id)
+        stats = webhook_manager.get_webhook_stats(tenant_id, subscriptions)
         
         return {
             "tenant_id": tenant_id,
@@ -759,8 +1226,6 @@ async def get_webhook_subscriptions(tenant_id: str):
 @app.delete("/webhooks/{tenant_id}/{webhook_id}")
 async def remove_webhook_subscription(tenant_id: str, webhook_id: str):
     """Remove a webhook subscription."""
-    from agents_core.webhooks.webhook_manager import webhook_manager
-    
     try:
         success = webhook_manager.remove_webhook_subscription(tenant_id, webhook_id)
         
@@ -785,8 +1250,6 @@ async def remove_webhook_subscription(tenant_id: str, webhook_id: str):
 @app.post("/webhooks/test")
 async def test_webhook_delivery():
     """Test webhook delivery with a sample event."""
-    from agents_core.webhooks.webhook_manager import webhook_manager, WebhookEvent
-    
     try:
         # Create test event
         test_event = WebhookEvent(
@@ -816,10 +1279,16 @@ async def test_webhook_delivery():
 
 
 if __name__ == "__main__":
+    # uvloop and httptools come with uvicorn[standard]; reload and access
+    # logging are development conveniences and stay off otherwise
     uvicorn.run(
-        "main:app",
+        "apps.api.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        loop="uvloop",
+        http="httptools",
+        reload=settings.debug,
+        access_log=settings.debug,
+        proxy_headers=False,
+        log_level="info" if settings.debug else "warning"
     )
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import sys
 import os
+from itertools import islice
 import redis
 
 # Add project root to Python path
@@ -10,16 +11,21 @@ from agents_core.config.settings import settings
 print('=== CONTENIDO ACTUAL DE REDIS ===')
 try:
     redis_client = redis.from_url(settings.get_redis_url_for_memory(), decode_responses=True)
-    keys = redis_client.keys('*')
-    print(f'Total keys en Redis: {len(keys)}')
+    # DBSIZE is O(1); KEYS * would block the server for a full keyspace walk
+    total_keys = redis_client.dbsize()
+    print(f'Total keys en Redis: {total_keys}')
     
-    if keys:
+    if total_keys:
         print('\nKeys encontradas:')
-        for key in keys[:10]:
-            key_type = redis_client.type(key)
+        # Cursor-based SCAN for a sample, then all TYPE lookups in one round trip
+        keys = list(islice(redis_client.scan_iter(match='*', count=500), 10))
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.type(key)
+        for key, key_type in zip(keys, pipe.execute()):
             print(f'  • {key} ({key_type})')
-        if len(keys) > 10:
-            print(f'  ... y {len(keys) - 10} mas')
+        if total_keys > 10:
+            print(f'  ... y {total_keys - 10} mas')
     else:
         print('Redis esta vacio')
         
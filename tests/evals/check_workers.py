@@ -3,21 +3,81 @@
 Script to check the status of Celery workers
 """
 
-import requests
+import asyncio
+import sys
 import time
-import json
 
-def check_workers():
+import aiohttp
+import orjson
+
+BASE_URL = 'http://localhost:8000'
+
+# Celery states after which a task will not change any more
+TERMINAL_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+
+def write_json(label, obj):
+    """Print indented JSON straight from orjson's bytes, skipping a str round trip."""
+    sys.stdout.write(f'{label}: ')
+    sys.stdout.flush()
+    sys.stdout.buffer.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    sys.stdout.buffer.write(b'\n')
+    sys.stdout.buffer.flush()
+
+async def _get(session, path):
+    """GET an API path; returns (HTTP status, raw response body)."""
+    async with session.get(f'{BASE_URL}{path}') as response:
+        return response.status, await response.read()
+
+async def _post(session, path, payload):
+    """POST JSON to an API path; returns (HTTP status, raw response body)."""
+    async with session.post(f'{BASE_URL}{path}', json=payload) as response:
+        return response.status, await response.read()
+
+async def wait_task(session, task_id, deadline=10.0):
+    """Poll a task with exponential backoff until it finishes or the deadline passes.
+    
+    Returns the last task status seen, or None if a status request failed.
+    """
+    t0 = time.monotonic()
+    delay = 0.05
+    task_status = None
+    while time.monotonic() - t0 < deadline:
+        status_code, body = await _get(session, f'/celery/task/{task_id}')
+        if status_code != 200:
+            print(f'Error checking task: {status_code}')
+            return None
+        task_status = orjson.loads(body)
+        if task_status.get('status') in TERMINAL_STATES:
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 2.0)
+    return task_status
+
+async def wait_ready(session, deadline=10.0):
+    """Poll /celery/status until the API reports Redis connected or the deadline passes."""
+    t0 = time.monotonic()
+    timeout = aiohttp.ClientTimeout(total=0.5)
+    while time.monotonic() - t0 < deadline:
+        try:
+            async with session.get(f'{BASE_URL}/celery/status', timeout=timeout) as response:
+                if response.status == 200 and orjson.loads(await response.read()).get('redis_connected'):
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError):
+            pass
+        await asyncio.sleep(0.1)
+    return False
+
+async def check_workers(session, ready):
     print('Checking worker status...')
     
     try:
-        # Give time for workers to start
-        time.sleep(2)
+        if not ready:
+            print('API not ready yet, checking anyway')
         
-        response = requests.get('http://localhost:8000/celery/status')
+        status_code, body = await _get(session, '/celery/status')
         
-        if response.status_code == 200:
-            status = response.json()
+        if status_code == 200:
+            status = orjson.loads(body)
             print(f'Status: {status.get("status", "unknown")}')
             print(f'Redis connected: {status.get("redis_connected", False)}')
             
@@ -26,63 +86,76 @@ def check_workers():
             
             if 'message' in status:
                 print(f'Info: {status["message"]}')
-                
+            
             if 'stats' in status:
-                print(f'Stats: {json.dumps(status["stats"], indent=2)}')
-                
-            return status.get("status") == "healthy"
+                write_json('Stats', status['stats'])
             
+            return status.get("status") == "healthy"
+        
         else:
-            print(f'Error HTTP: {response.status_code}')
-            print(f'Response: {response.text}')
+            print(f'Error HTTP: {status_code}')
+            print(f'Response: {body.decode(errors="replace")}')
             return False
-            
+    
     except Exception as e:
         print(f'Error: {e}')
         return False
 
-def test_async_processing():
+async def test_async_processing(session, ready):
     print('\nTesting asynchronous processing...')
     
     try:
-        response = requests.post('http://localhost:8000/message/async', json={
+        if not ready:
+            print('API not ready yet, sending anyway')
+        
+        status_code, body = await _post(session, '/message/async', {
             'text': 'Test async processing with workers',
             'session_id': f'worker_test_{int(time.time())}',
             'tenant_id': 'worker_test',
             'locale': 'en'
         })
         
-        if response.status_code == 200:
-            result = response.json()
+        # The endpoint answers 202 Accepted once the task is queued
+        if status_code in (200, 202):
+            result = orjson.loads(body)
             task_id = result.get('task_id')
             print(f'Task sent: {task_id}')
             
-            # Wait and check result
-            time.sleep(3)
-            
-            status_response = requests.get(f'http://localhost:8000/celery/task/{task_id}')
-            if status_response.status_code == 200:
-                task_status = status_response.json()
-                print(f'Task status: {json.dumps(task_status, indent=2)}')
-                return True
-            else:
-                print(f'Error checking task: {status_response.status_code}')
+            task_status = await wait_task(session, task_id)
+            if task_status is None:
                 return False
-                
+            
+            write_json('Task status', task_status)
+            return True
+        
         else:
-            print(f'Error sending task: {response.status_code}')
-            print(f'Response: {response.text}')
+            print(f'Error sending task: {status_code}')
+            print(f'Response: {body.decode(errors="replace")}')
             return False
-            
+    
     except Exception as e:
         print(f'Error: {e}')
         return False
 
+async def main():
+    # One keep-alive session shared by every probe
+    connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Wait once for the stack to come up instead of sleeping a fixed
+        # time, so neither check hits a cold API
+        ready = await wait_ready(session)
+        
+        # The worker status probe and the async task round trip are
+        # independent, so they run concurrently
+        return await asyncio.gather(
+            check_workers(session, ready),
+            test_async_processing(session, ready)
+        )
+
 if __name__ == "__main__":
     print('=== OPTIMIZED WORKERS VERIFICATION ===')
     
-    workers_ok = check_workers()
-    async_ok = test_async_processing()
+    workers_ok, async_ok = asyncio.run(main())
     
     print('\n=== SUMMARY ===')
     print(f'Workers functioning: {"YES" if workers_ok else "NO"}')
@@ -9,10 +9,29 @@ import redis
 # Add project root to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 import requests
-import json
+import orjson
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from agents_core.config.settings import settings
 
+# Resolved once per process
+REDIS_URL = settings.get_redis_url_for_memory()
+
+# Per-session /message limit enforced by the API (requests per minute)
+MESSAGE_RATE_LIMIT = 60
+
+# Keep-alive HTTP session reused by every API call in the demo
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
 
 def print_section(title):
     print(f"\n{'='*50}")
@@ -20,60 +39,138 @@ def print_section(title):
     print('='*50)
 
 
-def show_redis_usage():
-    """Show how Redis is used in the system"""
+@lru_cache(maxsize=1)
+def get_redis():
+    """Redis client shared by every demo section (one pool per process).
+    
+    Replies are parsed by hiredis (pulled in by redis[hiredis]), which
+    redis-py selects automatically when it is importable.
+    """
+    return redis.from_url(
+        REDIS_URL,
+        decode_responses=True,
+        max_connections=16,
+        socket_keepalive=True,
+        health_check_interval=30,
+        retry_on_timeout=True
+    )
+
+
+# Only fetch a preview message from conversation lists smaller than this
+PREVIEW_MAX_BYTES = 64 * 1024
+
+# Keys kept per bucket for the examples; everything else is only counted
+SAMPLES_PER_BUCKET = 3
+
+# One-pass key classifier; the group that matched names the bucket
+_KEY_BUCKET = re.compile(
+    r'^(?P<conversation>conversation:)'
+    r'|^(?P<rate_limit>rate_limit:)'
+    r'|(?P<celery>(?i:celery)|^agent_(io|bg)$|^unacked$)'
+)
+
+
+def scan_keys(redis_client):
+    """Walk the keyspace once with SCAN and group the keys the demo reports on.
+    
+    SCAN is cursor-based, so unlike KEYS * (or a Lua loop over SCAN, which
+    runs atomically) it never blocks the server for the whole walk. Each
+    bucket holds a count plus a few sample keys, so client memory stays
+    bounded however large the keyspace is.
+    """
+    buckets = {
+        name: {'count': 0, 'samples': []}
+        for name in ('conversation', 'rate_limit', 'celery')
+    }
+    for key in redis_client.scan_iter(count=1000):
+        match = _KEY_BUCKET.search(key)
+        if not match:
+            continue
+        bucket = buckets[match.lastgroup]
+        bucket['count'] += 1
+        if len(bucket['samples']) < SAMPLES_PER_BUCKET:
+            bucket['samples'].append(key)
+    return buckets
+
+
+def show_redis_usage(redis_client=None, keys=None):
+    """Show how Redis is used in the system
+    
+    Callers that already hold a client or a scan_keys() result can pass
+    them in to skip reconnecting and re-walking the keyspace.
+    """
     print_section("🔴 REDIS - SYSTEM USAGE")
     
     try:
-        redis_client = redis.from_url(settings.get_redis_url_for_memory(), decode_responses=True)
+        redis_client = redis_client or get_redis()
+        if keys is None:
+            keys = scan_keys(redis_client)
         
         # 1. CONVERSATIONAL MEMORY
         print("\n1️⃣ CONVERSATIONAL MEMORY:")
-        conv_keys = [k for k in redis_client.keys('*') if k.startswith('conversation:')]
-        print(f"   • Saved conversations: {len(conv_keys)}")
+        conv_keys = keys['conversation']
+        print(f"   • Saved conversations: {conv_keys['count']}")
         
-        if conv_keys:
-            sample_key = conv_keys[0]
-            messages = redis_client.llen(sample_key)
+        if conv_keys['samples']:
+            sample_key = conv_keys['samples'][0]
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.memory_usage(sample_key)
+            pipe.llen(sample_key)
+            mem_bytes, messages = pipe.execute()
             print(f"   • Example: {sample_key}")
             print(f"   • Messages in this conversation: {messages}")
+            print(f"   • Memory used: {mem_bytes} bytes")
             
-            # Mostrar un mensaje de ejemplo
-            if messages > 0:
-                sample_msg = redis_client.lindex(sample_key, -1)
+            # Mostrar un mensaje de ejemplo (only for small lists; the
+            # newest message is at the head because memory uses LPUSH)
+            if messages > 0 and (mem_bytes or 0) < PREVIEW_MAX_BYTES:
+                sample_msg = redis_client.lindex(sample_key, 0)
                 if sample_msg:
                     try:
-                        msg_data = json.loads(sample_msg)
-                        print(f"   • Last message: {msg_data.get('message', 'N/A')[:50]}...")
+                        msg_data = orjson.loads(sample_msg)
+                        print(f"   • Last message: {msg_data.get('content', 'N/A')[:50]}...")
                     except:
                         print(f"   • Last message: {sample_msg[:50]}...")
         
         # 2. RATE LIMITING
         print("\n2️⃣ RATE LIMITING:")
-        rate_keys = [k for k in redis_client.keys('*') if k.startswith('rate_limit:')]
-        print(f"   • Active rate limit counters: {len(rate_keys)}")
+        rate_keys = keys['rate_limit']
+        print(f"   • Active rate limit counters: {rate_keys['count']}")
         
-        if rate_keys:
-            sample_rate = rate_keys[0]
-            count = redis_client.get(sample_rate)
-            ttl = redis_client.ttl(sample_rate)
+        if rate_keys['samples']:
+            sample_rate = rate_keys['samples'][0]
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.get(sample_rate)
+            pipe.ttl(sample_rate)
+            count, ttl = pipe.execute()
             print(f"   • Example: {sample_rate}")
             print(f"   • Requests used: {count}")
             print(f"   • Expires in: {ttl} seconds")
         
         # 3. CELERY TASKS
         print("\n3️⃣ CELERY TASKS:")
-        celery_keys = [k for k in redis_client.keys('*') if 'celery' in k.lower() or k in ['agent_tasks', 'unacked']]
-        print(f"   • Keys related to Celery: {len(celery_keys)}")
+        celery_keys = keys['celery']
+        print(f"   • Keys related to Celery: {celery_keys['count']}")
+        
+        # One round trip for the types, one for the sizes
+        sample_keys = celery_keys['samples']
+        pipe = redis_client.pipeline(transaction=False)
+        for key in sample_keys:
+            pipe.type(key)
+        key_types = pipe.execute()
         
-        for key in celery_keys[:3]:
-            key_type = redis_client.type(key)
+        for key, key_type in zip(sample_keys, key_types):
             if key_type == 'list':
-                length = redis_client.llen(key)
-                print(f"   • {key} ({key_type}): {length} items")
+                pipe.llen(key)
             elif key_type == 'hash':
-                length = redis_client.hlen(key)
-                print(f"   • {key} ({key_type}): {length} fields")
+                pipe.hlen(key)
+        lengths = iter(pipe.execute())
+        
+        for key, key_type in zip(sample_keys, key_types):
+            if key_type == 'list':
+                print(f"   • {key} ({key_type}): {next(lengths)} items")
+            elif key_type == 'hash':
+                print(f"   • {key} ({key_type}): {next(lengths)} fields")
             else:
                 print(f"   • {key} ({key_type})")
                 
@@ -81,7 +178,7 @@ def show_redis_usage():
         print(f"❌ Error connecting to Redis: {e}")
 
 
-def demo_conversation_memory():
+def demo_conversation_memory(redis_client=None):
     """Demonstrate how conversational memory works"""
     print_section("💭 DEMO: CONVERSATIONAL MEMORY")
     
@@ -91,7 +188,7 @@ def demo_conversation_memory():
     
     # Mensaje 1
     print("\n🗣️ Usuario: 'Hi, what's your name?'")
-    response1 = requests.post('http://localhost:8000/message', json={
+    response1 = SESSION.post('http://localhost:8000/message', json={
         'text': "Hi, what's your name?",
         'session_id': session_id,
         'tenant_id': 'demo_tenant',
@@ -106,7 +203,7 @@ def demo_conversation_memory():
     
     # Mensaje 2 (debería recordar el contexto)
     print("\n🗣️ Usuario: 'What was my last question?'")
-    response2 = requests.post('http://localhost:8000/message', json={
+    response2 = SESSION.post('http://localhost:8000/message', json={
         'text': "What was my last question?",
         'session_id': session_id,  # Misma sesión
         'tenant_id': 'demo_tenant',
@@ -120,7 +217,7 @@ def demo_conversation_memory():
     
     # Verificar en Redis
     try:
-        redis_client = redis.from_url(settings.get_redis_url_for_memory(), decode_responses=True)
+        redis_client = redis_client or get_redis()
         conv_key = f"conversation:demo_tenant:{session_id}"
         messages = redis_client.llen(conv_key)
         print(f"\n📊 Messages saved in Redis: {messages}")
@@ -128,24 +225,31 @@ def demo_conversation_memory():
         print(f"❌ Error checking Redis: {e}")
 
 
-def demo_rate_limiting():
-    """Demonstrate rate limiting"""
+def demo_rate_limiting(burst=MESSAGE_RATE_LIMIT + 5):
+    """Demonstrate rate limiting (the default burst overshoots the limit)"""
     print_section("⚡ DEMO: RATE LIMITING")
     
     session_id = f"rate_test_{int(time.time())}"
     
-    print("📝 Sending multiple messages quickly...")
-    print("   (Rate limit: 60 requests per minute per session)")
+    print(f"📝 Sending {burst} messages at once...")
+    print(f"   (Rate limit: {MESSAGE_RATE_LIMIT} requests per minute per session)")
     
-    for i in range(5):
-        print(f"\n🔄 Message {i+1}/5")
-        response = requests.post('http://localhost:8000/message', json={
+    def send(i):
+        return SESSION.post('http://localhost:8000/message', json={
             'text': f"Test message {i+1}",
             'session_id': session_id,
             'tenant_id': 'rate_test',
             'locale': 'en'
         })
-        
+    
+    # Fire the whole burst concurrently so the limiter sees it together
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        responses = list(executor.map(send, range(burst)))
+    
+    limited = sum(1 for response in responses if response.status_code == 429)
+    
+    for i, response in enumerate(responses):
+        print(f"\n🔄 Message {i+1}/{burst}")
         if response.status_code == 200:
             data = response.json()
             rate_info = data['metadata'].get('rate_limit', {})
@@ -153,11 +257,10 @@ def demo_rate_limiting():
             print(f"   ✅ Success - Remaining: {remaining}")
         elif response.status_code == 429:
             print(f"   ⚡ Rate limited!")
-            break
         else:
             print(f"   ❌ Error: {response.status_code}")
-        
-        time.sleep(0.5)
+    
+    print(f"\n📊 {limited}/{burst} messages were rate limited")
 
 
 def demo_celery_tasks():
@@ -168,7 +271,7 @@ def demo_celery_tasks():
     
     # 1. Direct task test
     print("\n1️⃣ Direct task execution:")
-    response = requests.post('http://localhost:8000/celery/process-direct')
+    response = SESSION.post('http://localhost:8000/celery/process-direct')
     if response.status_code == 200:
         result = response.json()
         print(f"   ✅ Task executed: {result}")
@@ -177,7 +280,7 @@ def demo_celery_tasks():
     
     # 2. Send async message
     print("\n2️⃣ Asynchronous message processing:")
-    response = requests.post('http://localhost:8000/message/async', json={
+    response = SESSION.post('http://localhost:8000/message/async', json={
         'text': "Process this asynchronously",
         'session_id': f"async_test_{int(time.time())}",
         'tenant_id': 'async_test',
@@ -192,7 +295,7 @@ def demo_celery_tasks():
         # Check status
         if task_id:
             time.sleep(2)
-            status_response = requests.get(f'http://localhost:8000/celery/task/{task_id}')
+            status_response = SESSION.get(f'http://localhost:8000/celery/task/{task_id}')
             if status_response.status_code == 200:
                 status = status_response.json()
                 print(f"   📊 Status: {status}")
@@ -201,7 +304,7 @@ def demo_celery_tasks():
     
     # 3. Worker status
     print("\n3️⃣ Celery worker status:")
-    response = requests.get('http://localhost:8000/celery/status')
+    response = SESSION.get('http://localhost:8000/celery/status')
     if response.status_code == 200:
         status = response.json()
         print(f"   📊 Status: {status['status']}")
@@ -238,8 +341,10 @@ def main():
         elif opcion == "4":
             demo_celery_tasks()
         elif opcion == "5":
-            show_redis_usage()
-            demo_conversation_memory()
+            # One client and one keyspace walk for the whole run
+            redis_client = get_redis()
+            show_redis_usage(redis_client, scan_keys(redis_client))
+            demo_conversation_memory(redis_client)
             demo_rate_limiting()
             demo_celery_tasks()
         else:
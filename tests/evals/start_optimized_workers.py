@@ -3,46 +3,144 @@
 Script to start optimized Celery workers
 """
 
+import asyncio
 import subprocess
 import sys
 import time
 import signal
 import psutil
 import os
+import importlib.util
+import queue
+import threading
+import aiohttp
+import orjson
+
+BASE_URL = 'http://localhost:8000'
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# How long the checks poll for workers before giving up
+READY_DEADLINE = 5.0
+
+# Server-side long-poll for the test task; the HTTP timeout leaves headroom
+TASK_WAIT_SECONDS = 10
+TASK_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=TASK_WAIT_SECONDS + 5)
+
+# Worker pool: 'threads' works everywhere; 'gevent' (pip install gevent)
+# multiplexes hundreds of I/O-bound agent tasks per process
+CELERY_POOL = os.getenv('CELERY_POOL', 'threads')
+
+# Default concurrency per pool (greenlets are far cheaper than threads);
+# CELERY_CONCURRENCY overrides it
+POOL_CONCURRENCY = {'threads': 8, 'gevent': 200, 'eventlet': 200}
+CELERY_CONCURRENCY = os.getenv('CELERY_CONCURRENCY')
+
+# Agent tasks are long LLM calls (~1-5 s), so reserve one task at a time to
+# keep short tasks from queueing behind them; raise for short task mixes
+CELERY_PREFETCH = os.getenv('CELERY_PREFETCH', '1')
+
+def resolve_pool():
+    """Return the configured pool, falling back to threads if its package is missing."""
+    if CELERY_POOL in ('gevent', 'eventlet') and importlib.util.find_spec(CELERY_POOL) is None:
+        print(f"   ⚠️ {CELERY_POOL} not installed, falling back to threads")
+        return 'threads'
+    return CELERY_POOL
+
+# PID of the worker started by this script, so the next run can stop it
+PID_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.celery_worker.pid')
+
+def _is_celery_worker(proc):
+    """True if the process command line is a Celery worker (not agents_core)."""
+    cmdline = ' '.join(proc.cmdline() or [])
+    return 'celery' in cmdline and 'worker' in cmdline and 'agents_core' not in cmdline
+
+def find_existing_workers():
+    """Return the Celery worker processes to stop.
+    
+    Uses the PID recorded by the last start when it is still a worker;
+    otherwise scans processes, reading the (expensive) command line only
+    for python/celery executables.
+    """
+    try:
+        with open(PID_FILE) as f:
+            proc = psutil.Process(int(f.read().strip()))
+        if _is_celery_worker(proc):
+            return [proc]
+    except (OSError, ValueError, psutil.NoSuchProcess, psutil.AccessDenied):
+        pass
+    
+    workers = []
+    for proc in psutil.process_iter(['pid', 'name']):
+        try:
+            name = (proc.info['name'] or '').lower()
+            if name.startswith(('python', 'celery')) and _is_celery_worker(proc):
+                workers.append(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return workers
 
 def kill_existing_workers():
     """Terminate existing Celery workers"""
     print("🔄 Terminating existing workers...")
     
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+    # Signal every worker first, then wait for all of them together
+    victims = []
+    for proc in find_existing_workers():
+        try:
+            print(f"   Terminating process: {proc.pid}")
+            proc.terminate()
+            victims.append(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    
+    _, alive = psutil.wait_procs(victims, timeout=5)
+    for proc in alive:
         try:
-            cmdline = ' '.join(proc.info['cmdline'] or [])
-            if 'celery' in cmdline and 'worker' in cmdline and 'agents_core' not in cmdline:
-                print(f"   Terminating process: {proc.info['pid']}")
-                proc.terminate()
-                proc.wait(timeout=5)
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
+            print(f"   Killing unresponsive process: {proc.pid}")
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
             pass
+
+def _pump_output(stream, chunks):
+    """Drain raw worker output into a bounded queue until the pipe closes.
     
-    time.sleep(2)
+    Runs on a daemon thread so startup can wait with a timeout, and keeps
+    the pipe drained afterwards (a full pipe would block the worker).
+    Chunks nobody is waiting for are dropped once the queue is full.
+    """
+    fd = stream.fileno()
+    while chunk := os.read(fd, 4096):
+        try:
+            chunks.put_nowait(chunk)
+        except queue.Full:
+            pass
+    try:
+        chunks.put_nowait(None)
+    except queue.Full:
+        pass
 
 def start_optimized_workers():
     """Start optimized workers"""
     print("🚀 Starting optimized workers...")
     
-    # Optimized configuration for Windows
+    pool = resolve_pool()
+    
+    # Optimized configuration (threads also run on Windows)
     cmd = [
         sys.executable, '-m', 'celery',
         '-A', 'workers.celery_worker.app',
         'worker',
+        '-Q', 'agent_io,agent_bg',  # All task queues in one local worker
         '--loglevel=info',
-        '--pool=threads',
-        '--concurrency=8',  # More workers
-        '--prefetch-multiplier=1',  # Better distribution
+        f'--pool={pool}',
+        f'--concurrency={CELERY_CONCURRENCY or POOL_CONCURRENCY.get(pool, 8)}',  # More workers
+        f'--prefetch-multiplier={CELERY_PREFETCH}',  # Better distribution
         '--without-gossip',  # Less overhead
-        '--without-mingle',  # Faster startup
-        '--without-heartbeat'  # Less overhead
+        '--without-mingle'  # Faster startup
     ]
+    if pool == 'prefork':
+        # Hand tasks only to idle children; other pools ignore this
+        cmd.append('-Ofair')
     
     print(f"   Command: {' '.join(cmd)}")
     
@@ -52,20 +150,33 @@ def start_optimized_workers():
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
+            bufsize=0
         )
         
         print(f"   PID: {process.pid}")
+        with open(PID_FILE, 'w') as f:
+            f.write(str(process.pid))
         print("   Waiting for initialization...")
         
         # Show initial output
-        start_time = time.time()
-        while time.time() - start_time < 10:  # 10 seconds maximum
-            line = process.stdout.readline()
-            if line:
-                print(f"   {line.strip()}")
-                if 'ready' in line.lower():
+        chunks = queue.Queue(maxsize=1000)
+        threading.Thread(target=_pump_output, args=(process.stdout, chunks), daemon=True).start()
+        
+        pending = b''
+        ready = False
+        deadline = time.monotonic() + 10  # 10 seconds maximum
+        while not ready and (remaining := deadline - time.monotonic()) > 0:
+            try:
+                chunk = chunks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if chunk is None:  # Worker exited
+                break
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                print(f"   {line.strip().decode('utf-8', 'replace')}")
+                if b'ready' in line.lower():
+                    ready = True
                     break
         
         return process
@@ -74,88 +185,121 @@ def start_optimized_workers():
         print(f"   ❌ Error: {e}")
         return None
 
-def verify_workers():
+async def wait_until(predicate, timeout=READY_DEADLINE):
+    """Await predicate() with exponential backoff until it is true or time runs out.
+    
+    Polls after 50 ms, 100 ms, 200 ms, ... capped at 1 s between tries.
+    Returns the last value predicate() produced.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        result = await predicate()
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 1.0)
+
+async def verify_workers(session):
     """Verify that workers are functioning"""
     print("🔍 Verifying workers...")
     
-    import requests
-    
     try:
-        time.sleep(3)  # Give time to initialize
+        # Poll until workers register instead of sleeping a fixed time
+        status = {}
+        http_error = None
         
-        response = requests.get('http://localhost:8000/celery/status', timeout=10)
+        async def workers_ready():
+            nonlocal http_error
+            async with session.get(f'{BASE_URL}/celery/status', timeout=HTTP_TIMEOUT) as response:
+                if response.status != 200:
+                    http_error = response.status
+                    return True  # Stop polling; reported below
+                status.update(orjson.loads(await response.read()))
+            return status.get('workers_online', 0) > 0 and status.get('redis_connected', False)
         
-        if response.status_code == 200:
-            status = response.json()
-            workers_online = status.get('workers_online', 0)
-            redis_connected = status.get('redis_connected', False)
-            
-            print(f"   Workers online: {workers_online}")
-            print(f"   Redis connected: {redis_connected}")
-            
-            if workers_online > 0 and redis_connected:
-                print("   ✅ Workers functioning correctly!")
-                return True
-            else:
-                print("   ⚠️ Workers not detected")
-                return False
+        await wait_until(workers_ready)
+        if http_error is not None:
+            print(f"   ❌ Error HTTP: {http_error}")
+            return False
+        
+        workers_online = status.get('workers_online', 0)
+        redis_connected = status.get('redis_connected', False)
+        
+        print(f"   Workers online: {workers_online}")
+        print(f"   Redis connected: {redis_connected}")
+        
+        if workers_online > 0 and redis_connected:
+            print("   ✅ Workers functioning correctly!")
+            return True
         else:
-            print(f"   ❌ Error HTTP: {response.status_code}")
+            print("   ⚠️ Workers not detected")
             return False
             
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
 
-def test_async_task():
+async def test_async_task(session):
     """Test async task"""
     print("🧪 Testing async task...")
     
-    import requests
-    
     try:
         # Enviar task
-        response = requests.post('http://localhost:8000/message/async', json={
+        async with session.post(f'{BASE_URL}/message/async', json={
             'text': 'Test optimized workers performance',
             'session_id': f'perf_test_{int(time.time())}',
             'tenant_id': 'performance_test',
             'locale': 'en'
-        }, timeout=10)
+        }, timeout=HTTP_TIMEOUT) as response:
+            # The endpoint answers 202 Accepted once the task is queued
+            if response.status not in (200, 202):
+                print(f"   ❌ Error sending task: {response.status}")
+                return False
+            result = orjson.loads(await response.read())
         
-        if response.status_code == 200:
-            result = response.json()
-            task_id = result.get('task_id')
-            print(f"   Task sent: {task_id}")
-            
-            # Check result
-            time.sleep(5)
-            status_response = requests.get(f'http://localhost:8000/celery/task/{task_id}', timeout=10)
-            
-            if status_response.status_code == 200:
-                task_status = status_response.json()
-                status = task_status.get('status', 'UNKNOWN')
-                ready = task_status.get('ready', False)
-                
-                print(f"   Status: {status}")
-                print(f"   Completed: {ready}")
-                
-                if ready and status == 'SUCCESS':
-                    print("   ✅ Task processed successfully!")
-                    return True
-                else:
-                    print("   ⚠️ Task still processing or failed")
-                    return False
-            else:
-                print(f"   ❌ Error checking task: {status_response.status_code}")
+        task_id = result.get('task_id')
+        print(f"   Task sent: {task_id}")
+        
+        # One long-poll: the API answers as soon as the task finishes
+        async with session.get(
+            f'{BASE_URL}/celery/task/{task_id}',
+            params={'wait': TASK_WAIT_SECONDS},
+            timeout=TASK_HTTP_TIMEOUT
+        ) as status_response:
+            # 202: the API had too many long-polls open and answered at once
+            if status_response.status not in (200, 202):
+                print(f"   ❌ Error checking task: {status_response.status}")
                 return False
+            task_status = orjson.loads(await status_response.read())
+        
+        status = task_status.get('status', 'UNKNOWN')
+        ready = task_status.get('ready', False)
+        
+        print(f"   Status: {status}")
+        print(f"   Completed: {ready}")
+        
+        if ready and status == 'SUCCESS':
+            print("   ✅ Task processed successfully!")
+            return True
         else:
-            print(f"   ❌ Error sending task: {response.status_code}")
+            print("   ⚠️ Task still processing or failed")
             return False
             
     except Exception as e:
         print(f"   ❌ Error: {e}")
         return False
 
+async def run_checks():
+    """Run the worker check and the async task test concurrently."""
+    # orjson for request bodies too (aiohttp expects a str serializer)
+    async with aiohttp.ClientSession(json_serialize=lambda obj: orjson.dumps(obj).decode()) as session:
+        return await asyncio.gather(
+            verify_workers(session),
+            test_async_task(session)
+        )
+
 def main():
     print("=" * 60)
     print("  🚀 INDEPENDENT WORKERS OPTIMIZATION")
@@ -171,11 +315,8 @@ def main():
             print("❌ Could not start workers")
             return
         
-        # 3. Verify workers
-        workers_ok = verify_workers()
-        
-        # 4. Test async task
-        async_ok = test_async_task()
+        # 3-4. Verify workers and test an async task (independent probes)
+        workers_ok, async_ok = asyncio.run(run_checks())
         
         # 5. Summary
         print("\n" + "=" * 60)
@@ -5,9 +5,36 @@ Use it to test different functionalities step by step
 """
 
 import requests
-import json
-import time
+import itertools
+import sys
+import orjson
+import uuid
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+# Keep-alive HTTP session shared by every call to the API
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(pool_connections=10, pool_maxsize=16))
+
+# orjson encodes straight to bytes, so bodies are sent as raw data
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def post_json(url, payload, **kwargs):
+    return SESSION.post(url, data=orjson.dumps(payload), headers=JSON_HEADERS, **kwargs)
+
+
+# Session ids: unique per run, then a counter (no clock reads, no collisions)
+_RUN_ID = uuid.uuid4().hex[:8]
+_session_counter = itertools.count()
+
+
+def new_session_id(prefix):
+    return f"{prefix}_{_RUN_ID}_{next(_session_counter)}"
+
+
+# Last /tools/available body and its ETag, revalidated with If-None-Match
+_tools_cache = {}
 
 
 def print_separator():
@@ -24,11 +51,11 @@ def test_health():
     print_step("1", "SYSTEM HEALTH TEST")
     
     try:
-        response = requests.get('http://localhost:8000/monitoring/health')
+        response = SESSION.get('http://localhost:8000/monitoring/health')
         print(f"Status: {response.status_code}")
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print("✅ System healthy!")
             print(f"• Overall status: {data['overall_status']}")
             print(f"• OpenAI Agent: {data['components']['openai_agent']['status']}")
@@ -52,16 +79,16 @@ def test_message(text, description="Message test"):
     try:
         payload = {
             "text": text,
-            "session_id": f"manual_test_{int(time.time())}",
+            "session_id": new_session_id("manual_test"),
             "tenant_id": "test_manual",
             "locale": "en"
         }
         
         print("🔄 Processing...")
-        response = requests.post('http://localhost:8000/message', json=payload)
+        response = post_json('http://localhost:8000/message', payload)
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             print("✅ Response received!")
             print(f"💬 Response: {data['reply']}")
             print(f"🎯 Confidence: {data['confidence']}")
@@ -89,9 +116,15 @@ def test_tools():
     print_step("2", "AVAILABLE TOOLS")
     
     try:
-        response = requests.get('http://localhost:8000/tools/available')
-        if response.status_code == 200:
-            data = response.json()
+        headers = {'If-None-Match': _tools_cache['etag']} if _tools_cache else {}
+        response = SESSION.get('http://localhost:8000/tools/available', headers=headers)
+        if response.status_code in (200, 304):
+            if response.status_code == 304:
+                data = _tools_cache['data']
+            else:
+                data = orjson.loads(response.content)
+                if response.headers.get('ETag'):
+                    _tools_cache.update(etag=response.headers['ETag'], data=data)
             print(f"📦 Total tools: {data['total_count']}")
             print(f"📂 Categories: {', '.join(data['categories'])}")
             
@@ -119,7 +152,7 @@ def interactive_mode():
     print("Type 'exit' to quit")
     print("Type 'clear' for new session")
     
-    session_id = f"interactive_{int(time.time())}"
+    session_id = new_session_id("interactive")
     
     while True:
         try:
@@ -130,7 +163,7 @@ def interactive_mode():
                 break
                 
             if user_input.lower() in ['limpiar', 'clear', 'nueva']:
-                session_id = f"interactive_{int(time.time())}"
+                session_id = new_session_id("interactive")
                 print("🔄 New session started")
                 continue
                 
@@ -146,19 +179,18 @@ def interactive_mode():
                 "locale": "en"
             }
             
-            response = requests.post('http://localhost:8000/message', json=payload)
-            
-            if response.status_code == 200:
-                data = response.json()
-                print(data['reply'])
-                
-                if data['tools_used']:
-                    print(f"🛠️ Tools used: {', '.join(data['tools_used'])}")
+            # Print the reply as it streams in instead of after it completes
+            with post_json('http://localhost:8000/message/stream', payload, stream=True) as response:
+                if response.status_code == 200:
+                    for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                        sys.stdout.write(chunk)
+                        sys.stdout.flush()
+                    print()
                     
-            elif response.status_code == 429:
-                print("⚡ Rate limited - try again in a few seconds")
-            else:
-                print(f"❌ Error {response.status_code}")
+                elif response.status_code == 429:
+                    print("⚡ Rate limited - try again in a few seconds")
+                else:
+                    print(f"❌ Error {response.status_code}")
                 
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
@@ -1,45 +1,202 @@
 #!/usr/bin/env python3
 """
 Complete script to test the AI Agent system.
-Run: python test_system_complete.py
+Run: python test_system_complete.py [--quiet]
 """
 
+import argparse
+import atexit
+import logging
+import logging.handlers
+import queue
 import requests
 import json
+import math
+import os
+import sys
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# API under test; the loopback address skips a localhost lookup per request
+BASE = os.environ.get('SMOKE_BASE_URL', 'http://127.0.0.1:8000').rstrip('/')
+
+# One keep-alive session for every probe, so the socket to the API is
+# opened once and reused instead of a new connection per request.
+# Connection errors and gateway errors while the stack warms up are
+# retried with backoff; the last response is returned if they persist.
+# Only GETs are retried: a replayed POST /message would run the agent
+# and write memory twice.
+SESSION = requests.Session()
+SESSION.headers['Connection'] = 'keep-alive'
+SESSION.mount('http://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=12,  # Six stages plus the concurrent test messages
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+))
+
+# All output goes through one logger; records are queued and written to
+# stdout by a listener thread, so stage threads never contend on stdout
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter('%(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flushes what is still queued
+
+log = logging.getLogger('smoke')
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+log.setLevel(logging.INFO)
+log.propagate = False
+
+# Detailed per-stage output; --quiet turns it off so the script itself
+# spends as little time as possible between probes
+VERBOSE = True
+
+# Banner separators, built once
+_BAR = '=' * 50
+_DASH = '-' * 30
+
+# Stages run concurrently, each on its own thread with its own output
+# buffer, so their lines come out as whole blocks instead of interleaved
+_stage = threading.local()
+
+def say(*args):
+    """Log a line of stage output; buffered while the stage is running."""
+    if not VERBOSE:
+        return
+    lines = getattr(_stage, 'lines', None)
+    if lines is None:
+        log.info(' '.join(map(str, args)))
+    else:
+        lines.append(' '.join(map(str, args)))
+
+def run_stage(test):
+    """Run one test stage, returning (passed, captured output).
+    
+    Nests: a stage may run sub-steps through it on its own thread.
+    """
+    outer, _stage.lines = getattr(_stage, 'lines', None), []
+    try:
+        return test(), '\n'.join(_stage.lines)
+    finally:
+        _stage.lines = outer
+
+# One timing record per HTTP probe, written to PROFILE_RESULTS at the end
+PROFILE_RESULTS = 'profile-results.json'
+METRICS = []
+
+def _timed(method, path, **kwargs):
+    """Request BASE + path over SESSION and record its timing; returns (response, record)."""
+    t0 = time.perf_counter()
+    response = SESSION.request(method, f'{BASE}{path}', **kwargs)
+    record = {
+        'endpoint': path,
+        'status': response.status_code,
+        'elapsed_ms': round((time.perf_counter() - t0) * 1000, 2),
+        'bytes': len(response.content),
+        'rate_remaining': None,
+    }
+    METRICS.append(record)  # list.append is atomic; stages run on threads
+    return response, record
+
+def _percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+def write_profile_results():
+    """Dump METRICS to PROFILE_RESULTS and print per-endpoint latency percentiles."""
+    with open(PROFILE_RESULTS, 'w') as f:
+        json.dump(METRICS, f, indent=2)
+    
+    by_endpoint = {}
+    for record in METRICS:
+        by_endpoint.setdefault(record['endpoint'], []).append(record['elapsed_ms'])
+    
+    lines = [f"\n{'endpoint':<24}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for endpoint, timings in by_endpoint.items():
+        timings.sort()
+        lines.append(
+            f"{endpoint:<24}{len(timings):>4}"
+            f"{_percentile(timings, 50):>10.1f}{_percentile(timings, 95):>10.1f}{_percentile(timings, 99):>10.1f}"
+        )
+    lines.append(f"Timings written to {PROFILE_RESULTS}")
+    log.info('\n'.join(lines))
+
+# Health is fetched once (with Celery status folded in) and shared by
+# the connectivity, health and Celery stages
+HEALTH_CACHE_SECONDS = 2.0
+_health_cache = {}
+_health_lock = threading.Lock()
+
+def fetch_health():
+    """GET /monitoring/health?include=celery, reusing a fresh result."""
+    with _health_lock:
+        cached = _health_cache.get('health')
+        if cached is not None and time.monotonic() - cached[0] < HEALTH_CACHE_SECONDS:
+            return cached[1]
+        response, _ = _timed(
+            'GET', '/monitoring/health',
+            params={'include': 'celery'},
+            timeout=10
+        )
+        response.raise_for_status()
+        health = response.json()
+        _health_cache['health'] = (time.monotonic(), health)
+        return health
+
+def unhealthy_dependency(*components):
+    """First of `components` the health report marks not healthy, or None.
+    
+    Stages whose dependencies are known to be down skip their requests
+    instead of waiting for them to time out.
+    """
+    try:
+        health = fetch_health()
+    except requests.exceptions.RequestException:
+        return None  # No report; let the stage find out for itself
+    for component in components:
+        if health.get('components', {}).get(component, {}).get('status') != 'healthy':
+            return component
+    return None
 
 def print_header(title):
-    print(f"\n{'='*50}")
-    print(f"  {title}")
-    print(f"{'='*50}")
+    log.info(f"\n{_BAR}\n  {title}\n{_BAR}")
 
 def print_step(step, title):
-    print(f"\n{step}. {title}")
-    print("-" * 30)
+    say(f"\n{step}. {title}\n{_DASH}")
 
 def test_api_connectivity():
     """Basic connectivity test."""
     print_step(1, "BASIC CONNECTIVITY")
     
     try:
-        response = requests.get('http://localhost:8000/health', timeout=5)
-        print(f"✅ API Status: {response.status_code}")
+        health = fetch_health()
+        say(f"✅ API Status: {health['overall_status']}")
+        say(f"✅ Configuration: {health['configuration']}")
+        return True
         
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✅ Response: {data}")
-            return True
-        else:
-            print("❌ API not responding correctly")
-            return False
-            
+    except requests.exceptions.HTTPError as e:
+        say(f"❌ API not responding correctly: {e.response.status_code}")
+        return False
     except requests.exceptions.ConnectionError:
-        print("❌ Error: Cannot connect to API")
-        print("🔧 Solution: Run 'python -m uvicorn apps.api.main:app --reload --port 8000'")
+        say("❌ Error: Cannot connect to API")
+        say("🔧 Solution: Run 'python -m uvicorn apps.api.main:app --reload --port 8000'")
         return False
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        say(f"❌ Unexpected error: {e}")
         return False
 
 def test_system_health():
@@ -47,30 +204,27 @@ def test_system_health():
     print_step(2, "COMPREHENSIVE HEALTH CHECK")
     
     try:
-        response = requests.get('http://localhost:8000/monitoring/health')
+        health = fetch_health()
+        say(f"📊 Overall Status: {health['overall_status']}")
         
-        if response.status_code == 200:
-            health = response.json()
-            print(f"📊 Overall Status: {health['overall_status']}")
-            
-            print("\n🔧 Components:")
-            for component, status in health['components'].items():
-                emoji = "✅" if status['status'] == 'healthy' else "⚠️"
-                print(f"  {emoji} {component}: {status['status']}")
-            
-            # Count healthy components
-            healthy_count = sum(1 for comp in health['components'].values() 
-                              if comp['status'] == 'healthy')
-            total_count = len(health['components'])
-            print(f"\n📈 Score: {healthy_count}/{total_count} healthy components")
-            
-            return health['overall_status'] in ['healthy', 'degraded']
-        else:
-            print(f"❌ Health check error: {response.status_code}")
-            return False
+        say("\n🔧 Components:")
+        for component, status in health['components'].items():
+            emoji = "✅" if status['status'] == 'healthy' else "⚠️"
+            say(f"  {emoji} {component}: {status['status']}")
+        
+        # Count healthy components
+        healthy_count = sum(1 for comp in health['components'].values() 
+                          if comp['status'] == 'healthy')
+        total_count = len(health['components'])
+        say(f"\n📈 Score: {healthy_count}/{total_count} healthy components")
+        
+        return health['overall_status'] in ['healthy', 'degraded']
             
+    except requests.exceptions.HTTPError as e:
+        say(f"❌ Health check error: {e.response.status_code}")
+        return False
     except Exception as e:
-        print(f"❌ Health check error: {e}")
+        say(f"❌ Health check error: {e}")
         return False
 
 def test_available_tools():
@@ -78,36 +232,41 @@ def test_available_tools():
     print_step(3, "AVAILABLE TOOLS")
     
     try:
-        response = requests.get('http://localhost:8000/tools/available')
+        response, _ = _timed('GET', '/tools/available')
         
         if response.status_code == 200:
             tools = response.json()
-            print(f"🛠️ Total tools: {tools['total_count']}")
-            print(f"📦 Basic: {len(tools['basic_tools'])}")
-            print(f"⚡ Advanced: {len(tools['advanced_tools'])}")
-            print(f"📂 Categories: {tools['categories']}")
+            say(f"🛠️ Total tools: {tools['total_count']}")
+            say(f"📦 Basic: {len(tools['basic_tools'])}")
+            say(f"⚡ Advanced: {len(tools['advanced_tools'])}")
+            say(f"📂 Categories: {tools['categories']}")
             
-            print("\n🔧 Basic Tools:")
+            say("\n🔧 Basic Tools:")
             for tool in tools['basic_tools']:
-                print(f"  • {tool['name']}: {tool['description']}")
+                say(f"  • {tool['name']}: {tool['description']}")
             
-            print("\n⚡ Advanced Tools:")
+            say("\n⚡ Advanced Tools:")
             for tool in tools['advanced_tools']:
-                print(f"  • {tool['name']}: {tool['description']}")
+                say(f"  • {tool['name']}: {tool['description']}")
             
             return True
         else:
-            print(f"❌ Error getting tools: {response.status_code}")
+            say(f"❌ Error getting tools: {response.status_code}")
             return False
             
     except Exception as e:
-        print(f"❌ Tools test error: {e}")
+        say(f"❌ Tools test error: {e}")
         return False
 
 def test_message_processing():
     """Message processing test."""
     print_step(4, "MESSAGE PROCESSING")
     
+    down = unhealthy_dependency('openai_agent')
+    if down:
+        say(f"⏭️ Skipped: {down} is not healthy")
+        return None
+    
     test_messages = [
         {
             "text": "Hello! Can you help me schedule a visit to property ABC123 for tomorrow at 2 PM?",
@@ -123,135 +282,195 @@ def test_message_processing():
         }
     ]
     
-    success_count = 0
+    # One session for the whole conversation. The first message goes
+    # alone and creates the session; the rest are then sent
+    # concurrently, all on the warm-memory path.
+    # Each message's output is buffered and printed in order.
+    session_id = f'test_session_{uuid.uuid4().hex[:12]}'
     
-    for i, test_msg in enumerate(test_messages, 1):
-        print(f"\n🧪 Test {i}: {test_msg['description']}")
-        print(f"📝 Message: {test_msg['text']}")
-        
-        try:
-            response = requests.post('http://localhost:8000/message', json={
-                'session_id': f'test_session_{int(time.time())}_{i}',
-                'tenant_id': 'test_tenant',
-                'text': test_msg['text'],
-                'locale': 'en'
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"✅ Response: {result['reply'][:80]}...")
-                print(f"🎯 Confidence: {result['confidence']}")
-                print(f"🛠️ Tools used: {result['tools_used']}")
-                
-                # Rate limiting info
-                rate_info = result['metadata'].get('rate_limit', {})
-                remaining = rate_info.get('remaining', 'N/A')
-                print(f"⚡ Rate limit remaining: {remaining}")
+    sends = [partial(send_test_message, session_id, i, test_msg)
+             for i, test_msg in enumerate(test_messages, 1)]
+    passed, output = run_stage(sends[0])
+    say(output)
+    success_count = 1 if passed else 0
+    with ThreadPoolExecutor(max_workers=len(sends) - 1) as executor:
+        for passed, output in executor.map(run_stage, sends[1:]):
+            say(output)
+            if passed:
                 success_count += 1
-                
-            elif response.status_code == 429:
-                print("⚡ Rate limited (system working correctly)")
-                success_count += 1  # Rate limiting also counts as success
-            else:
-                print(f"❌ Error {response.status_code}: {response.text[:100]}")
-                
-        except Exception as e:
-            print(f"❌ Message test error: {e}")
-        
-        # Pausa entre tests
-        time.sleep(1)
     
     return success_count == len(test_messages)
 
+def send_test_message(session_id, i, test_msg):
+    """Send one smoke-test message and report the reply."""
+    say(f"\n🧪 Test {i}: {test_msg['description']}")
+    say(f"📝 Message: {test_msg['text']}")
+    
+    try:
+        response, record = _timed('POST', '/message', json={
+            'session_id': session_id,
+            'tenant_id': 'test_tenant',
+            'text': test_msg['text'],
+            'locale': 'en'
+        })
+        
+        if response.status_code == 200:
+            result = response.json()
+            say(f"✅ Response: {result['reply'][:80]}...")
+            say(f"🎯 Confidence: {result['confidence']}")
+            say(f"🛠️ Tools used: {result['tools_used']}")
+            
+            # Rate limiting info
+            rate_info = result['metadata'].get('rate_limit', {})
+            remaining = rate_info.get('remaining', 'N/A')
+            record['rate_remaining'] = rate_info.get('remaining')
+            say(f"⚡ Rate limit remaining: {remaining}")
+            return True
+            
+        elif response.status_code == 429:
+            say("⚡ Rate limited (system working correctly)")
+            return True  # Rate limiting also counts as success
+        else:
+            say(f"❌ Error {response.status_code}: {response.text[:100]}")
+            return False
+            
+    except Exception as e:
+        say(f"❌ Message test error: {e}")
+        return False
+
 def test_monitoring_features():
     """Monitoring features test."""
     print_step(5, "MONITORING AND OBSERVABILITY")
     
     # Test error monitoring
     try:
-        response = requests.get('http://localhost:8000/monitoring/errors')
+        response, _ = _timed('GET', '/monitoring/errors')
         if response.status_code == 200:
             errors = response.json()
             stats = errors.get('statistics', {})
-            print(f"📊 Error tracking: {errors['status']}")
-            print(f"📈 Total errors: {stats.get('total_errors', 0)}")
-            print(f"⏰ Last 24h: {stats.get('last_24h', 0)}")
+            say(f"📊 Error tracking: {errors['status']}")
+            say(f"📈 Total errors: {stats.get('total_errors', 0)}")
+            say(f"⏰ Last 24h: {stats.get('last_24h', 0)}")
             return True
         else:
-            print(f"⚠️ Error monitoring not available: {response.status_code}")
+            say(f"⚠️ Error monitoring not available: {response.status_code}")
             return False
-    except Exception as e:
-        print(f"⚠️ Monitoring error: {e}")
+    except (requests.exceptions.RequestException, KeyError) as e:
+        say(f"⚠️ Monitoring error: {e}")
         return False
 
 def test_celery_status():
     """Celery status test."""
     print_step(6, "CELERY SYSTEM")
     
+    down = unhealthy_dependency('redis_memory')
+    if down:
+        say(f"⏭️ Skipped: {down} is not healthy")
+        return None
+    
     success = True
     
     try:
-        response = requests.get('http://localhost:8000/celery/status')
-        if response.status_code == 200:
-            celery = response.json()
-            print(f"📊 Celery Status: {celery['status']}")
-            print(f"🔗 Redis connected: {celery['redis_connected']}")
+        celery = fetch_health().get('celery')
+        if celery is not None:
+            say(f"📊 Celery Status: {celery['status']}")
+            say(f"🔗 Redis connected: {celery.get('redis_connected', False)}")
             
             if 'message' in celery:
-                print(f"💡 Info: {celery['message']}")
+                say(f"💡 Info: {celery['message']}")
         else:
-            print(f"⚠️ Celery status not available: {response.status_code}")
+            say("⚠️ Celery status not available")
             success = False
             
         # Test direct execution
-        response = requests.post('http://localhost:8000/celery/process-direct')
+        response, _ = _timed('POST', '/celery/process-direct')
         if response.status_code == 200:
             result = response.json()
-            print(f"✅ Direct execution: {result['success']}")
+            say(f"✅ Direct execution: {result['success']}")
         else:
             success = False
         
         return success
         
-    except Exception as e:
-        print(f"⚠️ Celery test error: {e}")
+    except (requests.exceptions.RequestException, KeyError) as e:
+        say(f"⚠️ Celery test error: {e}")
         return False
 
 def main():
     """Run all tests."""
-    print_header("🚀 COMPLETE AI AGENT SYSTEM TEST")
-    print(f"⏰ Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    global VERBOSE
+    
+    parser = argparse.ArgumentParser(description='Smoke-test the AI Agent system.')
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('--verbose', dest='verbose', action='store_true', default=True,
+                           help='print every stage in detail (default)')
+    verbosity.add_argument('--quiet', dest='verbose', action='store_false',
+                           help='print one line per stage and a JSON summary')
+    VERBOSE = parser.parse_args().verbose
+    
+    stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if VERBOSE:
+        print_header("🚀 COMPLETE AI AGENT SYSTEM TEST")
+        log.info(f"⏰ Timestamp: {stamp}")
     
+    stages = [
+        test_api_connectivity,
+        test_system_health,
+        test_available_tools,
+        test_message_processing,
+        test_monitoring_features,
+        test_celery_status,
+    ]
     tests_passed = 0
-    total_tests = 6
+    tests_skipped = 0
+    total_tests = len(stages)
+    
+    # The stages hit independent endpoints, so they run concurrently; each
+    # block is printed in order as soon as it (and those before it) finish.
+    # The session's pooled connections are closed afterwards.
+    with SESSION, ThreadPoolExecutor(max_workers=total_tests) as executor:
+        for stage, (passed, output) in zip(stages, executor.map(run_stage, stages)):
+            if VERBOSE:
+                log.info(output)
+            else:
+                log.info(f"{'SKIP' if passed is None else 'PASS' if passed else 'FAIL'} {stage.__name__}")
+            if passed:
+                tests_passed += 1
+            if passed is None:
+                tests_skipped += 1
+    
+    write_profile_results()
     
-    # Run tests
-    if test_api_connectivity(): tests_passed += 1
-    if test_system_health(): tests_passed += 1
-    if test_available_tools(): tests_passed += 1
-    if test_message_processing(): tests_passed += 1
-    if test_monitoring_features(): tests_passed += 1
-    if test_celery_status(): tests_passed += 1
+    if not VERBOSE:
+        log.info(json.dumps({
+            'timestamp': stamp,
+            'passed': tests_passed,
+            'skipped': tests_skipped,
+            'total': total_tests
+        }))
+        return
     
     # Final summary
     print_header("📊 FINAL SUMMARY")
-    print(f"✅ Basic tests passed: {tests_passed}/{total_tests}")
+    log.info(f"✅ Basic tests passed: {tests_passed}/{total_tests}")
+    if tests_skipped:
+        log.info(f"⏭️ Skipped (unhealthy dependency): {tests_skipped}")
     
     if tests_passed == total_tests:
-        print("🎉 SYSTEM FULLY FUNCTIONAL!")
-        print("\n✨ Enabled features:")
-        print("• OpenAI Agent with intelligent responses")
-        print("• Langfuse for complete observability")
-        print("• Conversational memory with Redis")
-        print("• Rate limiting and security guardrails")
-        print("• Advanced business tools")
-        print("• Monitoring and error tracking")
+        log.info("🎉 SYSTEM FULLY FUNCTIONAL!")
+        log.info("\n✨ Enabled features:")
+        log.info("• OpenAI Agent with intelligent responses")
+        log.info("• Langfuse for complete observability")
+        log.info("• Conversational memory with Redis")
+        log.info("• Rate limiting and security guardrails")
+        log.info("• Advanced business tools")
+        log.info("• Monitoring and error tracking")
     elif tests_passed >= 3:
-        print("🎉 SYSTEM WORKING CORRECTLY!")
-        print(f"📊 {tests_passed}/{total_tests} operational components")
+        log.info("🎉 SYSTEM WORKING CORRECTLY!")
+        log.info(f"📊 {tests_passed}/{total_tests} operational components")
     else:
-        print("⚠️ Some components need attention")
-        print("📧 Check logs for more details")
+        log.info("⚠️ Some components need attention")
+        log.info("📧 Check logs for more details")
 
 if __name__ == "__main__":
     main()
@@ -15,19 +15,42 @@ app = Celery(
 # Configure Celery
 import sys
 
+# Short IO-bound tasks (waiting on the LLM) vs slow housekeeping; each
+# queue gets its own worker tuned for its workload
+IO_QUEUE = 'agent_io'
+BACKGROUND_QUEUE = 'agent_bg'
+
 app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # msgpack is smaller and faster than JSON for these dict payloads;
+    # JSON is still accepted for messages queued before the switch
+    task_serializer='msgpack',
+    accept_content=['msgpack', 'json'],
+    result_serializer='msgpack',
+    result_accept_content=['msgpack', 'json'],
+    # Agent replies are text-heavy; compress them on the broker and in
+    # the result backend
+    task_compression='gzip',
+    result_compression='gzip',
     timezone='UTC',
     enable_utc=True,
+    # Tasks are registered under explicit names, so route by name
     task_routes={
-        'workers.celery_worker.tasks.*': {'queue': 'agent_tasks'},
+        'process_message_async': {'queue': IO_QUEUE},
+        'generate_session_summary': {'queue': BACKGROUND_QUEUE},
+        'cleanup_old_sessions': {'queue': BACKGROUND_QUEUE},
     },
-    task_default_queue='agent_tasks',
+    task_default_queue=IO_QUEUE,
+    # Safe default for slow tasks; the IO worker raises it on its command line
     worker_prefetch_multiplier=1,
     task_acks_late=True,
     worker_max_tasks_per_child=100,
+    # Cheap on Redis, and keeps stale workers from lingering in status checks
+    broker_heartbeat=30,
+    broker_transport_options={
+        # With acks_late, unacked tasks are redelivered after this long
+        'visibility_timeout': 3600,
+        'socket_keepalive': True,
+    },
 )
 
 # Windows-specific configuration to avoid PermissionError
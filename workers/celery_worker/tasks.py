@@ -1,83 +1,146 @@
 """Celery tasks for background processing."""
 
 import asyncio
-from typing import Dict, Any
+import concurrent.futures
+import os
+import threading
+from typing import Dict, Any, Optional
 from celery import current_app as celery_app
+from celery.signals import worker_process_shutdown
 from agents_core.orchestrator.agent import run_agent
 from agents_core.config.settings import get_tenant_config
-from agents_core.memory.conversation_memory import conversation_memory
+from agents_core.memory.conversation_memory import get_conversation_memory
 
+# Longest a single agent run may take inside a task
+AGENT_TIMEOUT_SECONDS = 60
 
-@celery_app.task(bind=True, name='process_message_async')
-def process_message_async(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
+# Length of the reply excerpt kept in the Celery result backend
+REPLY_PREVIEW_CHARS = 140
+
+# Sessions without a new message for this long are removed by cleanup
+SESSION_MAX_IDLE_SECONDS = 60 * 60 * 24 * 3
+
+# One long-lived event loop per worker process, running on a daemon
+# thread; tasks submit coroutines to it instead of building a loop each
+# time, so HTTP clients used by the agent keep their pooled connections
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get or start this process's agent event loop.
+    
+    Created lazily (works for prefork, threads and solo pools alike) and
+    recreated after a fork, since the loop thread does not survive it.
     """
-    Process a message asynchronously using Celery.
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="agent-loop", daemon=True).start()
+        return _loop
+
+
+@worker_process_shutdown.connect
+def _stop_loop(**kwargs):
+    if _loop is not None and _loop_pid == os.getpid():
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+def run_message_processing(message_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the agent on a queued message and save the exchange to memory.
+    
+    Shared by the Celery task and the plain Redis queue worker.
     
     Args:
         message_data: Dict containing message, session_id, tenant_id, locale
     
     Returns:
-        Dict with processing result
+        The agent result dict
     """
+    # Extract data
+    message = message_data['message']
+    session_id = message_data['session_id']
+    tenant_id = message_data['tenant_id']
+    locale = message_data.get('locale', 'en')
+    
+    # Get tenant config
+    tenant_config = get_tenant_config(tenant_id)
+    
+    conversation_memory = get_conversation_memory()
+    
+    # Get conversation context
+    session_summary = conversation_memory.generate_context_summary(
+        session_id, tenant_id
+    )
+    
+    # Run agent on the process-wide loop
+    future = asyncio.run_coroutine_threadsafe(
+        run_agent(
+            message=message,
+            session_id=session_id,
+            tenant_config=tenant_config,
+            session_summary=session_summary,
+            language=locale
+        ),
+        _get_loop()
+    )
     try:
-        # Extract data
-        message = message_data['message']
-        session_id = message_data['session_id']
-        tenant_id = message_data['tenant_id']
-        locale = message_data.get('locale', 'en')
-        
-        # Get tenant config
-        tenant_config = get_tenant_config(tenant_id)
-        
-        # Get conversation context
-        session_summary = conversation_memory.generate_context_summary(
-            session_id, tenant_id
-        )
-        
-        # Run agent in async context
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(
-                run_agent(
-                    message=message,
-                    session_id=session_id,
-                    tenant_config=tenant_config,
-                    session_summary=session_summary,
-                    language=locale
-                )
-            )
-            
-            # Save to memory
-            conversation_memory.add_message(
-                session_id=session_id,
-                tenant_id=tenant_id,
-                role="user",
-                content=message,
-                metadata={"locale": locale}
-            )
-            
-            conversation_memory.add_message(
-                session_id=session_id,
-                tenant_id=tenant_id,
-                role="assistant",
-                content=result["reply"],
-                metadata={
+        result = future.result(timeout=AGENT_TIMEOUT_SECONDS)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+    
+    # Save both turns to memory in one round trip
+    conversation_memory.add_messages(
+        session_id=session_id,
+        tenant_id=tenant_id,
+        messages=[
+            {
+                "role": "user",
+                "content": message,
+                "metadata": {"locale": locale}
+            },
+            {
+                "role": "assistant",
+                "content": result["reply"],
+                "metadata": {
                     "confidence": result["confidence"],
                     "tools_used": result["tools_used"],
                     "async_processing": True
                 }
-            )
-            
-            return {
-                "success": True,
-                "result": result,
-                "task_id": self.request.id
             }
-            
-        finally:
-            loop.close()
+        ]
+    )
+    
+    return result
+
+
+@celery_app.task(bind=True, name='process_message_async')
+def process_message_async(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process a message asynchronously using Celery.
+    
+    Args:
+        message_data: Dict containing message, session_id, tenant_id, locale
+    
+    Returns:
+        Dict with a reply preview; the full agent payload is stored
+        separately and served by /celery/task/{task_id}/result
+    """
+    try:
+        result = run_message_processing(message_data)
+        get_conversation_memory().store_full_result(self.request.id, result)
+        return {
+            "success": True,
+            "task_id": self.request.id,
+            "reply_preview": result["reply"][:REPLY_PREVIEW_CHARS],
+            "tools_used": result["tools_used"],
+            "full_result_url": f"/celery/task/{self.request.id}/result"
+        }
     
     except Exception as e:
         return {
@@ -88,16 +151,14 @@ def process_message_async(self, message_data: Dict[str, Any]) -> Dict[str, Any]:
 
 
 @celery_app.task(name='cleanup_old_sessions')
-def cleanup_old_sessions() -> Dict[str, Any]:
+def cleanup_old_sessions(max_idle_seconds: int = SESSION_MAX_IDLE_SECONDS) -> Dict[str, Any]:
     """Clean up old conversation sessions."""
     try:
-        # This is a placeholder for session cleanup logic
-        # In a real implementation, you'd clean up old Redis keys
-        print("Running session cleanup task...")
+        cleaned = get_conversation_memory().cleanup_stale_sessions(max_idle_seconds)
         
         return {
             "success": True,
-            "cleaned_sessions": 0,
+            "cleaned_sessions": cleaned,
             "message": "Session cleanup completed"
         }
     
@@ -112,32 +173,42 @@ def cleanup_old_sessions() -> Dict[str, Any]:
 def generate_session_summary(session_id: str, tenant_id: str) -> Dict[str, Any]:
     """Generate and update session summary."""
     try:
-        # Get conversation history
-        history = conversation_memory.get_conversation_history(
-            session_id, tenant_id, limit=20
+        conversation_memory = get_conversation_memory()
+        
+        # Nothing was said since the last run: reuse the stored summary
+        summary, version = conversation_memory.get_current_summary(session_id, tenant_id)
+        if summary is not None:
+            return {
+                "success": True,
+                "summary": summary,
+                "cached": True
+            }
+        
+        # Only the last 5 user messages feed the summary
+        user_messages = conversation_memory.get_recent_user_messages(
+            session_id, tenant_id, count=5
         )
         
-        if not history:
+        if not user_messages:
             return {
                 "success": True,
                 "message": "No history to summarize"
             }
         
         # Simple summarization logic
-        user_messages = [msg["content"] for msg in history if msg["role"] == "user"]
-        topics = ", ".join(user_messages[-5:])  # Last 5 user messages
+        topics = ", ".join(user_messages)
         
         summary = f"Recent topics discussed: {topics}"
         
-        # Update summary
+        # Update summary, tagged with the version it was built from
         conversation_memory.update_conversation_summary(
-            session_id, tenant_id, summary
+            session_id, tenant_id, summary, source_version=version
         )
         
         return {
             "success": True,
             "summary": summary,
-            "messages_processed": len(history)
+            "messages_processed": len(user_messages)
         }
     
     except Exception as e:
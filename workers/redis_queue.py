@@ -0,0 +1,116 @@
+"""Lightweight Redis list queue for fire-and-forget agent messages.
+
+An alternative to Celery for POST /message/async, enabled with
+ASYNC_QUEUE_BACKEND=redis. The API LPUSHes a job onto a Redis list and
+workers BRPOP it, run the same processing as the Celery task and store
+the result under a short-lived key the status endpoint reads. There is
+no broker protocol, heartbeat or result-backend bookkeeping per task;
+delivery is at-most-once (a worker that dies mid-task loses that job).
+
+Run a worker with:  python -m workers.redis_queue
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+from agents_core.infra.redis_pool import get_blocking_redis_client, get_redis_client
+from workers.celery_worker.tasks import run_message_processing
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "agent:queue"
+RESULT_KEY_PREFIX = "agent:result:"
+DONE_KEY_PREFIX = "agent:done:"
+
+# Results are kept long enough for clients to poll them
+RESULT_TTL_SECONDS = 3600
+
+# Completion markers only need to outlive a pending long-poll
+DONE_TTL_SECONDS = 60
+
+# Single BLPOP slice; stays under the shared pool's 5 s socket timeout
+_BLPOP_SLICE_SECONDS = 4.0
+
+
+def _result_key(task_id: str) -> str:
+    return f"{RESULT_KEY_PREFIX}{task_id}"
+
+
+def _done_key(task_id: str) -> str:
+    return f"{DONE_KEY_PREFIX}{task_id}"
+
+
+def enqueue_message(task_id: str, message_data: Dict[str, Any]) -> None:
+    """Queue a message for processing under the given task ID."""
+    get_redis_client().lpush(
+        QUEUE_KEY,
+        orjson.dumps({"task_id": task_id, "message_data": message_data})
+    )
+
+
+def get_result(task_id: str) -> Optional[Dict[str, Any]]:
+    """Return the stored result for a task, or None while it is pending."""
+    raw = get_redis_client().get(_result_key(task_id))
+    return orjson.loads(raw) if raw is not None else None
+
+
+def wait_result(task_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+    """Block up to `timeout` seconds for a task's result (blocking).
+
+    Waits on the task's completion marker with BLPOP, so it returns as soon
+    as the worker finishes instead of polling. The BLPOP runs on the
+    dedicated blocking pool, not the shared one.
+    """
+    client = get_blocking_redis_client()
+    deadline = time.monotonic() + timeout
+    result = get_result(task_id)
+    while result is None and (remaining := deadline - time.monotonic()) > 0:
+        if client.blpop(_done_key(task_id), timeout=min(remaining, _BLPOP_SLICE_SECONDS)):
+            break
+        result = get_result(task_id)
+    return result if result is not None else get_result(task_id)
+
+
+def run_worker(poll_timeout: int = 1) -> None:
+    """Process queued messages until interrupted."""
+    client = get_redis_client()
+    logger.info("Redis queue worker listening on %s", QUEUE_KEY)
+
+    while True:
+        item = client.brpop(QUEUE_KEY, timeout=poll_timeout)
+        if item is None:
+            continue
+
+        job = orjson.loads(item[1])
+        task_id = job["task_id"]
+        try:
+            result = {
+                "success": True,
+                "result": run_message_processing(job["message_data"]),
+                "task_id": task_id
+            }
+        except Exception as e:
+            logger.exception("Queued task %s failed", task_id)
+            result = {
+                "success": False,
+                "error": str(e),
+                "task_id": task_id
+            }
+
+        # Store the result, then wake any long-polling status request
+        pipe = client.pipeline(transaction=False)
+        pipe.setex(_result_key(task_id), RESULT_TTL_SECONDS, orjson.dumps(result))
+        pipe.lpush(_done_key(task_id), 1)
+        pipe.expire(_done_key(task_id), DONE_TTL_SECONDS)
+        pipe.execute()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        pass